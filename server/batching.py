@@ -0,0 +1,180 @@
+import itertools
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional
+
+from .executor import DeadlineExceededError, QueueFullError
+
+
+@dataclass
+class _Pending:
+    image: Any
+    params: tuple
+    # time.monotonic() after which the result is no longer wanted.
+    deadline: Optional[float] = None
+    priority: int = 1
+    future: Future = field(default_factory=Future)
+
+
+class MicroBatcher:
+    def __init__(
+        self,
+        name: str,
+        run_batch: Callable[..., list],
+        max_batch_size: int = 8,
+        max_wait_ms: float = 5.0,
+        workers: int = 1,
+        max_queue: int = 32,
+        item_context: bool = False,
+        reserve: float = 0.25,
+    ):
+        self.name = name
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait_s = max(0.0, float(max_wait_ms)) / 1000.0
+        self.workers = max(1, int(workers))
+        self.max_queue = max(1, int(max_queue))
+        # Each priority level below the first leaves this share of the queue to the
+        # levels above it, so a bulk burst can't lock stream frames out.
+        self.reserve = int(round(self.max_queue * min(max(float(reserve), 0.0), 0.5)))
+        self._admit_lock = threading.Lock()
+        self._run_batch = run_batch
+        # Hand run_batch each item's deadline and priority, for runners that submit
+        # the items on to other batchers.
+        self.item_context = bool(item_context)
+        # (priority, arrival, pending): lower priorities are served first, FIFO within one.
+        self._queue: "queue.PriorityQueue[tuple[int, int, _Pending]]" = queue.PriorityQueue(
+            maxsize=self.max_queue
+        )
+        self._arrivals = itertools.count()
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._items = 0
+        self._largest = 0
+        self._sizes: dict[int, int] = {}
+        self._rejected = 0
+        self._expired = 0
+        # Smoothed wall time of one forward batch, for estimating queue wait.
+        self._batch_s = 0.0
+        self._threads = [
+            threading.Thread(target=self._loop, name=f"batcher-{name}-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, image, deadline: Optional[float] = None, priority: int = 1, **params) -> Future:
+        pending = _Pending(
+            image=image, params=tuple(sorted(params.items())), deadline=deadline, priority=priority
+        )
+        limit = max(1, self.max_queue - self.reserve * max(0, int(priority)))
+        with self._admit_lock:
+            admitted = self._queue.qsize() < limit
+            if admitted:
+                self._queue.put_nowait((priority, next(self._arrivals), pending))
+        if not admitted:
+            with self._stats_lock:
+                self._rejected += 1
+            raise QueueFullError(f"inference queue for '{self.name}' is full")
+        return pending.future
+
+    def qsize(self) -> int:
+        return self._queue.qsize()
+
+    def expected_wait(self) -> float:
+        # Seconds a request submitted now would wait: the batches queued ahead of it
+        # plus its own, shared across the workers.
+        with self._stats_lock:
+            batch_s = self._batch_s
+        batches = self._queue.qsize() // self.max_batch_size + 1
+        return batches * batch_s / self.workers
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            mean = self._items / self._batches if self._batches else 0.0
+            return {
+                "maxBatchSize": self.max_batch_size,
+                "maxWaitMs": self.max_wait_s * 1000.0,
+                "workers": self.workers,
+                "maxQueue": self.max_queue,
+                "reserve": self.reserve,
+                "rejected": self._rejected,
+                "expired": self._expired,
+                "batches": self._batches,
+                "items": self._items,
+                "meanBatchSize": round(mean, 3),
+                "largestBatch": self._largest,
+                "batchSizes": {str(k): v for k, v in sorted(self._sizes.items())},
+                "queued": self._queue.qsize(),
+                "batchMs": round(self._batch_s * 1000.0, 3),
+            }
+
+    def _collect(self) -> list:
+        batch = [self._queue.get()[2]]
+        deadline = time.monotonic() + self.max_wait_s
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    batch.append(self._queue.get_nowait()[2])
+                else:
+                    batch.append(self._queue.get(timeout=remaining)[2])
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self) -> None:
+        while True:
+            batch = self._collect()
+            # Only requests with identical inference params can share a forward pass.
+            groups: dict[tuple, list] = {}
+            for pending in batch:
+                groups.setdefault(pending.params, []).append(pending)
+            for params, items in groups.items():
+                self._run(items, dict(params))
+
+    def _run(self, items: list, params: dict) -> None:
+        live = [p for p in items if p.future.set_running_or_notify_cancel()]
+        # Requests whose deadline passed while queued are shed before the forward pass.
+        now = time.monotonic()
+        expired = [p for p in live if p.deadline is not None and p.deadline <= now]
+        if expired:
+            live = [p for p in live if p.deadline is None or p.deadline > now]
+            with self._stats_lock:
+                self._expired += len(expired)
+            error = DeadlineExceededError(f"deadline exceeded in queue for '{self.name}'")
+            for pending in expired:
+                pending.future.set_exception(error)
+        if not live:
+            return
+        context = {}
+        if self.item_context:
+            context = {"deadlines": [p.deadline for p in live], "priorities": [p.priority for p in live]}
+        start = time.monotonic()
+        try:
+            results = self._run_batch([p.image for p in live], **context, **params)
+            if len(results) != len(live):
+                # Unmatched futures would never resolve; fail the whole batch instead.
+                raise RuntimeError(f"'{self.name}' returned {len(results)} results for {len(live)} images")
+        except Exception as e:
+            for pending in live:
+                pending.future.set_exception(e)
+            return
+
+        elapsed = time.monotonic() - start
+        with self._stats_lock:
+            self._batch_s = elapsed if not self._batch_s else 0.8 * self._batch_s + 0.2 * elapsed
+            size = len(live)
+            self._batches += 1
+            self._items += size
+            self._largest = max(self._largest, size)
+            self._sizes[size] = self._sizes.get(size, 0) + 1
+
+        for pending, result in zip(live, results):
+            # A runner may fail single items by returning their exception.
+            if isinstance(result, BaseException):
+                pending.future.set_exception(result)
+            else:
+                pending.future.set_result(result)
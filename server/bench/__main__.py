@@ -0,0 +1,49 @@
+import argparse
+import json
+import platform
+import subprocess
+from datetime import datetime, timezone
+from pathlib import Path
+
+from . import decode, dedupe, labels, postprocess
+
+ROOT = Path(__file__).resolve().parents[2]
+
+
+def _git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True)
+    except OSError:
+        return None
+    return out.stdout.strip() or None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run every micro-benchmark and write one JSON report")
+    parser.add_argument("--sizes", default="50,300,2000")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--out", type=Path, help="default: print to stdout")
+    args = parser.parse_args()
+
+    sizes = [int(part) for part in args.sizes.split(",") if part.strip()]
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "ranAt": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "labels": labels.run(sizes, args.repeat),
+        "dedupe": dedupe.run(sizes, args.repeat),
+        "postprocess": postprocess.run(sizes, args.repeat),
+        "decode": decode.run(decode.synthetic_jpeg(), [320, 640, 960, 1536], max(1, args.repeat // 4)),
+    }
+    text = json.dumps(report, indent=2)
+    if args.out:
+        args.out.write_text(text)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# The original per-detection dedupe loops, kept only as the baseline that the
+# benchmarks check dedupe_boxes against.
+from ..postprocess import iou_xyxy
+
+
+def dedupe_overlaps(
+    detections: list,
+    iou_threshold: float = 0.85,
+    min_area_ratio: float = 0.85,
+) -> list:
+    boxed = [d for d in detections if isinstance(d.get("box"), dict)]
+    others = [d for d in detections if not isinstance(d.get("box"), dict)]
+    if not boxed:
+        return detections
+
+    sorted_boxes = sorted(boxed, key=lambda d: d.get("confidence", 0.0), reverse=True)
+    kept = []
+    for cand in sorted_boxes:
+        box = cand["box"]
+        x1, y1 = float(box["x"]), float(box["y"])
+        x2, y2 = x1 + float(box["width"]), y1 + float(box["height"])
+        cand_xyxy = (x1, y1, x2, y2)
+        cand_area = max(0.0, x2 - x1) * max(0.0, y2 - y1)
+
+        suppressed = False
+        for prev in kept:
+            if prev.get("label") == cand.get("label"):
+                continue
+            pbox = prev["box"]
+            px1, py1 = float(pbox["x"]), float(pbox["y"])
+            px2, py2 = px1 + float(pbox["width"]), py1 + float(pbox["height"])
+            prev_xyxy = (px1, py1, px2, py2)
+            prev_area = max(0.0, px2 - px1) * max(0.0, py2 - py1)
+
+            overlap = iou_xyxy(cand_xyxy, prev_xyxy)
+            if overlap < iou_threshold:
+                continue
+
+            # If sizes are similar, treat as same object -> keep highest confidence only.
+            area_ratio = min(cand_area, prev_area) / max(cand_area, prev_area) if prev_area > 0 else 0.0
+            if area_ratio >= min_area_ratio:
+                suppressed = True
+                break
+
+        if not suppressed:
+            kept.append(cand)
+
+    return kept + others
+
+
+def dedupe_same_label(
+    detections: list,
+    iou_threshold: float = 0.85,
+    min_area_ratio: float = 0.9,
+) -> list:
+    boxed = [d for d in detections if isinstance(d.get("box"), dict)]
+    others = [d for d in detections if not isinstance(d.get("box"), dict)]
+    if not boxed:
+        return detections
+
+    sorted_boxes = sorted(boxed, key=lambda d: d.get("confidence", 0.0), reverse=True)
+    kept = []
+    for cand in sorted_boxes:
+        box = cand["box"]
+        x1, y1 = float(box["x"]), float(box["y"])
+        x2, y2 = x1 + float(box["width"]), y1 + float(box["height"])
+        cand_xyxy = (x1, y1, x2, y2)
+        cand_area = max(0.0, x2 - x1) * max(0.0, y2 - y1)
+
+        suppressed = False
+        for prev in kept:
+            if prev.get("label") != cand.get("label"):
+                continue
+            pbox = prev["box"]
+            px1, py1 = float(pbox["x"]), float(pbox["y"])
+            px2, py2 = px1 + float(pbox["width"]), py1 + float(pbox["height"])
+            prev_xyxy = (px1, py1, px2, py2)
+            prev_area = max(0.0, px2 - px1) * max(0.0, py2 - py1)
+
+            overlap = iou_xyxy(cand_xyxy, prev_xyxy)
+            if overlap < iou_threshold:
+                continue
+
+            area_ratio = min(cand_area, prev_area) / max(cand_area, prev_area) if prev_area > 0 else 0.0
+            if area_ratio >= min_area_ratio:
+                suppressed = True
+                break
+
+        if not suppressed:
+            kept.append(cand)
+
+    return kept + others
@@ -0,0 +1,84 @@
+import argparse
+import io
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+from PIL import Image, ImageOps
+
+from ..imaging import decode_image, simplejpeg
+
+
+def synthetic_jpeg(width: int = 4032, height: int = 3024, quality: int = 90) -> bytes:
+    # Smooth gradients plus noise compress roughly like a phone photo.
+    rng = np.random.default_rng(0)
+    yy, xx = np.mgrid[0:height, 0:width]
+    base = np.stack([xx % 256, yy % 256, (xx + yy) % 256], axis=-1).astype(np.float32)
+    pixels = np.clip(base + rng.normal(0, 12, size=base.shape), 0, 255).astype(np.uint8)
+    buf = io.BytesIO()
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    Image.fromarray(pixels, "RGB").save(buf, "JPEG", quality=quality, exif=exif)
+    return buf.getvalue()
+
+
+def legacy_decode(data: bytes) -> Image.Image:
+    image = Image.open(io.BytesIO(data))
+    return ImageOps.exif_transpose(image).convert("RGB")
+
+
+def _time_ms(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000.0
+
+
+def run(data: bytes, targets: list[int], repeat: int) -> list[dict]:
+    full = legacy_decode(data)
+    rows = [
+        {
+            "decoder": "legacy",
+            "target": None,
+            "size": list(full.size),
+            "ms": round(_time_ms(lambda: legacy_decode(data), repeat), 3),
+        }
+    ]
+    for target in targets:
+        image = decode_image(data, target)
+        rows.append(
+            {
+                "decoder": "simplejpeg" if simplejpeg is not None else "pil-draft",
+                "target": target,
+                "size": list(image.size),
+                "ms": round(_time_ms(lambda: decode_image(data, target), repeat), 3),
+            }
+        )
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Image decode benchmark (full vs reduced-scale)")
+    parser.add_argument("--image", type=Path, help="JPEG to decode (default: synthetic 12 MP photo)")
+    parser.add_argument("--targets", default="320,640,960,1536")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    data = args.image.read_bytes() if args.image else synthetic_jpeg()
+    targets = [int(part) for part in args.targets.split(",") if part.strip()]
+    rows = run(data, targets, args.repeat)
+    if args.json:
+        print(json.dumps(rows))
+        return
+    print(f"{'decoder':>10} {'target':>6} {'size':>11} {'ms':>9}")
+    for row in rows:
+        size = "x".join(str(v) for v in row["size"])
+        print(f"{row['decoder']:>10} {str(row['target'] or '-'):>6} {size:>11} {row['ms']:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+import argparse
+import json
+import time
+
+import numpy as np
+
+from ..postprocess import clamp01, dedupe_boxes
+from ._reference import dedupe_overlaps, dedupe_same_label
+from .postprocess import CLASS_NAMES, DEDUPE, HEIGHT, WIDTH, synthetic_frame
+
+
+def _normalized(xyxy: np.ndarray) -> np.ndarray:
+    boxes = xyxy.astype(np.float64) / [WIDTH, HEIGHT, WIDTH, HEIGHT]
+    return np.clip(boxes, 0.0, 1.0)
+
+
+def legacy_dedupe(boxes: np.ndarray, conf: np.ndarray, cls: np.ndarray) -> list:
+    detections = []
+    for (x1, y1, x2, y2), score, cls_id in zip(boxes.tolist(), conf, cls):
+        detections.append(
+            {
+                "label": CLASS_NAMES[int(cls_id)],
+                "confidence": clamp01(float(score)),
+                "box": {"x": x1, "y": y1, "width": x2 - x1, "height": y2 - y1},
+            }
+        )
+    same_iou, same_area, cross_iou, cross_area = DEDUPE
+    detections = dedupe_same_label(detections, same_iou, same_area)
+    return dedupe_overlaps(detections, cross_iou, cross_area)
+
+
+def array_dedupe(boxes: np.ndarray, conf: np.ndarray, cls: np.ndarray) -> np.ndarray:
+    return dedupe_boxes(boxes, conf, cls, *DEDUPE)
+
+
+def _time_ms(fn, args, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000.0
+
+
+def run(sizes: list[int], repeat: int) -> list[dict]:
+    rows = []
+    for n in sizes:
+        xyxy, conf, cls = synthetic_frame(n)
+        frame = (_normalized(xyxy), conf.astype(np.float64), cls)
+        legacy_ms = _time_ms(legacy_dedupe, frame, max(1, repeat // 10) if n > 500 else repeat)
+        array_ms = _time_ms(array_dedupe, frame, repeat)
+        rows.append(
+            {
+                "boxes": n,
+                "kept": len(array_dedupe(*frame)),
+                "legacyKept": len(legacy_dedupe(*frame)),
+                "legacyMs": round(legacy_ms, 3),
+                "arrayMs": round(array_ms, 3),
+                "speedup": round(legacy_ms / array_ms, 1) if array_ms > 0 else None,
+            }
+        )
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Overlap dedupe benchmark (dict passes vs array version)")
+    parser.add_argument("--sizes", default="50,300,2000")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    sizes = [int(part) for part in args.sizes.split(",") if part.strip()]
+    rows = run(sizes, args.repeat)
+    if args.json:
+        print(json.dumps(rows))
+        return
+    print(f"{'boxes':>6} {'kept':>6} {'legacy ms':>10} {'array ms':>10} {'speedup':>8}")
+    for row in rows:
+        print(
+            f"{row['boxes']:>6} {row['kept']:>6} {row['legacyMs']:>10.3f} "
+            f"{row['arrayMs']:>10.3f} {row['speedup']:>7}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+import argparse
+import json
+import time
+
+import numpy as np
+
+from ..postprocess import category_labels, category_table, map_classes, normalize_label
+
+# Raw names as they come out of the checkpoints: dataset (TR) labels with and
+# without diacritics, already-mapped categories and unknowns.
+RAW_LABELS = [
+    "cam", "kagit", "Kağıt", "metal", "pil", "plastik", "PLASTİK", "cardboard", "can", "food", "bottle",
+]
+
+
+def per_box(cls_ids: np.ndarray) -> list:
+    return [normalize_label(RAW_LABELS[int(c)]) for c in cls_ids]
+
+
+def per_class(cls_ids: np.ndarray) -> np.ndarray:
+    uniq, inverse = np.unique(cls_ids, return_inverse=True)
+    vocab = np.asarray([normalize_label(RAW_LABELS[int(c)]) for c in uniq], dtype=object)
+    return vocab[inverse]
+
+
+TABLE = category_table(dict(enumerate(RAW_LABELS)))
+
+
+def per_table(cls_ids: np.ndarray) -> np.ndarray:
+    # What the models do now: the class-id table is built once at load time.
+    return category_labels(map_classes(TABLE, cls_ids))
+
+
+def _time_us(fn, args, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best * 1e6
+
+
+def run(sizes: list[int], repeat: int) -> list[dict]:
+    calls = 10_000
+    names = [RAW_LABELS[i % len(RAW_LABELS)] for i in range(calls)]
+    total_us = _time_us(lambda: [normalize_label(name) for name in names], (), repeat)
+    rows = [{"case": "normalize_label", "boxes": 1, "us": round(total_us / calls, 4)}]
+    rng = np.random.default_rng(0)
+    for n in sizes:
+        cls_ids = rng.integers(0, len(RAW_LABELS), size=n)
+        assert per_box(cls_ids) == per_class(cls_ids).tolist() == per_table(cls_ids).tolist()
+        rows.append({"case": "per-box", "boxes": n, "us": round(_time_us(per_box, (cls_ids,), repeat), 2)})
+        rows.append({"case": "per-class", "boxes": n, "us": round(_time_us(per_class, (cls_ids,), repeat), 2)})
+        rows.append({"case": "table", "boxes": n, "us": round(_time_us(per_table, (cls_ids,), repeat), 2)})
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Label normalization benchmark")
+    parser.add_argument("--sizes", default="50,300,2000")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    sizes = [int(part) for part in args.sizes.split(",") if part.strip()]
+    rows = run(sizes, args.repeat)
+    if args.json:
+        print(json.dumps(rows))
+        return
+    print(f"{'case':>16} {'boxes':>6} {'us':>10}")
+    for row in rows:
+        print(f"{row['case']:>16} {row['boxes']:>6} {row['us']:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
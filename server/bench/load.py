@@ -0,0 +1,460 @@
+import argparse
+import asyncio
+import base64
+import itertools
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+
+from ..protocol import SUBPROTOCOL, decode_response, encode_request
+from .decode import synthetic_jpeg
+
+try:
+    import psutil
+except Exception:
+    psutil = None
+
+ROOT = Path(__file__).resolve().parents[2]
+IMAGE_TYPES = {".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".png": "image/png", ".webp": "image/webp"}
+STREAM_GRACE_S = 5.0
+
+
+def load_images(folder: Optional[Path], limit: int) -> list[tuple[str, bytes, str]]:
+    if folder is None:
+        return [("synthetic.jpg", synthetic_jpeg(1280, 960), "image/jpeg")]
+    paths = sorted(p for p in folder.rglob("*") if p.suffix.lower() in IMAGE_TYPES)
+    if limit > 0:
+        paths = paths[:limit]
+    if not paths:
+        raise SystemExit(f"No images found in {folder}")
+    return [(p.name, p.read_bytes(), IMAGE_TYPES[p.suffix.lower()]) for p in paths]
+
+
+def _param_value(raw: str):
+    lowered = raw.strip().lower()
+    if lowered in {"true", "false"}:
+        return lowered == "true"
+    try:
+        return int(raw)
+    except ValueError:
+        return float(raw)
+
+
+def parse_param_sets(raw: str) -> list[dict]:
+    # "imgsz=640,conf=0.25;imgsz=320" -> one scenario per ';'-separated set.
+    sets = []
+    for chunk in (raw or "").split(";"):
+        params = {}
+        for part in chunk.split(","):
+            if "=" in part:
+                key, value = part.split("=", 1)
+                params[key.strip()] = _param_value(value)
+        sets.append(params)
+    return [s for s in sets if s] or [{}]
+
+
+def percentile(values: list[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * q
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summarize(latencies: list[float], elapsed: float, counts: dict) -> dict:
+    ms = [v * 1000.0 for v in latencies]
+    return {
+        **counts,
+        "elapsedS": round(elapsed, 3),
+        "throughput": round(len(latencies) / elapsed, 2) if elapsed > 0 else None,
+        "p50Ms": round(percentile(ms, 0.50), 2) if ms else None,
+        "p95Ms": round(percentile(ms, 0.95), 2) if ms else None,
+        "p99Ms": round(percentile(ms, 0.99), 2) if ms else None,
+        "meanMs": round(sum(ms) / len(ms), 2) if ms else None,
+    }
+
+
+class ProcessSampler:
+    # CPU time and RSS of the server process (and its model workers, with psutil).
+    def __init__(self, pid: Optional[int]):
+        self.pid = pid
+        self.peak_rss = 0
+
+    def _processes(self) -> list:
+        proc = psutil.Process(self.pid)
+        return [proc, *proc.children(recursive=True)]
+
+    def snapshot(self) -> Optional[tuple[float, int]]:
+        if self.pid is None:
+            return None
+        try:
+            if psutil is not None:
+                cpu, rss = 0.0, 0
+                for proc in self._processes():
+                    times = proc.cpu_times()
+                    cpu += times.user + times.system
+                    rss += proc.memory_info().rss
+            else:
+                fields = Path(f"/proc/{self.pid}/stat").read_text().rsplit(")", 1)[1].split()
+                cpu = (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+                rss = int(fields[21]) * os.sysconf("SC_PAGE_SIZE")
+        except Exception:
+            return None
+        self.peak_rss = max(self.peak_rss, rss)
+        return cpu, rss
+
+    async def watch(self, interval: float = 0.2) -> None:
+        while True:
+            self.snapshot()
+            await asyncio.sleep(interval)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(env: dict, timeout: float) -> tuple[subprocess.Popen, str]:
+    # The server runs in its own process so client-side work doesn't show up
+    # in its CPU numbers. The result cache is off unless asked for: replayed
+    # images would otherwise be answered from it.
+    import httpx
+
+    port = _free_port()
+    child_env = {**os.environ, "RESULT_CACHE_ENTRIES": "0", **env}
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server.main:app", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=str(ROOT),
+        env=child_env,
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"Server exited with code {process.returncode}")
+        try:
+            if httpx.get(f"{url}/health", timeout=1.0).status_code == 200:
+                return process, url
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    process.terminate()
+    raise SystemExit(f"Server not ready after {timeout:.0f}s")
+
+
+async def run_predict(
+    client,
+    url: str,
+    images: list,
+    model: str,
+    params: dict,
+    rate: float,
+    concurrency: int,
+    requests: int,
+    duration: float,
+) -> dict:
+    latencies = []
+    counts = {"sent": 0, "ok": 0, "busy": 0, "errors": 0, "cached": 0}
+    query = {**params, **({"model": model} if model else {})}
+    frames = itertools.cycle(images)
+    limit = asyncio.Semaphore(concurrency)
+
+    async def one(scheduled: float) -> None:
+        name, data, content_type = next(frames)
+        async with limit:
+            try:
+                response = await client.post(
+                    f"{url}/predict", params=query, files={"file": (name, data, content_type)}
+                )
+            except Exception:
+                counts["errors"] += 1
+                return
+        # Measured from the scheduled send time, so time spent waiting for a free
+        # connection under an open-loop rate counts as latency.
+        elapsed = time.perf_counter() - scheduled
+        if response.status_code == 503:
+            counts["busy"] += 1
+        elif response.status_code != 200:
+            counts["errors"] += 1
+        else:
+            counts["ok"] += 1
+            counts["cached"] += bool(response.json().get("cached"))
+            latencies.append(elapsed)
+
+    start = time.perf_counter()
+    tasks = []
+    if rate > 0:
+        interval = 1.0 / rate
+        index = 0
+        while (not requests or index < requests) and (not duration or index * interval < duration):
+            scheduled = start + index * interval
+            await asyncio.sleep(max(0.0, scheduled - time.perf_counter()))
+            tasks.append(asyncio.create_task(one(scheduled)))
+            counts["sent"] += 1
+            index += 1
+        await asyncio.gather(*tasks)
+    else:
+        # Closed loop: each of `concurrency` clients sends its next request as soon
+        # as the previous one is answered.
+        async def client_loop() -> None:
+            while (not requests or counts["sent"] < requests) and (
+                not duration or time.perf_counter() - start < duration
+            ):
+                counts["sent"] += 1
+                await one(time.perf_counter())
+
+        await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+    return summarize(latencies, time.perf_counter() - start, counts)
+
+
+async def _stream_session(
+    url: str, images: list, model: str, params: dict, fps: float, duration: float, binary: bool
+) -> tuple[list, dict]:
+    import websockets
+
+    ws_url = url.replace("http://", "ws://", 1).replace("https://", "wss://", 1) + "/stream"
+    sent_at: dict[int, float] = {}
+    latencies = []
+    counts = {"sent": 0, "ok": 0, "busy": 0, "errors": 0, "cached": 0, "dropped": 0}
+    frames = itertools.cycle(images)
+    encoded = {}
+
+    async with websockets.connect(
+        ws_url, subprotocols=[SUBPROTOCOL] if binary else None, max_size=None
+    ) as websocket:
+
+        async def receive() -> None:
+            async for message in websocket:
+                received = time.perf_counter()
+                reply = decode_response(message) if isinstance(message, bytes) else json.loads(message)
+                frame_id = reply.get("id")
+                start = sent_at.pop(frame_id, None)
+                # Frames are answered in order and superseded ones ("latest frame
+                # wins") never get a reply, so anything older is gone.
+                if isinstance(frame_id, int):
+                    for older in [i for i in sent_at if i < frame_id]:
+                        del sent_at[older]
+                        counts["dropped"] += 1
+                if reply.get("busy"):
+                    counts["busy"] += 1
+                elif "error" in reply:
+                    counts["errors"] += 1
+                elif start is not None:
+                    counts["ok"] += 1
+                    counts["cached"] += bool(reply.get("cached"))
+                    latencies.append(received - start)
+                if not sent_at and sending.done():
+                    return
+
+        async def send() -> None:
+            interval = 1.0 / fps
+            start = time.perf_counter()
+            for frame_id in itertools.count(1):
+                scheduled = start + (frame_id - 1) * interval
+                if scheduled - start >= duration:
+                    return
+                await asyncio.sleep(max(0.0, scheduled - time.perf_counter()))
+                name, data, _ = next(frames)
+                if binary:
+                    message = encode_request(data, frame_id, model, **params)
+                else:
+                    if name not in encoded:
+                        encoded[name] = base64.b64encode(data).decode("ascii")
+                    payload = {"id": frame_id, "model": model or None, "image": encoded[name], **params}
+                    message = json.dumps(payload)
+                sent_at[frame_id] = time.perf_counter()
+                counts["sent"] += 1
+                await websocket.send(message)
+
+        sending = asyncio.create_task(send())
+        receiving = asyncio.create_task(receive())
+        await sending
+        if sent_at:
+            try:
+                await asyncio.wait_for(receiving, STREAM_GRACE_S)
+            except asyncio.TimeoutError:
+                pass
+        receiving.cancel()
+    counts["dropped"] += len(sent_at)
+    return latencies, counts
+
+
+async def run_streams(
+    url: str, images: list, model: str, params: dict, sessions: int, fps: float, duration: float, binary: bool
+) -> dict:
+    start = time.perf_counter()
+    results = await asyncio.gather(
+        *(_stream_session(url, images, model, params, fps, duration, binary) for _ in range(sessions))
+    )
+    latencies = [v for session_latencies, _ in results for v in session_latencies]
+    counts = {"sessions": sessions, "fps": fps}
+    for _, session_counts in results:
+        for key, value in session_counts.items():
+            counts[key] = counts.get(key, 0) + value
+    return summarize(latencies, time.perf_counter() - start, counts)
+
+
+async def run_scenario(
+    args, client, url: str, sampler: ProcessSampler, mode: str, model: str, params: dict
+) -> dict:
+    for i in range(args.warmup):
+        name, data, content_type = args.images[i % len(args.images)]
+        await client.post(
+            f"{url}/predict",
+            params={**params, **({"model": model} if model else {})},
+            files={"file": (name, data, content_type)},
+        )
+
+    before = sampler.snapshot()
+    sampler.peak_rss = 0
+    watcher = asyncio.create_task(sampler.watch())
+    start = time.perf_counter()
+    try:
+        if mode == "predict":
+            row = await run_predict(
+                client,
+                url,
+                args.images,
+                model,
+                params,
+                args.rate,
+                args.concurrency,
+                args.requests,
+                args.duration,
+            )
+        else:
+            row = await run_streams(
+                url, args.images, model, params, args.streams, args.fps, args.duration, args.binary
+            )
+    finally:
+        watcher.cancel()
+    wall = time.perf_counter() - start
+    after = sampler.snapshot()
+
+    cpu = None
+    if before is not None and after is not None and wall > 0:
+        cpu = round((after[0] - before[0]) / wall * 100.0, 1)
+    # Growth over the idle baseline, spread over the requests that can be in flight at once.
+    per_request = None
+    if before is not None and sampler.peak_rss:
+        in_flight = args.concurrency if mode == "predict" else args.streams
+        per_request = round(max(0, sampler.peak_rss - before[1]) / in_flight / 1e6, 2)
+    return {
+        "mode": mode,
+        "model": model or "default",
+        "params": params,
+        **row,
+        "cpuPercent": cpu,
+        "rssMB": round(sampler.peak_rss / 1e6, 1) if sampler.peak_rss else None,
+        "rssPerRequestMB": per_request,
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True)
+    except OSError:
+        return None
+    return out.stdout.strip() or None
+
+
+async def run(args) -> dict:
+    import httpx
+
+    process = None
+    url = args.url
+    pid = args.pid
+    if not url:
+        env = dict(part.split("=", 1) for part in args.env)
+        process, url = start_server(env, args.startup_timeout)
+        pid = process.pid
+    url = url.rstrip("/")
+    try:
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as client:
+            models = [m.strip() for m in args.models.split(",") if m.strip()] or [""]
+            sampler = ProcessSampler(pid)
+            rows = []
+            for mode in [m.strip() for m in args.mode.split(",") if m.strip()]:
+                for model in models:
+                    for params in parse_param_sets(args.params):
+                        rows.append(await run_scenario(args, client, url, sampler, mode, model, params))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "ranAt": datetime.now(timezone.utc).isoformat(),
+            "url": args.url or "spawned",
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpuCount": os.cpu_count(),
+            "images": len(args.images),
+        },
+        "results": rows,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load test /predict and /stream")
+    parser.add_argument("--url", help="running server; default: spawn one on a free local port")
+    parser.add_argument("--pid", type=int, help="server pid for CPU/RSS when using --url")
+    parser.add_argument("--env", action="append", default=[], help="KEY=VALUE for the spawned server")
+    parser.add_argument("--startup-timeout", type=float, default=300.0)
+    parser.add_argument("--images", type=Path, help="folder replayed in order (default: one synthetic photo)")
+    parser.add_argument("--limit", type=int, default=0, help="use at most this many images")
+    parser.add_argument("--mode", default="predict,stream", help="predict, stream or both")
+    parser.add_argument("--models", default="", help="comma-separated model ids (default: server default)")
+    parser.add_argument("--params", default="", help='param sets, e.g. "imgsz=640;imgsz=320,conf=0.25"')
+    parser.add_argument("--rate", type=float, default=0.0, help="/predict requests per second; 0 = closed loop")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=0, help="stop /predict after this many requests")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds per scenario")
+    parser.add_argument("--streams", type=int, default=4, help="concurrent /stream sessions")
+    parser.add_argument("--fps", type=float, default=5.0, help="frames per second per session")
+    parser.add_argument("--binary", action="store_true", help="use the binary /stream protocol")
+    parser.add_argument("--warmup", type=int, default=3, help="unmeasured /predict requests per scenario")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--out", type=Path, help="also write the JSON report here")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+    if not args.requests and not args.duration:
+        parser.error("set --requests or --duration")
+
+    args.images = load_images(args.images, args.limit)
+    report = asyncio.run(run(args))
+    if args.out:
+        args.out.write_text(json.dumps(report, indent=2))
+    if args.json:
+        print(json.dumps(report))
+        return
+    print(
+        f"{'mode':>7} {'model':>10} {'params':>22} {'ok':>6} {'busy':>5} {'err':>4} {'drop':>5} "
+        f"{'req/s':>7} {'p50':>8} {'p95':>8} {'p99':>8} {'cpu%':>6} {'rss MB':>7} {'MB/req':>8}"
+    )
+    for row in report["results"]:
+        params = ",".join(f"{k}={v}" for k, v in row["params"].items()) or "-"
+        keys = ("throughput", "p50Ms", "p95Ms", "p99Ms", "cpuPercent", "rssMB", "rssPerRequestMB")
+        cells = [row.get(key) for key in keys]
+        cells = [f"{v:>8}" if v is not None else f"{'-':>8}" for v in cells]
+        print(
+            f"{row['mode']:>7} {row['model']:>10} {params:>22} {row['ok']:>6} {row['busy']:>5} "
+            f"{row['errors']:>4} {row.get('dropped', '-'):>5} " + " ".join(cells)
+        )
+
+
+if __name__ == "__main__":
+    main()
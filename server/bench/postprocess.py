@@ -0,0 +1,125 @@
+import argparse
+import json
+import time
+
+import numpy as np
+
+from ..postprocess import (
+    category_labels,
+    category_table,
+    clamp01,
+    detections_from_arrays,
+    map_classes,
+    normalize_label,
+)
+from ._reference import dedupe_overlaps, dedupe_same_label
+
+CLASS_NAMES = ["cam", "kagit", "metal", "pil", "plastik"]
+TABLE = category_table(dict(enumerate(CLASS_NAMES)))
+DEDUPE = (0.75, 0.8, 0.7, 0.7)
+WIDTH, HEIGHT = 1280, 960
+
+
+def synthetic_frame(n: int, seed: int = 0):
+    # Clustered boxes so both dedupe passes have real work to do.
+    rng = np.random.default_rng(seed + n)
+    centers = rng.uniform(0.1, 0.9, size=(max(1, n // 4), 2)) * [WIDTH, HEIGHT]
+    pick = centers[rng.integers(0, len(centers), size=n)]
+    size = rng.uniform(40, 300, size=(n, 2))
+    jitter = rng.normal(0, 6, size=(n, 4))
+    xyxy = np.concatenate([pick - size / 2, pick + size / 2], axis=1) + jitter
+    xyxy = xyxy.astype(np.float32)
+    conf = rng.uniform(0.05, 1.0, size=n).astype(np.float32)
+    cls = rng.integers(0, len(CLASS_NAMES), size=n)
+    return xyxy, conf, cls
+
+
+def legacy_postprocess(xyxy, conf, cls) -> list:
+    detections = []
+    for (x1, y1, x2, y2), score, cls_id in zip(xyxy, conf, cls):
+        label = normalize_label(CLASS_NAMES[int(cls_id)])
+        x = clamp01(float(x1) / float(WIDTH))
+        y = clamp01(float(y1) / float(HEIGHT))
+        w = clamp01(float(x2 - x1) / float(WIDTH))
+        h = clamp01(float(y2 - y1) / float(HEIGHT))
+        detections.append(
+            {
+                "label": label,
+                "confidence": clamp01(float(score)),
+                "box": {"x": x, "y": y, "width": w, "height": h},
+            }
+        )
+    same_iou, same_area, cross_iou, cross_area = DEDUPE
+    detections = dedupe_same_label(detections, same_iou, same_area)
+    detections = dedupe_overlaps(detections, cross_iou, cross_area)
+    detections.sort(key=lambda d: d["confidence"], reverse=True)
+    return detections
+
+
+def vectorized_postprocess(xyxy, conf, cls) -> list:
+    uniq, inverse = np.unique(cls, return_inverse=True)
+    labels = np.asarray([normalize_label(CLASS_NAMES[int(c)]) for c in uniq], dtype=object)[inverse]
+    return detections_from_arrays(xyxy, conf, labels, WIDTH, HEIGHT, DEDUPE)
+
+
+def table_postprocess(xyxy, conf, cls) -> list:
+    codes = map_classes(TABLE, cls)
+    return detections_from_arrays(xyxy, conf, category_labels(codes), WIDTH, HEIGHT, DEDUPE, label_codes=codes)
+
+
+def _time_ms(fn, args, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000.0
+
+
+def run(sizes: list[int], repeat: int) -> list[dict]:
+    rows = []
+    for n in sizes:
+        frame = synthetic_frame(n)
+        legacy = legacy_postprocess(*frame)
+        fast = vectorized_postprocess(*frame)
+        tabled = table_postprocess(*frame)
+        legacy_ms = _time_ms(legacy_postprocess, frame, max(1, repeat // 10) if n > 500 else repeat)
+        fast_ms = _time_ms(vectorized_postprocess, frame, repeat)
+        table_ms = _time_ms(table_postprocess, frame, repeat)
+        rows.append(
+            {
+                "boxes": n,
+                "kept": len(fast),
+                "identical": legacy == fast == tabled,
+                "legacyMs": round(legacy_ms, 3),
+                "vectorizedMs": round(fast_ms, 3),
+                "tableMs": round(table_ms, 3),
+                "speedup": round(legacy_ms / fast_ms, 1) if fast_ms > 0 else None,
+                "tableSpeedup": round(fast_ms / table_ms, 2) if table_ms > 0 else None,
+            }
+        )
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Per-frame detection post-processing benchmark")
+    parser.add_argument("--sizes", default="50,300,2000")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    sizes = [int(part) for part in args.sizes.split(",") if part.strip()]
+    rows = run(sizes, args.repeat)
+    if args.json:
+        print(json.dumps(rows))
+        return
+    print(f"{'boxes':>6} {'kept':>6} {'legacy ms':>10} {'numpy ms':>10} {'speedup':>8} {'table ms':>10} identical")
+    for row in rows:
+        print(
+            f"{row['boxes']:>6} {row['kept']:>6} {row['legacyMs']:>10.3f} "
+            f"{row['vectorizedMs']:>10.3f} {row['speedup']:>7}x {row['tableMs']:>10.3f} {row['identical']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+# Rough per-entry bookkeeping cost; detections are small dicts of floats.
+_ENTRY_OVERHEAD_BYTES = 256
+_DETECTION_BYTES = 320
+
+
+def _params_key(params: dict) -> tuple:
+    return tuple(sorted(params.items()))
+
+
+class ResultCache:
+    def __init__(
+        self,
+        max_entries: int = 512,
+        max_bytes: int = 32 * 1024 * 1024,
+        ttl_s: float = 300.0,
+        perceptual: bool = False,
+    ):
+        self.max_entries = max(0, int(max_entries))
+        self.max_bytes = max(0, int(max_bytes))
+        self.ttl_s = max(0.0, float(ttl_s))
+        self.perceptual = bool(perceptual) and self.enabled
+        self._items: "OrderedDict[tuple, tuple[float, int, tuple]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._perceptual_hits = 0
+        self._misses = 0
+        self._perceptual_misses = 0
+        self._evictions = 0
+        self._expirations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.max_bytes > 0
+
+    def content_key(
+        self, data: bytes, model_id: str, version: str, params: dict, digest: Optional[bytes] = None
+    ) -> Optional[tuple]:
+        # Streamed uploads pass the digest they computed on the way in.
+        if not self.enabled:
+            return None
+        if digest is None:
+            digest = hashlib.blake2b(data, digest_size=16).digest()
+        return ("sha", digest, model_id, version, _params_key(params))
+
+    def perceptual_key(
+        self, phash: int, size: tuple[int, int], model_id: str, version: str, params: dict
+    ) -> Optional[tuple]:
+        if not self.perceptual:
+            return None
+        return ("phash", phash, size, model_id, version, _params_key(params))
+
+    def get(self, key: Optional[tuple]) -> Optional[tuple]:
+        if key is None:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None and self.ttl_s and item[0] <= now:
+                self._drop(key)
+                self._expirations += 1
+                item = None
+            if item is None:
+                if key[0] == "phash":
+                    self._perceptual_misses += 1
+                else:
+                    self._misses += 1
+                return None
+            value = item[2]
+            self._items.move_to_end(key)
+            if key[0] == "phash":
+                self._perceptual_hits += 1
+            else:
+                self._hits += 1
+            return value
+
+    def put(self, key: Optional[tuple], value: tuple) -> None:
+        if key is None:
+            return
+        detections = value[0] if value else []
+        size = _ENTRY_OVERHEAD_BYTES + _DETECTION_BYTES * len(detections)
+        if size > self.max_bytes:
+            return
+        expires_at = time.monotonic() + self.ttl_s
+        with self._lock:
+            if key in self._items:
+                self._drop(key)
+            self._items[key] = (expires_at, size, value)
+            self._bytes += size
+            while len(self._items) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._items))
+                self._drop(oldest)
+                self._evictions += 1
+
+    def invalidate(self, model_ids: set) -> int:
+        # Both key kinds end in (model id, version, params).
+        with self._lock:
+            stale = [key for key in self._items if key[-3] in model_ids]
+            for key in stale:
+                self._drop(key)
+        return len(stale)
+
+    def _drop(self, key: tuple) -> None:
+        _, size, _ = self._items.pop(key)
+        self._bytes -= size
+
+    def stats(self) -> dict:
+        with self._lock:
+            # Every request does one content lookup; perceptual hits are rescued misses.
+            lookups = self._hits + self._misses
+            return {
+                "enabled": self.enabled,
+                "perceptual": self.perceptual,
+                "entries": len(self._items),
+                "bytes": self._bytes,
+                "maxEntries": self.max_entries,
+                "maxBytes": self.max_bytes,
+                "ttlS": self.ttl_s,
+                "hits": self._hits,
+                "perceptualHits": self._perceptual_hits,
+                "misses": self._misses,
+                "perceptualMisses": self._perceptual_misses,
+                "evictions": self._evictions,
+                "expirations": self._expirations,
+                "hitRate": round((self._hits + self._perceptual_hits) / lookups, 4) if lookups else 0.0,
+            }
@@ -0,0 +1,46 @@
+import asyncio
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable
+
+
+class QueueFullError(RuntimeError):
+    pass
+
+
+class DeadlineExceededError(RuntimeError):
+    pass
+
+
+class DecodePool:
+    def __init__(self, workers: int = 4, max_pending: int = 64, use_processes: bool = False):
+        self.workers = max(1, int(workers))
+        self.max_pending = max(1, int(max_pending))
+        self.use_processes = bool(use_processes)
+        self._executor: Executor
+        if self.use_processes:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="decode")
+        # Only touched from the event loop thread, so a plain counter is enough.
+        self._pending = 0
+        self._rejected = 0
+
+    async def run(self, fn: Callable, *args):
+        if self._pending >= self.max_pending:
+            self._rejected += 1
+            raise QueueFullError("decode queue is full")
+        self._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, fn, *args)
+        finally:
+            self._pending -= 1
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "processes": self.use_processes,
+            "maxPending": self.max_pending,
+            "pending": self._pending,
+            "rejected": self._rejected,
+        }
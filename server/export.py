@@ -0,0 +1,123 @@
+import argparse
+import shutil
+from pathlib import Path
+
+from .postprocess import MAX_DET_LIMIT
+
+ROOT = Path(__file__).resolve().parents[1]
+DEFAULT_CLASS_NAMES = "cam,kagit,metal,pil,plastik"
+
+
+def export_yolo(weights: Path, out: Path, imgsz: int, dynamic: bool, opset: int, simplify: bool) -> Path:
+    from ultralytics import YOLO
+
+    # Ultralytics stores the class names in the graph metadata, which the
+    # server reads back; the head is exported raw and NMS runs server-side.
+    exported = YOLO(str(weights)).export(
+        format="onnx",
+        imgsz=imgsz,
+        dynamic=dynamic,
+        opset=opset,
+        simplify=simplify,
+        half=False,
+    )
+    exported = Path(exported)
+    if exported.resolve() != out.resolve():
+        out.parent.mkdir(parents=True, exist_ok=True)
+        shutil.move(str(exported), str(out))
+    return out
+
+
+def _keep_size(image, target=None):
+    return image, target
+
+
+def export_frcnn(
+    weights: Path,
+    out: Path,
+    imgsz: int,
+    class_names: list[str],
+    num_classes: int,
+    opset: int,
+    nms_iou: float,
+) -> Path:
+    import onnx
+    import torch
+
+    from .frcnn import load_frcnn
+
+    model = load_frcnn(weights, num_classes, "cpu")
+    # The server already brings the longest side down to imgsz (never up), like the
+    # torch path, so the graph must not resize again: the transform only normalizes.
+    model.transform.resize = _keep_size
+    model.roi_heads.score_thresh = 0.01
+    model.roi_heads.nms_thresh = nms_iou
+    # Score and max_det filtering happen on the server, which accepts up to MAX_DET_LIMIT.
+    model.roi_heads.detections_per_img = MAX_DET_LIMIT
+
+    out.parent.mkdir(parents=True, exist_ok=True)
+    dummy = torch.rand(3, imgsz * 3 // 4, imgsz)
+    torch.onnx.export(
+        model,
+        ([dummy],),
+        str(out),
+        opset_version=opset,
+        input_names=["images"],
+        output_names=["boxes", "labels", "scores"],
+        dynamic_axes={
+            "images": {1: "height", 2: "width"},
+            "boxes": {0: "detections"},
+            "labels": {0: "detections"},
+            "scores": {0: "detections"},
+        },
+    )
+
+    graph = onnx.load(str(out))
+    entry = graph.metadata_props.add()
+    entry.key = "names"
+    entry.value = repr({i + 1: name for i, name in enumerate(class_names)})
+    onnx.save(graph, str(out))
+    return out
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Export a trained model to ONNX for the onnx backend")
+    sub = parser.add_subparsers(dest="model", required=True)
+
+    yolo = sub.add_parser("yolo", help="export an Ultralytics checkpoint")
+    yolo.add_argument("--weights", type=Path, default=ROOT / "trainedmodel" / "best.pt")
+    yolo.add_argument("--out", type=Path)
+    yolo.add_argument("--imgsz", type=int, default=640)
+    yolo.add_argument("--static", action="store_true", help="fixed batch/size graph instead of dynamic axes")
+    yolo.add_argument("--opset", type=int, default=17)
+    yolo.add_argument("--no-simplify", action="store_true")
+
+    frcnn = sub.add_parser("frcnn", help="export a torchvision Faster R-CNN checkpoint")
+    frcnn.add_argument("--weights", type=Path, default=ROOT / "trainedmodel" / "best_model_75.pth")
+    frcnn.add_argument("--out", type=Path)
+    frcnn.add_argument("--imgsz", type=int, default=640)
+    frcnn.add_argument("--class-names", default=DEFAULT_CLASS_NAMES)
+    frcnn.add_argument("--num-classes", type=int, help="including background (default: names + 1)")
+    frcnn.add_argument("--opset", type=int, default=17)
+    frcnn.add_argument("--nms-iou", type=float, default=0.7, help="NMS threshold baked into the graph")
+
+    args = parser.parse_args()
+    out = args.out or args.weights.with_suffix(".onnx")
+    if args.model == "yolo":
+        path = export_yolo(args.weights, out, args.imgsz, not args.static, args.opset, not args.no_simplify)
+    else:
+        names = [part.strip() for part in args.class_names.split(",") if part.strip()]
+        path = export_frcnn(
+            args.weights,
+            out,
+            args.imgsz,
+            names,
+            args.num_classes or len(names) + 1,
+            args.opset,
+            args.nms_iou,
+        )
+    print(path)
+
+
+if __name__ == "__main__":
+    main()
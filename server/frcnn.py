@@ -0,0 +1,144 @@
+import math
+from collections import OrderedDict
+from pathlib import Path
+
+try:
+    import torch
+    import torch.nn.functional as F
+    from torchvision.models.detection import fasterrcnn_resnet50_fpn
+    from torchvision.models.detection.faster_rcnn import FastRCNNPredictor
+    from torchvision.models.detection.image_list import ImageList
+    from torchvision.ops import boxes as box_ops
+except Exception:
+    torch = None
+    F = None
+    fasterrcnn_resnet50_fpn = None
+    FastRCNNPredictor = None
+    ImageList = None
+    box_ops = None
+
+BUCKET_STRIDE = 32
+# Short side of a bucket as a fraction of the long side: covers 2:1, 4:3 and square.
+BUCKET_FRACTIONS = (0.5, 0.75, 1.0)
+
+
+def build_frcnn(num_classes: int):
+    if fasterrcnn_resnet50_fpn is None:
+        raise RuntimeError("torchvision is required for Faster R-CNN models")
+    model = fasterrcnn_resnet50_fpn(weights=None)
+    in_features = model.roi_heads.box_predictor.cls_score.in_features
+    model.roi_heads.box_predictor = FastRCNNPredictor(in_features, num_classes)
+    return model
+
+
+def load_frcnn(path: Path, num_classes: int, device: str = "cpu"):
+    model = build_frcnn(num_classes)
+    checkpoint = torch.load(str(path), map_location=device)
+    if isinstance(checkpoint, dict) and "model_state_dict" in checkpoint:
+        state = checkpoint["model_state_dict"]
+    else:
+        state = checkpoint
+    model.load_state_dict(state)
+    model.to(device)
+    model.eval()
+    return model
+
+
+def _round_up(value: int, multiple: int) -> int:
+    return int(math.ceil(value / multiple)) * multiple
+
+
+def bucket_shape(width: int, height: int, imgsz: int) -> tuple[int, int]:
+    # (height, width) of the padded canvas a frame of this size runs in. Frames are
+    # already scaled so their long side is at most imgsz, so per imgsz there are
+    # only len(BUCKET_FRACTIONS) * 2 - 1 distinct shapes.
+    long_side = _round_up(max(imgsz, width, height), BUCKET_STRIDE)
+    short = min(width, height)
+    short_side = long_side
+    for fraction in BUCKET_FRACTIONS:
+        candidate = _round_up(int(long_side * fraction), BUCKET_STRIDE)
+        if candidate >= short:
+            short_side = candidate
+            break
+    if width >= height:
+        return short_side, long_side
+    return long_side, short_side
+
+
+def detect(model, tensors: list, imgsz: int, conf: float, iou: float, max_det: int) -> list:
+    # Runs the detector stage by stage with per-call thresholds instead of the
+    # values stored on model.roi_heads / model.transform, so one model instance can
+    # serve concurrent requests with different params.
+    mean = torch.as_tensor(model.transform.image_mean, device=tensors[0].device)[:, None, None]
+    std = torch.as_tensor(model.transform.image_std, device=tensors[0].device)[:, None, None]
+
+    buckets: dict[tuple[int, int], list[int]] = {}
+    for i, tensor in enumerate(tensors):
+        height, width = tensor.shape[-2:]
+        buckets.setdefault(bucket_shape(int(width), int(height), imgsz), []).append(i)
+
+    outputs: list = [None] * len(tensors)
+    with torch.inference_mode():
+        for (bucket_h, bucket_w), idxs in buckets.items():
+            batch = tensors[idxs[0]].new_zeros((len(idxs), 3, bucket_h, bucket_w))
+            sizes = []
+            for j, i in enumerate(idxs):
+                height, width = tensors[i].shape[-2:]
+                batch[j, :, :height, :width] = (tensors[i] - mean) / std
+                sizes.append((int(height), int(width)))
+            for i, out in zip(idxs, _forward(model, ImageList(batch, sizes), conf, iou, max_det)):
+                outputs[i] = out
+    return outputs
+
+
+def _forward(model, images, conf: float, iou: float, max_det: int) -> list:
+    features = model.backbone(images.tensors)
+    if isinstance(features, torch.Tensor):
+        features = OrderedDict([("0", features)])
+    proposals, _ = model.rpn(images, features)
+    heads = model.roi_heads
+    box_features = heads.box_roi_pool(features, proposals, images.image_sizes)
+    box_features = heads.box_head(box_features)
+    class_logits, box_regression = heads.box_predictor(box_features)
+    return _postprocess_detections(
+        heads, class_logits, box_regression, proposals, images.image_sizes, conf, iou, max_det
+    )
+
+
+def _postprocess_detections(
+    heads,
+    class_logits,
+    box_regression,
+    proposals: list,
+    image_sizes: list,
+    score_thresh: float,
+    nms_thresh: float,
+    detections_per_img: int,
+) -> list:
+    # Same steps as RoIHeads.postprocess_detections, with the thresholds passed in.
+    num_classes = class_logits.shape[-1]
+    boxes_per_image = [p.shape[0] for p in proposals]
+    pred_boxes = heads.box_coder.decode(box_regression, proposals)
+    pred_scores = F.softmax(class_logits, -1)
+
+    results = []
+    for boxes, scores, image_size in zip(
+        pred_boxes.split(boxes_per_image, 0), pred_scores.split(boxes_per_image, 0), image_sizes
+    ):
+        boxes = box_ops.clip_boxes_to_image(boxes, image_size)
+        labels = torch.arange(num_classes, device=boxes.device).view(1, -1).expand_as(scores)
+
+        # Drop the background column, then flatten to one row per (proposal, class).
+        boxes = boxes[:, 1:].reshape(-1, 4)
+        scores = scores[:, 1:].reshape(-1)
+        labels = labels[:, 1:].reshape(-1)
+
+        inds = torch.where(scores > float(score_thresh))[0]
+        boxes, scores, labels = boxes[inds], scores[inds], labels[inds]
+        keep = box_ops.remove_small_boxes(boxes, min_size=1e-2)
+        boxes, scores, labels = boxes[keep], scores[keep], labels[keep]
+        keep = box_ops.batched_nms(boxes, scores, labels, float(nms_thresh))
+        if detections_per_img:
+            keep = keep[: int(detections_per_img)]
+        results.append({"boxes": boxes[keep], "scores": scores[keep], "labels": labels[keep]})
+    return results
@@ -0,0 +1,121 @@
+import io
+import mmap
+import os
+from typing import Optional, Union
+
+from PIL import Image, UnidentifiedImageError
+
+try:
+    import simplejpeg
+except Exception:
+    simplejpeg = None
+
+JPEG_DECODER = os.getenv("JPEG_DECODER", "auto").strip().lower()
+
+_EXIF_ORIENTATION = 0x0112
+_TRANSPOSE_FOR_ORIENTATION = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT,
+    3: Image.Transpose.ROTATE_180,
+    4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_270,
+    7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90,
+}
+
+
+class InvalidImageError(ValueError):
+    pass
+
+
+def original_size(image: Image.Image) -> tuple[int, int]:
+    # Size of the upright source image before any reduced-scale decoding.
+    return image.info.get("original_size", image.size)
+
+
+def _orientation(image: Image.Image) -> int:
+    try:
+        return int(image.getexif().get(_EXIF_ORIENTATION, 1))
+    except Exception:
+        return 1
+
+
+def _upright_size(size: tuple[int, int], orientation: int) -> tuple[int, int]:
+    width, height = size
+    return (height, width) if orientation in {5, 6, 7, 8} else (width, height)
+
+
+def _draft_request(size: tuple[int, int], target: int) -> tuple[int, int]:
+    # The model letterboxes the longest side to `target`, so ask the decoder for
+    # the smallest scale whose longest side still covers it.
+    width, height = size
+    scale = target / max(width, height)
+    return max(1, int(width * scale)), max(1, int(height * scale))
+
+
+def _decode_simplejpeg(data: Union[bytes, str], image: Image.Image, target: int) -> Image.Image:
+    kwargs = {"colorspace": "RGB", "fastdct": True, "fastupsample": True}
+    if target > 0:
+        min_width, min_height = _draft_request(image.size, target)
+        kwargs.update(min_width=min_width, min_height=min_height)
+    if isinstance(data, str):
+        # A spooled upload: map the file instead of reading it into a bytes copy.
+        with open(data, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            pixels = simplejpeg.decode_jpeg(buffer, **kwargs)
+    else:
+        pixels = simplejpeg.decode_jpeg(data, **kwargs)
+    return Image.fromarray(pixels, "RGB")
+
+
+def probe_image(head: bytes) -> Optional[tuple[str, tuple[int, int]]]:
+    # Format and stored size from the first bytes of a file, or None while they
+    # don't yet cover the header. Only the header is parsed, no pixels.
+    try:
+        with Image.open(io.BytesIO(head)) as image:
+            return image.format, image.size
+    except (UnidentifiedImageError, OSError, SyntaxError, ValueError):
+        return None
+
+
+def decode_image(data: Union[bytes, str], target: int = 0) -> Image.Image:
+    # `data` is the encoded image, or the path of a spooled upload.
+    with Image.open(data if isinstance(data, str) else io.BytesIO(data)) as image:
+        orientation = _orientation(image)
+        size = _upright_size(image.size, orientation)
+
+        use_simplejpeg = (
+            image.format == "JPEG" and simplejpeg is not None and JPEG_DECODER in {"auto", "simplejpeg"}
+        )
+        if use_simplejpeg:
+            decoded = _decode_simplejpeg(data, image, target)
+        else:
+            if target > 0 and image.format == "JPEG" and max(image.size) > target:
+                image.draft("RGB", _draft_request(image.size, target))
+            decoded = image.convert("RGB")
+            if target > 0:
+                # Formats without DCT scaling still get a cheap integer box reduction.
+                factor = max(decoded.size) // target
+                if factor >= 2:
+                    decoded = decoded.reduce(factor)
+
+    method = _TRANSPOSE_FOR_ORIENTATION.get(orientation)
+    if method is not None:
+        decoded = decoded.transpose(method)
+    decoded.info["original_size"] = size
+    return decoded
+
+
+def dhash(image: Image.Image, hash_size: int = 8) -> int:
+    small = image.resize((hash_size + 1, hash_size), Image.BILINEAR, reducing_gap=2.0).convert("L")
+    pixels = list(small.getdata())
+    bits = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            bits = (bits << 1) | int(pixels[offset + col] > pixels[offset + col + 1])
+    return bits
+
+
+def decode_image_hashed(data: Union[bytes, str], target: int = 0) -> tuple[Image.Image, int]:
+    image = decode_image(data, target)
+    return image, dhash(image)
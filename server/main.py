@@ -1,34 +1,78 @@
+import asyncio
 import base64
-import io
+import hashlib
 import json
 import os
-from dataclasses import dataclass
+import secrets
+import threading
+import time
+from concurrent.futures import Future
+from collections import Counter
+from dataclasses import dataclass, field, replace
+from functools import partial
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Callable, Optional
-
-from fastapi import FastAPI, File, HTTPException, UploadFile, WebSocket, WebSocketDisconnect
+from typing import Any, Callable, Optional, Union
+
+import numpy as np
+from fastapi import (
+    Body,
+    FastAPI,
+    File,
+    Header,
+    HTTPException,
+    Request,
+    UploadFile,
+    WebSocket,
+    WebSocketDisconnect,
+)
 from fastapi.middleware.cors import CORSMiddleware
-from PIL import Image, ImageOps
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from PIL import Image
 from ultralytics import YOLO
 
+from .batching import MicroBatcher
+from .cache import ResultCache
+from .executor import DeadlineExceededError, DecodePool, QueueFullError
+from .frcnn import detect as frcnn_detect
+from .frcnn import load_frcnn
+from .imaging import InvalidImageError, decode_image, decode_image_hashed, original_size
+from .metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE
+from .metrics import METRICS, STAGES
+from .onnx_backend import ONNX_AVAILABLE, OnnxDetector, resolve_providers
+from .postprocess import (
+    DEFAULT_LABEL_MAP,
+    MAX_DET_LIMIT,
+    category_labels,
+    category_table,
+    clamp01,
+    detections_from_arrays,
+    load_label_map,
+    map_classes,
+    weighted_box_fusion,
+)
+from .protocol import SUBPROTOCOL, ProtocolError, decode_request, encode_error, encode_response
+from .registry import ModelLoader, ReloadInProgressError
+from .streaming import StreamCounters, StreamSession
+from .tiling import crop_tiles, merge_tiles, tile_windows
+from .tracking import FrameTracker, decode_with_thumbnail
+from .uploads import SpooledUpload, UploadItem, UploadRejectedError, expand_upload, spool_image_upload
+from .workers import WORKER_ROLE_ENV, ModelWorkerPool, WorkerLostError
+
 try:
     import torch
-    from torchvision.models.detection import fasterrcnn_resnet50_fpn
-    from torchvision.models.detection.faster_rcnn import FastRCNNPredictor
     from torchvision.transforms.functional import to_tensor
 
     TORCHVISION_AVAILABLE = True
 except Exception:
     torch = None
-    fasterrcnn_resnet50_fpn = None
-    FastRCNNPredictor = None
     to_tensor = None
     TORCHVISION_AVAILABLE = False
 
 ROOT = Path(__file__).resolve().parents[1]
 DEFAULT_YOLO_PATH = ROOT / "trainedmodel" / "best.pt"
 DEFAULT_FRCNN_PATH = ROOT / "trainedmodel" / "best_model_75.pth"
+DEFAULT_ONNX_PATH = ROOT / "trainedmodel" / "best.onnx"
 
 YOLO_MODEL_ID = os.getenv("YOLO_MODEL_ID", "yolo")
 YOLO_MODEL_PATH = Path(
@@ -47,64 +91,94 @@ FRCNN_MODEL_LABEL = os.getenv("FRCNN_MODEL_LABEL", f"Faster R-CNN ({FRCNN_MODEL_
 FRCNN_MODEL_VERSION = os.getenv("FRCNN_MODEL_VERSION", f"fasterrcnn:{FRCNN_MODEL_PATH.name}")
 FRCNN_ENABLED = os.getenv("FRCNN_ENABLED", "1").strip().lower() not in {"0", "false", "no"}
 
+ONNX_MODEL_ID = os.getenv("ONNX_MODEL_ID", "onnx")
+ONNX_MODEL_PATH_ENV = os.getenv("ONNX_MODEL_PATH")
+ONNX_MODEL_PATH = Path(ONNX_MODEL_PATH_ENV or str(DEFAULT_ONNX_PATH)).expanduser().resolve()
+ONNX_MODEL_LABEL = os.getenv("ONNX_MODEL_LABEL", f"ONNX Runtime ({ONNX_MODEL_PATH.name})")
+ONNX_MODEL_VERSION = os.getenv("ONNX_MODEL_VERSION", f"onnx:{ONNX_MODEL_PATH.name}")
+ONNX_ENABLED = os.getenv("ONNX_ENABLED", "1").strip().lower() not in {"0", "false", "no"}
+ONNX_INT8_MODEL_PATH = Path(
+    os.getenv("ONNX_INT8_MODEL_PATH", str(ONNX_MODEL_PATH.with_name(f"{ONNX_MODEL_PATH.stem}.int8.onnx")))
+).expanduser().resolve()
+ONNX_INT8_ENABLED = os.getenv("ONNX_INT8_ENABLED", "1").strip().lower() not in {"0", "false", "no"}
+ONNX_PROVIDER = os.getenv("ONNX_PROVIDER", "auto")
+ONNX_THREADS = os.getenv("ONNX_THREADS", "0")
+
+COMPOSITES_ENABLED = os.getenv("COMPOSITES_ENABLED", "1").strip().lower() not in {"0", "false", "no"}
+CASCADE_MODEL_ID = os.getenv("CASCADE_MODEL_ID", "cascade")
+ENSEMBLE_MODEL_ID = os.getenv("ENSEMBLE_MODEL_ID", "ensemble")
+CASCADE_FAST_MODEL_ID = os.getenv("CASCADE_FAST_MODEL_ID", YOLO_MODEL_ID)
+CASCADE_SLOW_MODEL_ID = os.getenv("CASCADE_SLOW_MODEL_ID", FRCNN_MODEL_ID)
+CASCADE_MIN_CONF = os.getenv("CASCADE_MIN_CONF", "0.5")
+ENSEMBLE_IOU = os.getenv("ENSEMBLE_IOU", "0.55")
+COMPOSITE_CONCURRENCY = os.getenv("COMPOSITE_CONCURRENCY", "4")
+
 DEFAULT_MODEL_ID = os.getenv("DEFAULT_MODEL_ID", YOLO_MODEL_ID)
+LABEL_MAP_PATH = os.getenv("LABEL_MAP_PATH", "")
+
+BATCH_MAX_SIZE = os.getenv("BATCH_MAX_SIZE", "8")
+BATCH_MAX_WAIT_MS = os.getenv("BATCH_MAX_WAIT_MS", "5")
+INFER_MAX_QUEUE = os.getenv("INFER_MAX_QUEUE", "32")
+INFER_QUEUE_RESERVE = os.getenv("INFER_QUEUE_RESERVE", "0.25")
+MODEL_CONCURRENCY = os.getenv("MODEL_CONCURRENCY", "")
+DECODE_WORKERS = os.getenv("DECODE_WORKERS", "4")
+DECODE_MAX_PENDING = os.getenv("DECODE_MAX_PENDING", "64")
+DECODE_PROCESSES = os.getenv("DECODE_PROCESSES", "0").strip().lower() in {"1", "true", "yes"}
+BUSY_RETRY_AFTER_S = 1
+PREDICT_MAX_UPLOAD_MB = os.getenv("PREDICT_MAX_UPLOAD_MB", "20")
+UPLOAD_MAX_MEGAPIXELS = os.getenv("UPLOAD_MAX_MEGAPIXELS", "64")
+UPLOAD_SPOOL_MEMORY_KB = os.getenv("UPLOAD_SPOOL_MEMORY_KB", "1024")
+PREDICT_DEADLINE_MS = os.getenv("PREDICT_DEADLINE_MS", "0")
+STREAM_DEADLINE_MS = os.getenv("STREAM_DEADLINE_MS", "0")
+# Batcher queue priorities: interactive stream frames first, bulk batches last.
+PRIORITY_STREAM = 0
+PRIORITY_PREDICT = 1
+PRIORITY_BULK = 2
+PREDICT_BATCH_MAX_ITEMS = os.getenv("PREDICT_BATCH_MAX_ITEMS", "256")
+PREDICT_BATCH_MAX_ITEM_MB = os.getenv("PREDICT_BATCH_MAX_ITEM_MB", "20")
+PREDICT_BATCH_CONCURRENCY = os.getenv("PREDICT_BATCH_CONCURRENCY", BATCH_MAX_SIZE)
+
+RESULT_CACHE_ENTRIES = os.getenv("RESULT_CACHE_ENTRIES", "512")
+RESULT_CACHE_MAX_BYTES = os.getenv("RESULT_CACHE_MAX_BYTES", str(32 * 1024 * 1024))
+RESULT_CACHE_TTL_S = os.getenv("RESULT_CACHE_TTL_S", "300")
+RESULT_CACHE_PHASH = os.getenv("RESULT_CACHE_PHASH", "0").strip().lower() in {"1", "true", "yes"}
+
+STREAM_MAX_IN_FLIGHT = os.getenv("STREAM_MAX_IN_FLIGHT", "1")
+TRACK_MOTION_THRESHOLD = os.getenv("TRACK_MOTION_THRESHOLD", "0.04")
+TRACK_MAX_SHIFT = os.getenv("TRACK_MAX_SHIFT", "0.15")
+TRACK_KEYFRAME_INTERVAL = os.getenv("TRACK_KEYFRAME_INTERVAL", "10")
+TRACK_IOU = os.getenv("TRACK_IOU", "0.3")
+TRACK_MAX_MISSES = os.getenv("TRACK_MAX_MISSES", "2")
+
+MODEL_WORKERS = os.getenv("MODEL_WORKERS", "0")
+MODEL_WORKER_THREADS = os.getenv("MODEL_WORKER_THREADS", "0")
+MODEL_WORKER_PIN_CORES = os.getenv("MODEL_WORKER_PIN_CORES", "0").strip().lower() in {"1", "true", "yes"}
+IS_MODEL_WORKER = os.getenv(WORKER_ROLE_ENV) == "worker"
+
+MODEL_PRELOAD = os.getenv("MODEL_PRELOAD", "default")
+MODEL_MEMORY_BUDGET_MB = os.getenv("MODEL_MEMORY_BUDGET_MB", "0")
+MODEL_WATCH_INTERVAL_S = os.getenv("MODEL_WATCH_INTERVAL_S", "0")
+MODEL_RELOAD_HISTORY = 10
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+MODEL_WARMUP_IMGSZ = os.getenv("MODEL_WARMUP_IMGSZ", "640")
+MODEL_WARMUP_RUNS = os.getenv("MODEL_WARMUP_RUNS", "1")
+FRCNN_COMPILE = os.getenv("FRCNN_COMPILE", "").strip().lower()
+METRICS_SERVER_TIMING = os.getenv("METRICS_SERVER_TIMING", "0").strip().lower() in {"1", "true", "yes"}
+
+TILE_MAX_GRID = os.getenv("TILE_MAX_GRID", "4")
+TILE_MERGE_IOS = os.getenv("TILE_MERGE_IOS", "0.5")
+TILE_DECODE_MAX_SIDE = os.getenv("TILE_DECODE_MAX_SIDE", "4096")
+
+ADAPTIVE_IMGSZ_LADDER = os.getenv("ADAPTIVE_IMGSZ_LADDER", "320,480,640,960,1280")
+ADAPTIVE_MIN_CONF = os.getenv("ADAPTIVE_MIN_CONF", "0.5")
+ADAPTIVE_TINY_AREA = os.getenv("ADAPTIVE_TINY_AREA", "0.0025")
+ADAPTIVE_LATENCY_BUDGET_MS = os.getenv("ADAPTIVE_LATENCY_BUDGET_MS", "0")
 
 
 def _now_iso() -> str:
     return datetime.now(timezone.utc).isoformat()
 
 
-def _clamp01(value: float) -> float:
-    if value != value:
-        return 0.0
-    return max(0.0, min(1.0, value))
-
-
-ALLOWED = {"plastic", "paper", "glass", "metal", "battery", "organic", "unknown"}
-
-
-def _strip_turkish(s: str) -> str:
-    return (
-        (s or "")
-        .replace("İ", "I")
-        .replace("ı", "i")
-        .replace("ğ", "g")
-        .replace("Ğ", "G")
-        .replace("ş", "s")
-        .replace("Ş", "S")
-        .replace("ö", "o")
-        .replace("Ö", "O")
-        .replace("ü", "u")
-        .replace("Ü", "U")
-        .replace("ç", "c")
-        .replace("Ç", "C")
-    )
-
-
-def _normalize_label(raw: str) -> str:
-    label = _strip_turkish(raw).strip().lower()
-    if label in ALLOWED:
-        return label
-
-    # Your dataset labels (TR) → app categories
-    if label == "cam":
-        return "glass"
-    if label in {"kagit", "kagıt", "kâgit", "kâgıt"}:
-        return "paper"
-    if label == "pil":
-        return "battery"
-    if label == "plastik":
-        return "plastic"
-
-    if label == "cardboard":
-        return "paper"
-    if label in {"can", "aluminium", "aluminum", "tin"}:
-        return "metal"
-    if label in {"compost", "food", "food_waste"}:
-        return "organic"
-    return "unknown"
-
-
 @dataclass(frozen=True)
 class ModelEntry:
     id: str
@@ -112,111 +186,8 @@ class ModelEntry:
     kind: str
     version: str
     infer: Callable[..., tuple[list, int, int]]
-
-
-def _iou_xyxy(a, b) -> float:
-    x1 = max(a[0], b[0])
-    y1 = max(a[1], b[1])
-    x2 = min(a[2], b[2])
-    y2 = min(a[3], b[3])
-    inter_w = max(0.0, x2 - x1)
-    inter_h = max(0.0, y2 - y1)
-    inter = inter_w * inter_h
-    area_a = max(0.0, a[2] - a[0]) * max(0.0, a[3] - a[1])
-    area_b = max(0.0, b[2] - b[0]) * max(0.0, b[3] - b[1])
-    union = area_a + area_b - inter
-    if union <= 0:
-        return 0.0
-    return inter / union
-
-
-def _dedupe_overlaps(
-    detections: list,
-    iou_threshold: float = 0.85,
-    min_area_ratio: float = 0.85,
-) -> list:
-    boxed = [d for d in detections if isinstance(d.get("box"), dict)]
-    others = [d for d in detections if not isinstance(d.get("box"), dict)]
-    if not boxed:
-        return detections
-
-    sorted_boxes = sorted(boxed, key=lambda d: d.get("confidence", 0.0), reverse=True)
-    kept = []
-    for cand in sorted_boxes:
-        box = cand["box"]
-        x1, y1 = float(box["x"]), float(box["y"])
-        x2, y2 = x1 + float(box["width"]), y1 + float(box["height"])
-        cand_xyxy = (x1, y1, x2, y2)
-        cand_area = max(0.0, x2 - x1) * max(0.0, y2 - y1)
-
-        suppressed = False
-        for prev in kept:
-            if prev.get("label") == cand.get("label"):
-                continue
-            pbox = prev["box"]
-            px1, py1 = float(pbox["x"]), float(pbox["y"])
-            px2, py2 = px1 + float(pbox["width"]), py1 + float(pbox["height"])
-            prev_xyxy = (px1, py1, px2, py2)
-            prev_area = max(0.0, px2 - px1) * max(0.0, py2 - py1)
-
-            overlap = _iou_xyxy(cand_xyxy, prev_xyxy)
-            if overlap < iou_threshold:
-                continue
-
-            # If sizes are similar, treat as same object -> keep highest confidence only.
-            area_ratio = min(cand_area, prev_area) / max(cand_area, prev_area) if prev_area > 0 else 0.0
-            if area_ratio >= min_area_ratio:
-                suppressed = True
-                break
-
-        if not suppressed:
-            kept.append(cand)
-
-    return kept + others
-
-
-def _dedupe_same_label(
-    detections: list,
-    iou_threshold: float = 0.85,
-    min_area_ratio: float = 0.9,
-) -> list:
-    boxed = [d for d in detections if isinstance(d.get("box"), dict)]
-    others = [d for d in detections if not isinstance(d.get("box"), dict)]
-    if not boxed:
-        return detections
-
-    sorted_boxes = sorted(boxed, key=lambda d: d.get("confidence", 0.0), reverse=True)
-    kept = []
-    for cand in sorted_boxes:
-        box = cand["box"]
-        x1, y1 = float(box["x"]), float(box["y"])
-        x2, y2 = x1 + float(box["width"]), y1 + float(box["height"])
-        cand_xyxy = (x1, y1, x2, y2)
-        cand_area = max(0.0, x2 - x1) * max(0.0, y2 - y1)
-
-        suppressed = False
-        for prev in kept:
-            if prev.get("label") != cand.get("label"):
-                continue
-            pbox = prev["box"]
-            px1, py1 = float(pbox["x"]), float(pbox["y"])
-            px2, py2 = px1 + float(pbox["width"]), py1 + float(pbox["height"])
-            prev_xyxy = (px1, py1, px2, py2)
-            prev_area = max(0.0, px2 - px1) * max(0.0, py2 - py1)
-
-            overlap = _iou_xyxy(cand_xyxy, prev_xyxy)
-            if overlap < iou_threshold:
-                continue
-
-            area_ratio = min(cand_area, prev_area) / max(cand_area, prev_area) if prev_area > 0 else 0.0
-            if area_ratio >= min_area_ratio:
-                suppressed = True
-                break
-
-        if not suppressed:
-            kept.append(cand)
-
-    return kept + others
+    infer_batch: Optional[Callable[..., list[tuple[list, int, int]]]] = None
+    memory_bytes: int = 0
 
 
 def _get_dedupe_config() -> tuple[float, float, float, float]:
@@ -251,19 +222,70 @@ def _coerce_int(value, default, minimum=None, maximum=None) -> int:
     return out
 
 
-def _infer_yolo(
+LABEL_MAP = load_label_map(Path(LABEL_MAP_PATH).expanduser()) if LABEL_MAP_PATH else DEFAULT_LABEL_MAP
+
+
+def _category_table(names: dict) -> np.ndarray:
+    return category_table(names, LABEL_MAP)
+
+
+def _class_detections(
+    xyxy, scores, cls_ids, table: np.ndarray, width: int, height: int, scale: tuple[float, float] = (1.0, 1.0)
+) -> list:
+    codes = map_classes(table, cls_ids)
+    return detections_from_arrays(
+        xyxy, scores, category_labels(codes), width, height, _get_dedupe_config(), scale=scale, label_codes=codes
+    )
+
+
+def _yolo_result_to_detections(r, table: np.ndarray, width: int, height: int, conf: float, topk: int) -> list:
+    detections = []
+    boxes = getattr(r, "boxes", None)
+    if boxes is not None and len(boxes) > 0:
+        xyxy = boxes.xyxy.cpu().numpy()
+        confs = boxes.conf.cpu().numpy()
+        clss = boxes.cls.cpu().numpy().astype(int)
+        return _class_detections(xyxy, confs, clss, table, width, height)
+
+    probs = getattr(r, "probs", None)
+    data = getattr(probs, "data", None) if probs is not None else None
+    if data is not None:
+        arr = data.cpu().numpy()
+        if arr.size > 0:
+            idxs = arr.argsort()[::-1][: max(1, int(topk))]
+            labels = category_labels(map_classes(table, idxs))
+            for cls_id, label in zip(idxs, labels):
+                score = float(arr[int(cls_id)])
+                if score < float(conf):
+                    continue
+                detections.append(
+                    {
+                        "label": str(label),
+                        "confidence": clamp01(score),
+                    }
+                )
+    detections.sort(key=lambda d: d["confidence"], reverse=True)
+    return detections
+
+
+def _infer_yolo_batch(
     yolo: YOLO,
-    image: Image.Image,
+    images: list[Image.Image],
     conf: float = 0.15,
     iou: float = 0.7,
     max_det: int = 300,
     topk: int = 5,
     agnostic_nms: bool = False,
     imgsz: int = 640,
-):
-    width, height = image.size
+    table: Optional[np.ndarray] = None,
+    timings: Optional[dict] = None,
+) -> list[tuple[list, int, int]]:
+    if not images:
+        return []
+    if table is None:
+        table = _category_table(yolo.names)
     results = yolo.predict(
-        source=image,
+        source=list(images),
         conf=conf,
         iou=iou,
         max_det=max_det,
@@ -271,56 +293,44 @@ def _infer_yolo(
         imgsz=imgsz,
         verbose=False,
     )
-    r = results[0]
 
-    detections = []
-    names = getattr(r, "names", None) or getattr(yolo, "names", {})
-    boxes = getattr(r, "boxes", None)
-    if boxes is not None and len(boxes) > 0:
-        xyxy = boxes.xyxy.cpu().numpy()
-        confs = boxes.conf.cpu().numpy()
-        clss = boxes.cls.cpu().numpy().astype(int)
-
-        for (x1, y1, x2, y2), score, cls_id in zip(xyxy, confs, clss):
-            label_raw = names.get(int(cls_id), str(cls_id))
-            label = _normalize_label(str(label_raw))
+    start = time.perf_counter()
+    out = []
+    for image, r in zip(images, results):
+        width, height = image.size
+        out.append((_yolo_result_to_detections(r, table, width, height, conf, topk), width, height))
+    if timings is not None:
+        # Ultralytics reports per-image averages in ms for the batch it just ran.
+        speed = getattr(results[0], "speed", None) or {}
+        stages = (("preprocess", "preprocess"), ("forward", "inference"), ("postprocess", "postprocess"))
+        for stage, key in stages:
+            timings[stage] = float(speed.get(key) or 0.0) * len(images) / 1000.0
+        timings["postprocess"] += time.perf_counter() - start
+    return out
 
-            x = _clamp01(float(x1) / float(width))
-            y = _clamp01(float(y1) / float(height))
-            w = _clamp01(float(x2 - x1) / float(width))
-            h = _clamp01(float(y2 - y1) / float(height))
 
-            detections.append(
-                {
-                    "label": label,
-                    "confidence": _clamp01(float(score)),
-                    "box": {"x": x, "y": y, "width": w, "height": h},
-                }
-            )
-    else:
-        probs = getattr(r, "probs", None)
-        data = getattr(probs, "data", None) if probs is not None else None
-        if data is not None:
-            arr = data.cpu().numpy()
-            if arr.size > 0:
-                idxs = arr.argsort()[::-1][: max(1, int(topk))]
-                for cls_id in idxs:
-                    score = float(arr[int(cls_id)])
-                    if score < float(conf):
-                        continue
-                    label_raw = names.get(int(cls_id), str(cls_id))
-                    detections.append(
-                        {
-                            "label": _normalize_label(str(label_raw)),
-                            "confidence": _clamp01(score),
-                        }
-                    )
-
-    same_iou, same_area, cross_iou, cross_area = _get_dedupe_config()
-    detections = _dedupe_same_label(detections, same_iou, same_area)
-    detections = _dedupe_overlaps(detections, cross_iou, cross_area)
-    detections.sort(key=lambda d: d["confidence"], reverse=True)
-    return detections, width, height
+def _infer_yolo(
+    yolo: YOLO,
+    image: Image.Image,
+    conf: float = 0.15,
+    iou: float = 0.7,
+    max_det: int = 300,
+    topk: int = 5,
+    agnostic_nms: bool = False,
+    imgsz: int = 640,
+    table: Optional[np.ndarray] = None,
+):
+    return _infer_yolo_batch(
+        yolo,
+        [image],
+        conf=conf,
+        iou=iou,
+        max_det=max_det,
+        topk=topk,
+        agnostic_nms=agnostic_nms,
+        imgsz=imgsz,
+        table=table,
+    )[0]
 
 
 def _parse_class_names(raw: Optional[str]) -> list[str]:
@@ -353,10 +363,16 @@ def _resolve_frcnn_device() -> str:
     return "cpu"
 
 
-def _load_yolo_entry() -> ModelEntry:
-    if not YOLO_MODEL_PATH.exists():
-        raise RuntimeError(f"YOLO model file not found: {YOLO_MODEL_PATH}")
-    yolo = YOLO(str(YOLO_MODEL_PATH))
+def _module_bytes(module) -> int:
+    tensors = list(module.parameters()) + list(module.buffers())
+    return sum(t.numel() * t.element_size() for t in tensors)
+
+
+def _load_yolo_entry(path: Path = YOLO_MODEL_PATH, version: str = YOLO_MODEL_VERSION) -> ModelEntry:
+    if not path.exists():
+        raise RuntimeError(f"YOLO model file not found: {path}")
+    yolo = YOLO(str(path))
+    table = _category_table(yolo.names)
 
     def infer(
         image: Image.Image,
@@ -376,72 +392,58 @@ def _load_yolo_entry() -> ModelEntry:
             topk=topk,
             agnostic_nms=agnostic_nms,
             imgsz=imgsz,
+            table=table,
         )
 
+    def infer_batch(images: list[Image.Image], **params):
+        timings = {}
+        results = _infer_yolo_batch(yolo, images, table=table, timings=timings, **params)
+        STAGES.observe_all(YOLO_MODEL_ID, params.get("imgsz", 640), timings)
+        return results
+
     return ModelEntry(
         id=YOLO_MODEL_ID,
         label=YOLO_MODEL_LABEL,
         kind="yolo",
-        version=YOLO_MODEL_VERSION,
+        version=version,
         infer=infer,
+        infer_batch=infer_batch,
+        memory_bytes=_module_bytes(yolo.model),
     )
 
 
-def _load_frcnn_entry() -> Optional[ModelEntry]:
+def _frcnn_configured() -> bool:
     if not FRCNN_ENABLED:
-        return None
+        return False
     if FRCNN_MODEL_PATH_ENV and not FRCNN_MODEL_PATH.exists():
         raise RuntimeError(f"Faster R-CNN model file not found: {FRCNN_MODEL_PATH}")
     if not FRCNN_MODEL_PATH.exists():
-        return None
+        return False
     if not TORCHVISION_AVAILABLE:
         raise RuntimeError("torchvision is required for Faster R-CNN models")
+    return True
+
+
+def _compile_frcnn(model):
+    # Only the backbone is compiled: it dominates the forward pass and, with
+    # bucketed inputs, only ever sees a handful of fixed shapes.
+    if FRCNN_COMPILE in {"script", "torchscript"}:
+        model.backbone = torch.jit.script(model.backbone)
+    elif FRCNN_COMPILE == "compile" and hasattr(torch, "compile"):
+        model.backbone = torch.compile(model.backbone, dynamic=False)
+    return model
+
 
+def _load_frcnn_entry(path: Path = FRCNN_MODEL_PATH, version: str = FRCNN_MODEL_VERSION) -> ModelEntry:
     class_names = _parse_class_names(os.getenv("FRCNN_CLASS_NAMES"))
     num_classes = _coerce_int(os.getenv("FRCNN_NUM_CLASSES"), len(class_names) + 1, 2, 1000)
     device = _resolve_frcnn_device()
 
-    model = fasterrcnn_resnet50_fpn(weights=None)
-    in_features = model.roi_heads.box_predictor.cls_score.in_features
-    model.roi_heads.box_predictor = FastRCNNPredictor(in_features, num_classes)
+    model = _compile_frcnn(load_frcnn(path, num_classes, device))
+    # torchvision labels are 1-based: 0 is the background class.
+    table = _category_table({i + 1: name for i, name in enumerate(class_names)})
 
-    checkpoint = torch.load(str(FRCNN_MODEL_PATH), map_location=device)
-    if isinstance(checkpoint, dict) and "model_state_dict" in checkpoint:
-        state = checkpoint["model_state_dict"]
-    else:
-        state = checkpoint
-    model.load_state_dict(state)
-    model.to(device)
-    model.eval()
-
-    def infer(
-        image: Image.Image,
-        conf: float = 0.15,
-        iou: float = 0.7,
-        max_det: int = 300,
-        topk: int = 5,
-        agnostic_nms: bool = False,
-        imgsz: int = 640,
-    ):
-        orig_w, orig_h = image.size
-        resized, scale_x, scale_y = _resize_for_frcnn(image, imgsz)
-        if hasattr(model, "transform"):
-            resized_w, resized_h = resized.size
-            model.transform.min_size = (min(resized_w, resized_h),)
-            model.transform.max_size = max(resized_w, resized_h)
-        tensor = to_tensor(resized).to(device)
-
-        if hasattr(model, "roi_heads"):
-            model.roi_heads.score_thresh = float(conf)
-            model.roi_heads.nms_thresh = float(iou)
-            model.roi_heads.detections_per_img = int(max_det)
-
-        with torch.no_grad():
-            outputs = model([tensor])
-        if not outputs:
-            return [], orig_w, orig_h
-
-        out = outputs[0] if isinstance(outputs, list) else outputs
+    def postprocess(out, orig_w: int, orig_h: int, scale_x: float, scale_y: float, conf: float, max_det: int):
         boxes = out.get("boxes")
         scores = out.get("scores")
         labels = out.get("labels")
@@ -453,63 +455,674 @@ def _load_frcnn_entry() -> Optional[ModelEntry]:
         scores_np = scores.detach().cpu().numpy()
         labels_np = labels.detach().cpu().numpy().astype(int)
 
-        detections = []
-        for (x1, y1, x2, y2), score, cls_id in zip(boxes_np, scores_np, labels_np):
-            if float(score) < float(conf):
-                continue
-            idx = int(cls_id) - 1
-            label_raw = class_names[idx] if 0 <= idx < len(class_names) else str(cls_id)
-            label = _normalize_label(label_raw)
-
-            x1 = float(x1) * scale_x
-            y1 = float(y1) * scale_y
-            x2 = float(x2) * scale_x
-            y2 = float(y2) * scale_y
-
-            x = _clamp01(x1 / orig_w)
-            y = _clamp01(y1 / orig_h)
-            w = _clamp01((x2 - x1) / orig_w)
-            h = _clamp01((y2 - y1) / orig_h)
-
-            detections.append(
-                {
-                    "label": label,
-                    "confidence": _clamp01(float(score)),
-                    "box": {"x": x, "y": y, "width": w, "height": h},
-                }
-            )
-
-        same_iou, same_area, cross_iou, cross_area = _get_dedupe_config()
-        detections = _dedupe_same_label(detections, same_iou, same_area)
-        detections = _dedupe_overlaps(detections, cross_iou, cross_area)
-        detections.sort(key=lambda d: d["confidence"], reverse=True)
+        mask = scores_np >= float(conf)
+        detections = _class_detections(
+            boxes_np[mask], scores_np[mask], labels_np[mask], table, orig_w, orig_h, scale=(scale_x, scale_y)
+        )
         if max_det and len(detections) > max_det:
             detections = detections[: int(max_det)]
         return detections, orig_w, orig_h
 
+    def infer_batch(
+        images: list[Image.Image],
+        conf: float = 0.15,
+        iou: float = 0.7,
+        max_det: int = 300,
+        topk: int = 5,
+        agnostic_nms: bool = False,
+        imgsz: int = 640,
+    ):
+        start = time.perf_counter()
+        prepared = []
+        for image in images:
+            orig_w, orig_h = image.size
+            resized, scale_x, scale_y = _resize_for_frcnn(image, imgsz)
+            prepared.append((resized, orig_w, orig_h, scale_x, scale_y))
+
+        tensors = [to_tensor(resized).to(device) for resized, *_rest in prepared]
+        forward_start = time.perf_counter()
+        outputs = frcnn_detect(model, tensors, imgsz, conf, iou, max_det) if tensors else []
+        post_start = time.perf_counter()
+
+        results = []
+        for (_, orig_w, orig_h, scale_x, scale_y), out in zip(prepared, outputs):
+            results.append(postprocess(out, orig_w, orig_h, scale_x, scale_y, conf, max_det))
+        timings = {
+            "preprocess": forward_start - start,
+            "forward": post_start - forward_start,
+            "postprocess": time.perf_counter() - post_start,
+        }
+        STAGES.observe_all(FRCNN_MODEL_ID, imgsz, timings)
+        return results
+
+    def infer(image: Image.Image, **params):
+        return infer_batch([image], **params)[0]
+
     return ModelEntry(
         id=FRCNN_MODEL_ID,
         label=FRCNN_MODEL_LABEL,
         kind="fasterrcnn",
-        version=FRCNN_MODEL_VERSION,
+        version=version,
         infer=infer,
+        infer_batch=infer_batch,
+        memory_bytes=_module_bytes(model),
     )
 
 
+def _load_onnx_entry(
+    path: Path = ONNX_MODEL_PATH,
+    version: str = ONNX_MODEL_VERSION,
+    model_id: str = ONNX_MODEL_ID,
+    label: str = ONNX_MODEL_LABEL,
+) -> ModelEntry:
+    detector = OnnxDetector(
+        path,
+        providers=resolve_providers(ONNX_PROVIDER),
+        threads=_coerce_int(ONNX_THREADS, 0, 0, 256),
+    )
+    names = detector.names
+    if not names:
+        # Graphs without a names entry in their metadata use the FRCNN_CLASS_NAMES list;
+        # torchvision labels are 1-based because 0 is the background class.
+        offset = 1 if detector.layout == "fasterrcnn" else 0
+        class_names = _parse_class_names(os.getenv("ONNX_CLASS_NAMES", os.getenv("FRCNN_CLASS_NAMES")))
+        names = {i + offset: name for i, name in enumerate(class_names)}
+    table = _category_table(names)
+
+    def infer_batch(
+        images: list[Image.Image],
+        conf: float = 0.15,
+        iou: float = 0.7,
+        max_det: int = 300,
+        topk: int = 5,
+        agnostic_nms: bool = False,
+        imgsz: int = 640,
+    ):
+        timings = {}
+        raw = detector.detect_batch(
+            images,
+            conf=conf,
+            iou=iou,
+            max_det=max_det,
+            agnostic_nms=agnostic_nms,
+            imgsz=imgsz,
+            timings=timings,
+        )
+        start = time.perf_counter()
+        results = []
+        for image, (boxes, scores, cls_ids) in zip(images, raw):
+            width, height = image.size
+            detections = _class_detections(boxes, scores, cls_ids, table, width, height)
+            results.append((detections, width, height))
+        timings["postprocess"] = timings.get("postprocess", 0.0) + time.perf_counter() - start
+        STAGES.observe_all(model_id, imgsz, timings)
+        return results
+
+    def infer(image: Image.Image, **params):
+        return infer_batch([image], **params)[0]
+
+    return ModelEntry(
+        id=model_id,
+        label=label,
+        kind="onnx",
+        version=version,
+        infer=infer,
+        infer_batch=infer_batch,
+        memory_bytes=path.stat().st_size,
+    )
+
+
+def _onnx_models() -> list[tuple[str, Path, str, str]]:
+    if not ONNX_ENABLED:
+        return []
+    if ONNX_MODEL_PATH_ENV and not ONNX_MODEL_PATH.exists():
+        raise RuntimeError(f"ONNX model file not found: {ONNX_MODEL_PATH}")
+    if not ONNX_MODEL_PATH.exists():
+        return []
+    if not ONNX_AVAILABLE:
+        raise RuntimeError("onnxruntime is required for ONNX models")
+    models = [(ONNX_MODEL_ID, ONNX_MODEL_PATH, ONNX_MODEL_LABEL, ONNX_MODEL_VERSION)]
+    # An INT8 graph written by server.quantize next to the FP32 one is served
+    # alongside it under its own id so the two can be compared from the app.
+    if ONNX_INT8_ENABLED and ONNX_INT8_MODEL_PATH.exists():
+        models.append(
+            (
+                f"{ONNX_MODEL_ID}-int8",
+                ONNX_INT8_MODEL_PATH,
+                f"{ONNX_MODEL_LABEL} INT8",
+                f"onnx:{ONNX_INT8_MODEL_PATH.name}",
+            )
+        )
+    return models
+
+
+@dataclass
+class _ModelSource:
+    id: str
+    label: str
+    kind: str
+    version: str
+    path: Path
+    factory: Callable[[Path, str], ModelEntry]
+    stamp: tuple = ()
+    pending: tuple = ()
+    history: list = field(default_factory=list)
+    reload_lock: threading.Lock = field(default_factory=threading.Lock)
+
+
+def _file_stamp(path: Path) -> tuple[int, int]:
+    stat = path.stat()
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _file_digest(path: Path) -> str:
+    digest = hashlib.blake2b(digest_size=4)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _configured_models() -> list[_ModelSource]:
+    if not YOLO_MODEL_PATH.exists():
+        raise RuntimeError(f"YOLO model file not found: {YOLO_MODEL_PATH}")
+    sources = [
+        _ModelSource(
+            YOLO_MODEL_ID,
+            YOLO_MODEL_LABEL,
+            "yolo",
+            YOLO_MODEL_VERSION,
+            YOLO_MODEL_PATH,
+            _load_yolo_entry,
+        )
+    ]
+    if _frcnn_configured():
+        sources.append(
+            _ModelSource(
+                FRCNN_MODEL_ID,
+                FRCNN_MODEL_LABEL,
+                "fasterrcnn",
+                FRCNN_MODEL_VERSION,
+                FRCNN_MODEL_PATH,
+                _load_frcnn_entry,
+            )
+        )
+    for model_id, path, label, version in _onnx_models():
+        factory = partial(_load_onnx_entry, model_id=model_id, label=label)
+        sources.append(_ModelSource(model_id, label, "onnx", version, path, factory))
+    for source in sources:
+        source.stamp = _file_stamp(source.path)
+    return sources
+
+
 MODEL_REGISTRY: dict[str, ModelEntry] = {}
+MODEL_SOURCES: dict[str, _ModelSource] = {}
+MODEL_WARMUP: dict[str, dict] = {}
+MODEL_READY = threading.Event()
+MODEL_BATCHERS: dict[str, MicroBatcher] = {}
+MODEL_COMPOSITES: dict[str, tuple[str, ...]] = {}
+MODEL_ROUTES: dict[str, Counter] = {}
+ADAPTIVE_SIZES: dict[str, Counter] = {}
+# Held while a reload publishes a new version and while results are cached, so no
+# result is stored under a version other than the one serving.
+MODEL_VERSION_LOCK = threading.Lock()
+# (model id, stage) -> requests shed because their deadline passed before that stage.
+DEADLINES_SHED: Counter = Counter()
+MODEL_LOADER = ModelLoader(budget_bytes=_coerce_int(MODEL_MEMORY_BUDGET_MB, 0, 0, 1 << 20) * 1024 * 1024)
+WORKER_POOL: Optional[ModelWorkerPool] = None
+DECODE_POOL = DecodePool(
+    workers=_coerce_int(DECODE_WORKERS, 4, 1, 64),
+    max_pending=_coerce_int(DECODE_MAX_PENDING, 64, 1, 10000),
+    use_processes=DECODE_PROCESSES,
+)
+STREAM_COUNTERS = StreamCounters()
+RESULT_CACHE = ResultCache(
+    max_entries=_coerce_int(RESULT_CACHE_ENTRIES, 512, 0, 1_000_000),
+    max_bytes=_coerce_int(RESULT_CACHE_MAX_BYTES, 32 * 1024 * 1024, 0, 1 << 40),
+    ttl_s=_coerce_float(RESULT_CACHE_TTL_S, 300.0, 0.0, 86400.0),
+    perceptual=RESULT_CACHE_PHASH,
+)
+
 
+def _parse_model_concurrency(raw: str, model_id: str, default: int = 1) -> int:
+    # Either a single number for every model or "yolo=2,frcnn=1".
+    for part in (raw or "").replace(";", ",").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "=" in part:
+            key, value = part.split("=", 1)
+            if key.strip() == model_id:
+                return _coerce_int(value.strip(), 1, 1, 64)
+        else:
+            default = _coerce_int(part, 1, 1, 64)
+    return default
 
-def _register_model(entry: ModelEntry) -> None:
+
+def _make_batch_runner(entry: ModelEntry) -> Callable[..., list]:
+    if entry.infer_batch is not None:
+        return entry.infer_batch
+
+    def run(images: list, **params):
+        return [entry.infer(image, **params) for image in images]
+
+    return run
+
+
+def _register_model(entry: ModelEntry, default_workers: int = 0, item_context: bool = False) -> None:
     if entry.id in MODEL_REGISTRY:
         raise RuntimeError(f"Duplicate model id: {entry.id}")
     MODEL_REGISTRY[entry.id] = entry
+    if default_workers <= 0:
+        default_workers = WORKER_POOL.num_workers if WORKER_POOL is not None else 1
+    MODEL_BATCHERS[entry.id] = MicroBatcher(
+        entry.id,
+        _make_batch_runner(entry),
+        max_batch_size=_coerce_int(BATCH_MAX_SIZE, 8, 1, 64),
+        max_wait_ms=_coerce_float(BATCH_MAX_WAIT_MS, 5.0, 0.0, 1000.0),
+        workers=_parse_model_concurrency(MODEL_CONCURRENCY, entry.id, default=default_workers),
+        max_queue=_coerce_int(INFER_MAX_QUEUE, 32, 1, 10000),
+        item_context=item_context,
+        reserve=_coerce_float(INFER_QUEUE_RESERVE, 0.25, 0.0, 0.5),
+    )
+
+
+def _register_lazy_model(
+    model_id: str, label: str, kind: str, version: str, load: Callable[[], ModelEntry]
+) -> None:
+    # The registry only holds a descriptor; weights are loaded on first use (or by
+    # MODEL_PRELOAD) and may be evicted again under MODEL_MEMORY_BUDGET_MB.
+    MODEL_LOADER.add(model_id, load)
+    infer_batch = partial(MODEL_LOADER.run_batch, model_id)
+
+    def infer(image: Image.Image, **params):
+        return infer_batch([image], **params)[0]
+
+    _register_model(
+        ModelEntry(
+            id=model_id,
+            label=label,
+            kind=kind,
+            version=version,
+            infer=infer,
+            infer_batch=infer_batch,
+        )
+    )
+
+
+def _preload_ids(raw: str, default_id: str) -> list[str]:
+    raw = (raw or "").strip().lower()
+    if raw in {"", "default"}:
+        ids = [default_id]
+    elif raw in {"none", "0", "false", "no"}:
+        ids = []
+    elif raw in {"all", "*"}:
+        ids = list(MODEL_SOURCES)
+    else:
+        ids = [part.strip() for part in raw.replace(";", ",").split(",") if part.strip()]
+    # A composite model preloads the models it runs.
+    expanded = []
+    for model_id in ids:
+        for member in MODEL_COMPOSITES.get(model_id, (model_id,)):
+            if member in MODEL_SOURCES and member not in expanded:
+                expanded.append(member)
+    return expanded
+
+
+def _init_worker_models(num_workers: int) -> None:
+    global WORKER_POOL
+    WORKER_POOL = ModelWorkerPool(
+        num_workers,
+        threads_per_worker=_coerce_int(MODEL_WORKER_THREADS, 0, 0, 256),
+        pin_cores=MODEL_WORKER_PIN_CORES,
+        ready=MODEL_READY,
+    )
+    manifest = WORKER_POOL.start()
+    MODEL_WARMUP.update(manifest.get("warmup", {}))
+    for desc in manifest["models"]:
+        infer_batch = partial(WORKER_POOL.infer_batch, desc["id"])
+
+        def infer(image: Image.Image, _infer_batch=infer_batch, **params):
+            return _infer_batch([image], **params)[0]
+
+        _register_model(
+            ModelEntry(
+                id=desc["id"],
+                label=desc["label"],
+                kind=desc["kind"],
+                version=desc["version"],
+                infer=infer,
+                infer_batch=infer_batch,
+            )
+        )
+
+
+def _top_confidence(detections: list) -> float:
+    return max((d["confidence"] for d in detections), default=0.0)
+
+
+def _composite_version(kind: str, member_ids: tuple[str, ...]) -> str:
+    # Changes whenever a member is reloaded, which also retires cached results.
+    return f"{kind}:" + "+".join(MODEL_REGISTRY[m].version for m in member_ids)
+
+
+def _submit_member(member_id: str, image, deadline: Optional[float], priority: int, **params) -> Future:
+    # A full member queue or a passed deadline comes back on the future, so it fails
+    # only that composite item.
+    try:
+        _check_deadline(deadline, member_id, "submit")
+        return MODEL_BATCHERS[member_id].submit(image, deadline=deadline, priority=priority, **params)
+    except (QueueFullError, DeadlineExceededError) as e:
+        future = Future()
+        future.set_exception(e)
+        return future
+
+
+def _member_result(future: Future):
+    try:
+        return future.result()
+    except Exception as e:
+        return e
+
+
+def _cascade_batch(
+    model_id: str,
+    fast_id: str,
+    slow_id: str,
+    images: list,
+    deadlines: Optional[list] = None,
+    priorities: Optional[list] = None,
+    **params,
+) -> list:
+    # Runs through the members' batchers, so composite traffic is batched together
+    # with direct requests for the same models, at the priority and deadline of the
+    # request that came in.
+    min_conf = _coerce_float(CASCADE_MIN_CONF, 0.5, 0.0, 1.0)
+    deadlines = deadlines or [None] * len(images)
+    priorities = priorities or [PRIORITY_PREDICT] * len(images)
+    # Everything is submitted before waiting on anything, so each pass is one batch.
+    futures = [
+        _submit_member(fast_id, image, deadline, priority, **params)
+        for image, deadline, priority in zip(images, deadlines, priorities)
+    ]
+    fast = [_member_result(f) for f in futures]
+    escalated = {
+        i: _submit_member(slow_id, images[i], deadlines[i], priorities[i], **params)
+        for i, result in enumerate(fast)
+        if not isinstance(result, Exception) and _top_confidence(result[0]) < min_conf
+    }
+    results = []
+    for i, result in enumerate(fast):
+        if isinstance(result, Exception):
+            results.append(result)
+            continue
+        detections, width, height, *_rest = result
+        route = {"path": "fast", "models": [fast_id], "fastConfidence": round(_top_confidence(detections), 4)}
+        if i in escalated:
+            slow = _member_result(escalated[i])
+            if isinstance(slow, Exception):
+                results.append(slow)
+                continue
+            detections = slow[0]
+            route.update(path="escalated", models=[fast_id, slow_id])
+        MODEL_ROUTES[model_id][route["path"]] += 1
+        results.append((detections, width, height, {"route": route}))
+    return results
+
+
+def _ensemble_batch(
+    model_id: str,
+    member_ids: tuple[str, ...],
+    images: list,
+    deadlines: Optional[list] = None,
+    priorities: Optional[list] = None,
+    **params,
+) -> list:
+    iou = _coerce_float(ENSEMBLE_IOU, 0.55, 0.05, 0.95)
+    deadlines = deadlines or [None] * len(images)
+    priorities = priorities or [PRIORITY_PREDICT] * len(images)
+    futures = [
+        [_submit_member(m, image, deadline, priority, **params) for m in member_ids]
+        for image, deadline, priority in zip(images, deadlines, priorities)
+    ]
+    results = []
+    for per_model in futures:
+        outputs = []
+        for future in per_model:
+            output = _member_result(future)
+            if isinstance(output, Exception):
+                # The item has failed; members that haven't started it can skip it.
+                for sibling in per_model:
+                    sibling.cancel()
+                results.append(output)
+                break
+            outputs.append(output)
+        else:
+            detections = weighted_box_fusion([o[0] for o in outputs], iou, int(params.get("max_det", 0)))
+            MODEL_ROUTES[model_id]["ensemble"] += 1
+            route = {"path": "ensemble", "models": list(member_ids)}
+            results.append((detections, outputs[0][1], outputs[0][2], {"route": route}))
+    return results
+
+
+def _register_composites() -> None:
+    fast_id, slow_id = CASCADE_FAST_MODEL_ID, CASCADE_SLOW_MODEL_ID
+    if not COMPOSITES_ENABLED or fast_id == slow_id:
+        return
+    if fast_id not in MODEL_REGISTRY or slow_id not in MODEL_REGISTRY:
+        return
+    members = (fast_id, slow_id)
+    composites = (
+        (
+            CASCADE_MODEL_ID,
+            "cascade",
+            f"Cascade ({fast_id} → {slow_id})",
+            partial(_cascade_batch, CASCADE_MODEL_ID, fast_id, slow_id),
+        ),
+        (
+            ENSEMBLE_MODEL_ID,
+            "ensemble",
+            f"Ensemble ({fast_id} + {slow_id})",
+            partial(_ensemble_batch, ENSEMBLE_MODEL_ID, members),
+        ),
+    )
+    for model_id, kind, label, infer_batch in composites:
+        MODEL_COMPOSITES[model_id] = members
+        MODEL_ROUTES[model_id] = Counter()
+
+        def infer(image: Image.Image, _infer_batch=infer_batch, **params):
+            return _infer_batch([image], **params)[0]
+
+        _register_model(
+            ModelEntry(
+                id=model_id,
+                label=label,
+                kind=kind,
+                version=_composite_version(kind, members),
+                infer=infer,
+                infer_batch=infer_batch,
+            ),
+            # Composite workers mostly wait on the member batchers.
+            default_workers=_coerce_int(COMPOSITE_CONCURRENCY, 4, 1, 64),
+            item_context=True,
+        )
+
+
+def _refresh_composite_versions() -> None:
+    for model_id, members in MODEL_COMPOSITES.items():
+        entry = MODEL_REGISTRY[model_id]
+        MODEL_REGISTRY[model_id] = replace(entry, version=_composite_version(entry.kind, members))
 
 
 def _init_models() -> str:
-    _register_model(_load_yolo_entry())
-    frcnn_entry = _load_frcnn_entry()
-    if frcnn_entry:
-        _register_model(frcnn_entry)
+    for source in _configured_models():
+        MODEL_SOURCES[source.id] = source
+
+    num_workers = _coerce_int(MODEL_WORKERS, 0, 0, 64)
+    if num_workers > 0 and not IS_MODEL_WORKER:
+        # The API process only does I/O; model workers own the weights.
+        # Workers only report ready once their own warm-up is done.
+        _init_worker_models(num_workers)
+        _register_composites()
+        _start_model_watcher()
+        MODEL_READY.set()
+        return _resolve_default_model_id()
+
+    for source in MODEL_SOURCES.values():
+        load = partial(source.factory, source.path, source.version)
+        _register_lazy_model(source.id, source.label, source.kind, source.version, load)
+    if not IS_MODEL_WORKER:
+        _register_composites()
+
+    default_id = _resolve_default_model_id()
+    preload = _preload_ids(MODEL_PRELOAD, default_id)
+    if IS_MODEL_WORKER:
+        _warm_start(preload)
+    else:
+        # Serve /health (as not ready) while the preloaded models load and warm up.
+        threading.Thread(target=_warm_start, args=(preload, False), name="model-warmup", daemon=True).start()
+        _start_model_watcher()
+    return default_id
+
+
+def _synthetic_frame(imgsz: int) -> Image.Image:
+    rng = np.random.default_rng(0)
+    pixels = rng.integers(0, 256, size=(max(32, imgsz * 3 // 4), imgsz, 3), dtype=np.uint8)
+    return Image.fromarray(pixels, "RGB")
+
+
+def _warmup_sizes() -> tuple[int, ...]:
+    sizes = []
+    for part in MODEL_WARMUP_IMGSZ.replace(";", ",").split(","):
+        imgsz = _coerce_int(part.strip(), 0, 0, 4096)
+        if imgsz > 0 and imgsz not in sizes:
+            sizes.append(imgsz)
+    return tuple(sizes)
+
+
+def _warm_up(entry: ModelEntry, sizes: tuple[int, ...], runs: int = 1) -> float:
+    # First passes pay for lazy allocations, kernel selection and layer fusing;
+    # run them on synthetic frames at every size clients commonly ask for.
+    # Their stage timings would only skew the latency histograms.
+    start = time.perf_counter()
+    with STAGES.muted():
+        for imgsz in sizes:
+            frame = _synthetic_frame(imgsz)
+            for _ in range(runs):
+                if entry.infer_batch is not None:
+                    entry.infer_batch([frame], imgsz=imgsz)
+                else:
+                    entry.infer(frame, imgsz=imgsz)
+    return (time.perf_counter() - start) * 1000.0
+
+
+def _warm_start(model_ids: list[str], raise_errors: bool = True) -> None:
+    sizes = _warmup_sizes()
+    runs = _coerce_int(MODEL_WARMUP_RUNS, 1, 0, 100)
+    for model_id in model_ids:
+        try:
+            start = time.perf_counter()
+            entry = MODEL_LOADER.load(model_id)
+            load_ms = (time.perf_counter() - start) * 1000.0
+            warmup_ms = _warm_up(entry, sizes, runs) if runs else 0.0
+        except Exception as e:
+            MODEL_WARMUP[model_id] = {"error": f"{type(e).__name__}: {e}"}
+            if raise_errors:
+                raise
+            # Stay not-ready so the orchestrator replaces this instance.
+            return
+        MODEL_WARMUP[model_id] = {
+            "loadMs": round(load_ms, 1),
+            "warmupMs": round(warmup_ms, 1),
+            "imgsz": list(sizes),
+            "runs": runs,
+        }
+    MODEL_READY.set()
+
+
+def _record_reload(source: _ModelSource, record: dict) -> dict:
+    source.history.append(record)
+    del source.history[:-MODEL_RELOAD_HISTORY]
+    return record
+
+
+def _publish_version(model_id: str, version: str) -> None:
+    # Runs right after the new weights go live. Anything cached for the model or a
+    # composite using it since then may come from either version, so it is dropped.
+    with MODEL_VERSION_LOCK:
+        MODEL_REGISTRY[model_id] = replace(MODEL_REGISTRY[model_id], version=version)
+        _refresh_composite_versions()
+        dependents = {cid for cid, members in MODEL_COMPOSITES.items() if model_id in members}
+        RESULT_CACHE.invalidate({model_id} | dependents)
+
+
+def _reload_model(model_id: str, path: Optional[str] = None, version: Optional[str] = None) -> dict:
+    # Loads and warms the new weights while the old model keeps serving, then swaps.
+    source = MODEL_SOURCES[model_id]
+    new_path = Path(path).expanduser().resolve() if path else source.path
+    if not source.reload_lock.acquire(blocking=False):
+        raise ReloadInProgressError(f"Model '{model_id}' is already reloading")
+    try:
+        if not new_path.exists():
+            raise FileNotFoundError(f"Model file not found: {new_path}")
+        stamp = _file_stamp(new_path)
+        if not version:
+            base = source.version.split("@", 1)[0]
+            version = f"{base}@{_file_digest(new_path)}"
+
+        start = time.perf_counter()
+        record = {"version": version, "path": str(new_path), "at": _now_iso()}
+        if WORKER_POOL is not None:
+            previous = (str(source.path), source.version)
+            record["workers"] = WORKER_POOL.reload(model_id, str(new_path), version, previous)
+            _publish_version(model_id, version)
+        else:
+            entry = source.factory(new_path, version)
+            record["warmupMs"] = round(_warm_up(entry, _warmup_sizes() or (640,)), 1)
+            MODEL_LOADER.swap(model_id, entry, partial(source.factory, new_path, version))
+            _publish_version(model_id, version)
+        record["ms"] = round((time.perf_counter() - start) * 1000.0, 1)
+
+        source.path, source.version, source.stamp = new_path, version, stamp
+        return _record_reload(source, record)
+    except ReloadInProgressError:
+        raise
+    except Exception as e:
+        _record_reload(source, {"error": f"{type(e).__name__}: {e}", "path": str(new_path), "at": _now_iso()})
+        raise
+    finally:
+        source.reload_lock.release()
+
+
+def _watch_models(interval: float) -> None:
+    while True:
+        time.sleep(interval)
+        for source in list(MODEL_SOURCES.values()):
+            try:
+                stamp = _file_stamp(source.path)
+            except OSError:
+                continue
+            if stamp == source.stamp:
+                source.pending = ()
+                continue
+            if stamp != source.pending:
+                # Wait for one unchanged poll so a file still being copied isn't loaded.
+                source.pending = stamp
+                continue
+            try:
+                _reload_model(source.id)
+            except Exception:
+                # Recorded in the source history; retry only after the next change.
+                source.stamp = stamp
+
+
+def _start_model_watcher() -> None:
+    interval = _coerce_float(MODEL_WATCH_INTERVAL_S, 0.0, 0.0, 3600.0)
+    if interval > 0:
+        threading.Thread(target=_watch_models, args=(interval,), name="model-watcher", daemon=True).start()
+
+
+def _resolve_default_model_id() -> str:
     if not MODEL_REGISTRY:
         raise RuntimeError("No models available to serve")
     default_id = DEFAULT_MODEL_ID
@@ -529,6 +1142,229 @@ def _get_model_entry(model_id: Optional[str]) -> ModelEntry:
         return entry
     raise HTTPException(status_code=400, detail=f"Unknown model '{model_id}'")
 
+
+def _deadline(budget_ms, default_ms: str) -> Optional[float]:
+    # Clients send a budget relative to arrival, which avoids trusting their clock.
+    budget = _coerce_float(default_ms if budget_ms is None else budget_ms, 0.0, 0.0)
+    return time.monotonic() + budget / 1000.0 if budget > 0 else None
+
+
+def _check_deadline(deadline: Optional[float], model_id: str, stage: str) -> None:
+    if deadline is not None and time.monotonic() >= deadline:
+        DEADLINES_SHED[(model_id, stage)] += 1
+        raise DeadlineExceededError(f"deadline exceeded before {stage}")
+
+
+async def _infer_batched(
+    entry: ModelEntry,
+    image: Image.Image,
+    deadline: Optional[float] = None,
+    priority: int = PRIORITY_PREDICT,
+    **params,
+) -> tuple[list, int, int]:
+    _check_deadline(deadline, entry.id, "submit")
+    future = MODEL_BATCHERS[entry.id].submit(image, deadline=deadline, priority=priority, **params)
+    try:
+        return await asyncio.wrap_future(future)
+    except DeadlineExceededError:
+        DEADLINES_SHED[(entry.id, "queue")] += 1
+        raise
+
+
+async def _decode(fn: Callable, data: bytes, *args):
+    try:
+        return await DECODE_POOL.run(fn, data, *args)
+    except QueueFullError:
+        raise
+    except Exception as e:
+        raise InvalidImageError(str(e)) from e
+
+
+async def _infer_tiled(entry: ModelEntry, image: Image.Image, tile: int, overlap: float, **params) -> tuple:
+    # The whole frame plus every tile go to the batcher together, so they run as
+    # one forward batch (up to BATCH_MAX_SIZE). params carry deadline/priority too.
+    width, height = image.size
+    max_grid = _coerce_int(TILE_MAX_GRID, 4, 1, 16)
+    windows = tile_windows(width, height, tile, overlap, max_grid)
+    if len(windows) == 1:
+        detections, _, _, *_rest = await _infer_batched(entry, image, **params)
+        return detections, {"tiles": 1}
+    frames = [image, *crop_tiles(image, windows)]
+    results = await asyncio.gather(*(_infer_batched(entry, frame, **params) for frame in frames))
+    detections = merge_tiles(
+        results[0][0],
+        [r[0] for r in results[1:]],
+        windows,
+        width,
+        height,
+        _coerce_float(TILE_MERGE_IOS, 0.5, 0.05, 1.0),
+        int(params.get("max_det", 0)),
+    )
+    return detections, {"tiles": len(windows)}
+
+
+def _parse_ladder(raw: str) -> tuple[int, ...]:
+    sizes = set()
+    for part in (raw or "").split(","):
+        try:
+            sizes.add(min(max(int(part.strip()), 32), 4096))
+        except ValueError:
+            continue
+    return tuple(sorted(sizes)) or (320, 640)
+
+
+def _adaptive_load(entry: ModelEntry, deadline: Optional[float] = None) -> float:
+    # 0 when idle, 1 once the queue is full or the expected wait uses up the budget
+    # (or what is left of the request's own deadline).
+    batcher = MODEL_BATCHERS[entry.id]
+    load = batcher.qsize() / batcher.max_queue
+    budget = _coerce_float(ADAPTIVE_LATENCY_BUDGET_MS, 0.0, 0.0) / 1000.0
+    if budget > 0:
+        load = max(load, batcher.expected_wait() / budget)
+    if deadline is not None:
+        remaining = deadline - time.monotonic()
+        load = max(load, batcher.expected_wait() / remaining if remaining > 0 else 1.0)
+    return min(load, 1.0)
+
+
+def _needs_escalation(detections: list) -> bool:
+    if _top_confidence(detections) < _coerce_float(ADAPTIVE_MIN_CONF, 0.5, 0.0, 1.0):
+        return True
+    tiny = _coerce_float(ADAPTIVE_TINY_AREA, 0.0025, 0.0, 1.0)
+    return any(d["box"]["width"] * d["box"]["height"] < tiny for d in detections if d.get("box"))
+
+
+async def _infer_adaptive(entry: ModelEntry, image: Image.Image, **params) -> tuple:
+    # A cheap pass at the bottom of the ladder; frames with weak or tiny detections
+    # are run again at the largest size the current load allows. The requested
+    # imgsz caps the ladder. params carry deadline/priority too.
+    requested = int(params.get("imgsz") or 640)
+    ladder = [size for size in _parse_ladder(ADAPTIVE_IMGSZ_LADDER) if size <= requested] or [requested]
+    passes = [ladder[0]]
+    detections, _, _, *extra = await _infer_batched(entry, image, **{**params, "imgsz": ladder[0]})
+    if len(ladder) > 1 and _needs_escalation(detections):
+        load = _adaptive_load(entry, params.get("deadline"))
+        ceiling = ladder[min(len(ladder) - 1, int(len(ladder) * (1.0 - load)))]
+        if ceiling > ladder[0]:
+            detections, _, _, *extra = await _infer_batched(entry, image, **{**params, "imgsz": ceiling})
+            passes.append(ceiling)
+    ADAPTIVE_SIZES.setdefault(entry.id, Counter())[passes[-1]] += 1
+    return detections, {**(extra[0] if extra else {}), "imgsz": passes[-1], "imgszPasses": passes}
+
+
+def _time_stage(timings: Optional[dict], stage: str, model_id: str, imgsz, start: float) -> None:
+    elapsed = time.perf_counter() - start
+    STAGES.observe(stage, model_id, imgsz, elapsed)
+    if timings is not None:
+        timings[stage] = elapsed
+
+
+def _server_timing(timings: dict, cached: bool) -> str:
+    parts = [f"{stage};dur={seconds * 1000.0:.2f}" for stage, seconds in timings.items()]
+    parts.append(f'cache;desc="{"hit" if cached else "miss"}"')
+    return ", ".join(parts)
+
+
+def _unpack_result(result: tuple, info: Optional[dict]) -> tuple[list, int, int]:
+    detections, width, height, *extra = result
+    if extra and info is not None:
+        info.update(extra[0])
+    return detections, width, height
+
+
+async def _run_prediction(
+    entry: ModelEntry,
+    data: Union[bytes, SpooledUpload],
+    params: dict,
+    image: Optional[Image.Image] = None,
+    timings: Optional[dict] = None,
+    info: Optional[dict] = None,
+    deadline: Optional[float] = None,
+    priority: int = PRIORITY_PREDICT,
+) -> tuple[list, int, int, bool]:
+    # Composite models, tiled and adaptive runs return a 4th element with extra response
+    # fields (route, tile count, chosen imgsz); it is cached with the result and copied
+    # into info.
+    digest = None
+    if isinstance(data, SpooledUpload):
+        # Hashed while it streamed in; decoded straight from the spool.
+        digest, data = data.digest(), data.source()
+    content_key = RESULT_CACHE.content_key(data, entry.id, entry.version, params, digest)
+    cached = RESULT_CACHE.get(content_key)
+    if cached is not None:
+        return (*_unpack_result(cached, info), True)
+
+    imgsz = params.get("imgsz", 0)
+    # Tiling and adaptive params are part of the cache key but not of the model call.
+    tile = params.get("tile", 0)
+    overlap = params.get("tile_overlap", 0.0)
+    model_params = {k: v for k, v in params.items() if k not in {"tile", "tile_overlap", "adaptive"}}
+    phash = None
+    if image is None:
+        _check_deadline(deadline, entry.id, "decode")
+        # Decode at reduced scale: the model never looks at more than imgsz pixels,
+        # unless the frame is tiled, where small objects need the full resolution.
+        target = _coerce_int(TILE_DECODE_MAX_SIDE, 4096, 0, 16384) if tile else int(imgsz)
+        start = time.perf_counter()
+        if RESULT_CACHE.perceptual:
+            image, phash = await _decode(decode_image_hashed, data, target)
+        else:
+            image = await _decode(decode_image, data, target)
+        _time_stage(timings, "decode", entry.id, imgsz, start)
+
+    perceptual_key = None
+    if phash is not None:
+        perceptual_key = RESULT_CACHE.perceptual_key(
+            phash, original_size(image), entry.id, entry.version, params
+        )
+        cached = RESULT_CACHE.get(perceptual_key)
+        if cached is not None:
+            RESULT_CACHE.put(content_key, cached)
+            return (*_unpack_result(cached, info), True)
+
+    # "infer" is wall time from submit to result, so it includes the batch queue wait.
+    start = time.perf_counter()
+    schedule = {"deadline": deadline, "priority": priority}
+    if tile:
+        detections, tiled = await _infer_tiled(entry, image, tile, overlap, **schedule, **model_params)
+        extra = [tiled]
+    elif params.get("adaptive"):
+        detections, adaptive = await _infer_adaptive(entry, image, **schedule, **model_params)
+        extra = [adaptive]
+    else:
+        detections, _, _, *extra = await _infer_batched(entry, image, **schedule, **model_params)
+    _time_stage(timings, "infer", entry.id, imgsz, start)
+    # Boxes are normalized, so only the reported dimensions need the source size.
+    width, height = original_size(image)
+    result = (detections, width, height, *extra)
+    with MODEL_VERSION_LOCK:
+        # A reload during this request may have answered it with the new weights, so
+        # it can't be cached under the version it started with.
+        current = MODEL_REGISTRY.get(entry.id)
+        if current is not None and current.version == entry.version:
+            RESULT_CACHE.put(content_key, result)
+            RESULT_CACHE.put(perceptual_key, result)
+    return (*_unpack_result(result, info), False)
+
+
+def _build_response(entry: ModelEntry, detections: list, width: int, height: int, cached: bool) -> dict:
+    return {
+        "modelVersion": entry.version,
+        "modelId": entry.id,
+        "ranAt": _now_iso(),
+        "image": {"width": width, "height": height},
+        "detections": detections,
+        "cached": cached,
+    }
+
+
+def _busy_exception() -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="Server busy, retry later",
+        headers={"Retry-After": str(BUSY_RETRY_AFTER_S)},
+    )
+
 app = FastAPI(title="WastePrediction Inference API", version="1.0.0")
 app.add_middleware(
     CORSMiddleware,
@@ -542,7 +1378,16 @@ app.add_middleware(
 @app.get("/health")
 def health():
     default_model = MODEL_REGISTRY[ACTIVE_DEFAULT_MODEL_ID]
-    return {"ok": True, "modelVersion": default_model.version, "modelId": default_model.id}
+    body = {
+        "ok": True,
+        "ready": MODEL_READY.is_set(),
+        "modelVersion": default_model.version,
+        "modelId": default_model.id,
+        "warmup": MODEL_WARMUP,
+    }
+    if not body["ready"]:
+        return JSONResponse(status_code=503, content={**body, "ok": False})
+    return body
 
 
 @app.get("/models")
@@ -556,9 +1401,244 @@ def list_models():
     }
 
 
-@app.post("/predict")
+def _busy_message(req_id) -> dict:
+    return {"error": "Server busy", "busy": True, "retryAfter": BUSY_RETRY_AFTER_S, "id": req_id}
+
+
+def _register_metrics() -> None:
+    METRICS.gauge(
+        "waste_queue_depth",
+        "Frames waiting in a model's batch queue.",
+        ("model",),
+        lambda: [((model_id,), batcher.qsize()) for model_id, batcher in MODEL_BATCHERS.items()],
+    )
+    METRICS.counter(
+        "waste_queue_rejected_total",
+        "Frames refused because a model's batch queue was full.",
+        ("model",),
+        lambda: [((model_id,), batcher.stats()["rejected"]) for model_id, batcher in MODEL_BATCHERS.items()],
+    )
+    METRICS.gauge(
+        "waste_decode_pending",
+        "Uploads waiting for or in decode.",
+        (),
+        lambda: [((), DECODE_POOL.stats()["pending"])],
+    )
+    METRICS.gauge(
+        "waste_stream_sessions_active",
+        "Open /stream WebSocket sessions.",
+        (),
+        lambda: [((), STREAM_COUNTERS.active)],
+    )
+    METRICS.counter(
+        "waste_stream_frames_total",
+        "/stream frames by outcome.",
+        ("outcome",),
+        lambda: [
+            (("received",), STREAM_COUNTERS.received),
+            (("processed",), STREAM_COUNTERS.processed),
+            (("dropped",), STREAM_COUNTERS.dropped),
+            (("stale",), STREAM_COUNTERS.stale),
+        ],
+    )
+    METRICS.counter(
+        "waste_cache_lookups_total",
+        "Result cache lookups by outcome.",
+        ("outcome",),
+        lambda: [
+            ((outcome,), RESULT_CACHE.stats()[key])
+            for outcome, key in (("hit", "hits"), ("perceptual_hit", "perceptualHits"), ("miss", "misses"))
+        ],
+    )
+    # With model workers the weights live in the worker processes and are not reported here.
+    METRICS.gauge(
+        "waste_model_memory_bytes",
+        "Parameter and buffer bytes of each loaded model.",
+        ("model",),
+        lambda: [((model_id,), size) for model_id, size in MODEL_LOADER.memory().items()],
+    )
+    METRICS.gauge(
+        "waste_model_loaded",
+        "1 if a model's weights are loaded in this process.",
+        ("model",),
+        lambda: [((model_id,), int(MODEL_LOADER.is_loaded(model_id))) for model_id in MODEL_SOURCES]
+        if WORKER_POOL is None
+        else [],
+    )
+    METRICS.counter(
+        "waste_model_routes_total",
+        "Frames run by a composite model, by the path they took.",
+        ("model", "path"),
+        lambda: [
+            ((model_id, path), n) for model_id, counts in MODEL_ROUTES.items() for path, n in counts.items()
+        ],
+    )
+    METRICS.counter(
+        "waste_adaptive_imgsz_total",
+        "Adaptive-resolution requests by the imgsz they finished at.",
+        ("model", "imgsz"),
+        lambda: [
+            ((model_id, str(size)), n) for model_id, counts in ADAPTIVE_SIZES.items() for size, n in counts.items()
+        ],
+    )
+    METRICS.counter(
+        "waste_deadline_exceeded_total",
+        "Requests shed because their deadline passed before decode, submit or the forward pass.",
+        ("model", "stage"),
+        lambda: [((model_id, stage), n) for (model_id, stage), n in DEADLINES_SHED.items()],
+    )
+    METRICS.gauge(
+        "waste_ready",
+        "1 once the preloaded models are warm.",
+        (),
+        lambda: [((), int(MODEL_READY.is_set()))],
+    )
+
+
+_register_metrics()
+
+
+@app.get("/metrics")
+def metrics():
+    return PlainTextResponse(METRICS.render(), media_type=METRICS_CONTENT_TYPE)
+
+
+@app.get("/stats")
+def stats():
+    return {
+        "batching": {model_id: batcher.stats() for model_id, batcher in MODEL_BATCHERS.items()},
+        "decode": DECODE_POOL.stats(),
+        "workers": WORKER_POOL.stats() if WORKER_POOL is not None else None,
+        # With model workers the weights live in the worker processes.
+        "models": MODEL_LOADER.stats() if WORKER_POOL is None else None,
+        "warmup": MODEL_WARMUP,
+        "cache": RESULT_CACHE.stats(),
+        "stream": STREAM_COUNTERS.stats(),
+        "routes": {model_id: dict(counts) for model_id, counts in MODEL_ROUTES.items()},
+        "deadlinesShed": {
+            model_id: {stage: n for (m, stage), n in DEADLINES_SHED.items() if m == model_id}
+            for model_id in sorted({m for m, _ in DEADLINES_SHED})
+        },
+        "adaptiveImgsz": {
+            model_id: {str(size): n for size, n in sorted(counts.items())}
+            for model_id, counts in ADAPTIVE_SIZES.items()
+        },
+    }
+
+
+def _require_admin(authorization: Optional[str]) -> None:
+    # Admin routes are off unless ADMIN_TOKEN is set.
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not secrets.compare_digest(authorization or "", f"Bearer {ADMIN_TOKEN}"):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+
+@app.get("/admin/models")
+def admin_models(authorization: Optional[str] = Header(default=None)):
+    _require_admin(authorization)
+    return {
+        "models": [
+            {
+                "id": source.id,
+                "kind": source.kind,
+                "version": MODEL_REGISTRY[source.id].version,
+                "path": str(source.path),
+                "loaded": MODEL_LOADER.is_loaded(source.id) if WORKER_POOL is None else None,
+                "reloading": source.reload_lock.locked(),
+                "history": list(source.history),
+            }
+            for source in MODEL_SOURCES.values()
+        ],
+    }
+
+
+@app.post("/admin/models/{model_id}/reload")
+async def reload_model(
+    model_id: str,
+    body: Optional[dict] = Body(default=None),
+    authorization: Optional[str] = Header(default=None),
+):
+    _require_admin(authorization)
+    if model_id not in MODEL_SOURCES:
+        raise HTTPException(status_code=404, detail=f"Unknown model '{model_id}'")
+    body = body or {}
+    try:
+        record = await asyncio.to_thread(_reload_model, model_id, body.get("path"), body.get("version"))
+    except ReloadInProgressError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Reload failed: {e}")
+    return {"modelId": model_id, **record}
+
+
+def _predict_params(
+    conf: float,
+    iou: float,
+    max_det: int,
+    topk: int,
+    agnostic_nms: bool,
+    imgsz: int,
+    tile: int = 0,
+    tile_overlap: float = 0.2,
+    adaptive: bool = False,
+) -> dict:
+    params = {
+        "conf": conf,
+        "iou": iou,
+        "max_det": _coerce_int(max_det, 300, 1, MAX_DET_LIMIT),
+        "topk": topk,
+        "agnostic_nms": agnostic_nms,
+        "imgsz": imgsz,
+    }
+    if tile > 0:
+        params.update(tile=max(64, int(tile)), tile_overlap=min(max(float(tile_overlap), 0.0), 0.75))
+    elif adaptive:
+        params["adaptive"] = True
+    return params
+
+
+# /predict reads its multipart body itself, so the schema is declared by hand.
+_IMAGE_UPLOAD_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": ["file"],
+                    "properties": {"file": {"type": "string", "format": "binary"}},
+                }
+            }
+        },
+    }
+}
+
+
+async def _receive_upload(request: Request) -> SpooledUpload:
+    max_bytes = _coerce_int(PREDICT_MAX_UPLOAD_MB, 20, 1, 1024) * 1024 * 1024
+    declared = request.headers.get("content-length", "")
+    # Multipart framing adds a little on top of the file itself.
+    if declared.isdigit() and int(declared) > max_bytes + 64 * 1024:
+        raise HTTPException(status_code=413, detail=f"Upload larger than {max_bytes // (1024 * 1024)} MB")
+    try:
+        return await spool_image_upload(
+            request.headers.get("content-type", ""),
+            request.stream(),
+            "file",
+            max_bytes,
+            int(_coerce_float(UPLOAD_MAX_MEGAPIXELS, 64.0, 1.0, 1000.0) * 1_000_000),
+            _coerce_int(UPLOAD_SPOOL_MEMORY_KB, 1024, 0, 1 << 20) * 1024,
+        )
+    except UploadRejectedError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e)) from e
+
+
+@app.post("/predict", openapi_extra=_IMAGE_UPLOAD_BODY)
 async def predict(
-    file: UploadFile = File(...),
+    request: Request,
     model: Optional[str] = None,
     conf: float = 0.15,
     iou: float = 0.7,
@@ -566,110 +1646,364 @@ async def predict(
     topk: int = 5,
     agnostic_nms: bool = False,
     imgsz: int = 640,
+    tile: int = 0,
+    tile_overlap: float = 0.2,
+    adaptive: bool = False,
+    x_deadline_ms: Optional[float] = Header(default=None),
 ):
-    if not file.content_type or not file.content_type.startswith("image/"):
-        raise HTTPException(status_code=415, detail="Expected an image upload")
-
-    data = await file.read()
+    deadline = _deadline(x_deadline_ms, PREDICT_DEADLINE_MS)
+    entry = _get_model_entry(model)
+    timings = {}
+    start = time.perf_counter()
+    upload = await _receive_upload(request)
+    _time_stage(timings, "upload", entry.id, imgsz, start)
+    params = _predict_params(conf, iou, max_det, topk, agnostic_nms, imgsz, tile, tile_overlap, adaptive)
+    info = {}
     try:
-        image = Image.open(io.BytesIO(data))
-        image = ImageOps.exif_transpose(image).convert("RGB")
-    except Exception as e:
+        detections, width, height, cached = await _run_prediction(
+            entry, upload, params, timings=timings, info=info, deadline=deadline
+        )
+    except (QueueFullError, WorkerLostError) as e:
+        raise _busy_exception() from e
+    except DeadlineExceededError as e:
+        raise HTTPException(status_code=504, detail="Deadline exceeded") from e
+    except InvalidImageError as e:
         raise HTTPException(status_code=400, detail=f"Invalid image: {e}") from e
-
-    entry = _get_model_entry(model)
-    detections, width, height = entry.infer(
-        image,
-        conf=conf,
-        iou=iou,
-        max_det=max_det,
-        topk=topk,
-        agnostic_nms=agnostic_nms,
-        imgsz=imgsz,
-    )
-    return {
-        "modelVersion": entry.version,
-        "modelId": entry.id,
-        "ranAt": _now_iso(),
-        "image": {"width": width, "height": height},
-        "detections": detections,
-    }
+    finally:
+        upload.close()
+    start = time.perf_counter()
+    response = JSONResponse({**_build_response(entry, detections, width, height, cached), **info})
+    _time_stage(timings, "serialize", entry.id, imgsz, start)
+    if METRICS_SERVER_TIMING:
+        response.headers["Server-Timing"] = _server_timing(timings, cached)
+    return response
+
+
+async def _score_batch_item(
+    entry: ModelEntry,
+    index: int,
+    item: UploadItem,
+    params: dict,
+    limit: asyncio.Semaphore,
+    deadline: Optional[float] = None,
+) -> dict:
+    base = {"index": index, "name": item.name}
+    if item.error:
+        return {**base, "error": item.error}
+    info = {}
+    try:
+        async with limit:
+            detections, width, height, cached = await _run_prediction(
+                entry, item.data, params, info=info, deadline=deadline, priority=PRIORITY_BULK
+            )
+    except (QueueFullError, WorkerLostError):
+        return {**base, "error": "Server busy", "busy": True, "retryAfter": BUSY_RETRY_AFTER_S}
+    except DeadlineExceededError:
+        return {**base, "error": "Deadline exceeded", "deadlineExceeded": True}
+    except InvalidImageError as e:
+        return {**base, "error": f"Invalid image: {e}"}
+    except Exception as e:
+        return {**base, "error": f"Inference failed: {e}"}
+    finally:
+        item.data = None
+    return {**base, **_build_response(entry, detections, width, height, cached), **info}
 
 
-@app.websocket("/stream")
-async def stream(websocket: WebSocket):
-    await websocket.accept()
+async def _stream_batch_results(
+    entry: ModelEntry, items: list[UploadItem], params: dict, deadline: Optional[float] = None
+):
+    # Items run concurrently up to the limit, so the micro-batcher sees enough of
+    # them at once to fill a batch; lines go out in completion order.
+    limit = asyncio.Semaphore(_coerce_int(PREDICT_BATCH_CONCURRENCY, 8, 1, 256))
+    tasks = [
+        asyncio.create_task(_score_batch_item(entry, index, item, params, limit, deadline))
+        for index, item in enumerate(items)
+    ]
+    errors = 0
     try:
-        while True:
-            message = await websocket.receive()
-            payload_text = message.get("text")
-            payload_bytes = message.get("bytes")
+        for next_result in asyncio.as_completed(tasks):
+            result = await next_result
+            errors += "error" in result
+            yield json.dumps(result) + "\n"
+        yield json.dumps({"done": True, "count": len(items), "errors": errors}) + "\n"
+    finally:
+        # The client went away: don't keep scoring for nobody.
+        for task in tasks:
+            task.cancel()
+
+
+@app.post("/predict/batch")
+async def predict_batch(
+    files: list[UploadFile] = File(...),
+    model: Optional[str] = None,
+    conf: float = 0.15,
+    iou: float = 0.7,
+    max_det: int = 300,
+    topk: int = 5,
+    agnostic_nms: bool = False,
+    imgsz: int = 640,
+    tile: int = 0,
+    tile_overlap: float = 0.2,
+    adaptive: bool = False,
+    x_deadline_ms: Optional[float] = Header(default=None),
+):
+    # The deadline covers the whole batch; items not scored by then are reported as expired.
+    deadline = _deadline(x_deadline_ms, "0")
+    entry = _get_model_entry(model)
+    params = _predict_params(conf, iou, max_det, topk, agnostic_nms, imgsz, tile, tile_overlap, adaptive)
+    max_items = _coerce_int(PREDICT_BATCH_MAX_ITEMS, 256, 1, 100_000)
+    max_item_bytes = _coerce_int(PREDICT_BATCH_MAX_ITEM_MB, 20, 1, 1024) * 1024 * 1024
+
+    items: list[UploadItem] = []
+    for upload in files:
+        data = await upload.read()
+        items.extend(
+            await asyncio.to_thread(
+                expand_upload,
+                upload.filename or "",
+                upload.content_type or "",
+                data,
+                max_items - len(items),
+                max_item_bytes,
+            )
+        )
+        if len(items) > max_items:
+            raise HTTPException(status_code=413, detail=f"At most {max_items} images per batch")
+    if not items:
+        raise HTTPException(status_code=400, detail="No images in upload")
+    return StreamingResponse(
+        _stream_batch_results(entry, items, params, deadline), media_type="application/x-ndjson"
+    )
 
-            if payload_text is None and payload_bytes is None:
-                continue
 
-            req_id = None
-            model_id = None
+def _coerce_stream_params(payload: dict) -> dict:
+    params = {
+        "conf": _coerce_float(payload.get("conf", 0.15), 0.15, 0.0, 1.0),
+        "iou": _coerce_float(payload.get("iou", 0.7), 0.7, 0.1, 0.99),
+        "max_det": _coerce_int(payload.get("max_det", 300), 300, 1, MAX_DET_LIMIT),
+        "topk": _coerce_int(payload.get("topk", 5), 5, 1, 50),
+        "agnostic_nms": bool(payload.get("agnostic_nms", False)),
+        "imgsz": _coerce_int(payload.get("imgsz", 640), 640, 160, 1536),
+    }
+    if payload.get("adaptive"):
+        params["adaptive"] = True
+    return params
+
+
+@dataclass
+class _StreamFrame:
+    req_id: Any
+    entry: ModelEntry
+    params: dict
+    image: Union[bytes, str]
+    binary: bool = False
+    track: bool = False
+    deadline: Optional[float] = None
+
+
+def _stream_error(
+    frame_or_id, message: str, binary: bool, busy: bool = False, expired: bool = False
+) -> Union[str, bytes]:
+    req_id = frame_or_id.req_id if isinstance(frame_or_id, _StreamFrame) else frame_or_id
+    if binary:
+        return encode_error(req_id or 0, message, busy=busy, expired=expired)
+    if busy:
+        return json.dumps(_busy_message(req_id))
+    if expired:
+        return json.dumps({"error": message, "deadlineExceeded": True, "id": req_id})
+    return json.dumps({"error": message, "id": req_id})
+
+
+async def _receive_stream_frames(websocket: WebSocket, session: StreamSession, binary: bool) -> None:
+    while True:
+        message = await websocket.receive()
+        if message.get("type") == "websocket.disconnect":
+            return
+        payload_text = message.get("text")
+        payload_bytes = message.get("bytes")
+
+        if payload_text is None and payload_bytes is None:
+            continue
+
+        if binary and payload_bytes is not None:
             try:
-                if payload_text is not None:
-                    payload = json.loads(payload_text)
-                    req_id = payload.get("id")
-                    model_id = payload.get("model") or payload.get("modelId")
-                    image_b64 = payload.get("image") or payload.get("data")
-                    if not image_b64:
-                        await websocket.send_text(json.dumps({"error": "Missing image field", "id": req_id}))
-                        continue
-                    if isinstance(image_b64, str) and "base64," in image_b64:
-                        image_b64 = image_b64.split("base64,", 1)[1]
-                    try:
-                        image_bytes = base64.b64decode(image_b64)
-                    except Exception:
-                        await websocket.send_text(json.dumps({"error": "Invalid base64 image", "id": req_id}))
-                        continue
-                else:
-                    payload = {}
-                    image_bytes = payload_bytes
-            except Exception:
-                await websocket.send_text(json.dumps({"error": "Invalid message"}))
+                request = decode_request(payload_bytes)
+            except ProtocolError as e:
+                session.reply(encode_error(0, str(e)))
                 continue
-
-            try:
-                image = Image.open(io.BytesIO(image_bytes))
-                image = ImageOps.exif_transpose(image).convert("RGB")
-            except Exception:
-                await websocket.send_text(json.dumps({"error": "Invalid image data", "id": req_id}))
+            model_id = request.model_id
+            entry = MODEL_REGISTRY.get(model_id) if model_id else MODEL_REGISTRY[ACTIVE_DEFAULT_MODEL_ID]
+            if entry is None:
+                session.reply(encode_error(request.request_id, f"Unknown model '{model_id}'"))
                 continue
+            params = _coerce_stream_params(request.params)
+            session.submit(
+                _StreamFrame(
+                    request.request_id,
+                    entry,
+                    params,
+                    request.image,
+                    binary=True,
+                    track=request.track,
+                    deadline=_deadline(request.deadline_ms, STREAM_DEADLINE_MS),
+                )
+            )
+            continue
+
+        req_id = None
+        model_id = None
+        try:
+            if payload_text is not None:
+                payload = json.loads(payload_text)
+                req_id = payload.get("id")
+                model_id = payload.get("model") or payload.get("modelId")
+                image = payload.get("image") or payload.get("data")
+                if not image:
+                    session.reply(json.dumps({"error": "Missing image field", "id": req_id}))
+                    continue
+            else:
+                payload = {}
+                image = payload_bytes
+        except Exception:
+            session.reply(json.dumps({"error": "Invalid message"}))
+            continue
+
+        entry = MODEL_REGISTRY.get(str(model_id)) if model_id else MODEL_REGISTRY[ACTIVE_DEFAULT_MODEL_ID]
+        if entry is None:
+            session.reply(json.dumps({"error": f"Unknown model '{model_id}'", "id": req_id}))
+            continue
+
+        # base64 is decoded by the inference step, so superseded frames never pay for it.
+        session.submit(
+            _StreamFrame(
+                req_id,
+                entry,
+                _coerce_stream_params(payload),
+                image,
+                track=bool(payload.get("track", False)),
+                deadline=_deadline(payload.get("deadlineMs"), STREAM_DEADLINE_MS),
+            )
+        )
 
-            conf = _coerce_float(payload.get("conf", 0.15), 0.15, 0.0, 1.0)
-            iou = _coerce_float(payload.get("iou", 0.7), 0.7, 0.1, 0.99)
-            max_det = _coerce_int(payload.get("max_det", 300), 300, 1, 2000)
-            imgsz = _coerce_int(payload.get("imgsz", 640), 640, 160, 1536)
-            topk = _coerce_int(payload.get("topk", 5), 5, 1, 50)
-            agnostic_nms = bool(payload.get("agnostic_nms", False))
 
-            entry = MODEL_REGISTRY.get(str(model_id)) if model_id else MODEL_REGISTRY[ACTIVE_DEFAULT_MODEL_ID]
-            if entry is None:
-                await websocket.send_text(json.dumps({"error": f"Unknown model '{model_id}'", "id": req_id}))
-                continue
+def _new_tracker() -> FrameTracker:
+    return FrameTracker(
+        motion_threshold=_coerce_float(TRACK_MOTION_THRESHOLD, 0.04, 0.0, 1.0),
+        max_shift=_coerce_float(TRACK_MAX_SHIFT, 0.15, 0.0, 1.0),
+        keyframe_interval=_coerce_int(TRACK_KEYFRAME_INTERVAL, 10, 1, 1000),
+        iou_threshold=_coerce_float(TRACK_IOU, 0.3, 0.01, 1.0),
+        max_misses=_coerce_int(TRACK_MAX_MISSES, 2, 0, 100),
+    )
 
-            detections, width, height = entry.infer(
-                image,
-                conf=conf,
-                iou=iou,
-                max_det=max_det,
-                topk=topk,
-                agnostic_nms=agnostic_nms,
-                imgsz=imgsz,
+
+async def _run_tracked_prediction(
+    frame: _StreamFrame, session: StreamSession, data: bytes, info: Optional[dict] = None
+) -> tuple[list, int, int, bool, bool]:
+    tracker = session.state.get("tracker")
+    if tracker is None:
+        tracker = session.state["tracker"] = _new_tracker()
+        session.state["tracker_lock"] = asyncio.Lock()
+
+    # Tracking state is sequential, so frames of one connection take turns here.
+    async with session.state["tracker_lock"]:
+        context = (frame.entry.id, frame.entry.version, tuple(sorted(frame.params.items())))
+        if tracker.context != context:
+            tracker.reset(context)
+
+        imgsz = frame.params.get("imgsz", 0)
+        _check_deadline(frame.deadline, frame.entry.id, "decode")
+        start = time.perf_counter()
+        image, thumb = await _decode(decode_with_thumbnail, data, int(imgsz))
+        _time_stage(None, "decode", frame.entry.id, imgsz, start)
+        width, height = original_size(image)
+        motion = tracker.observe(thumb, (width, height))
+        if motion is not None:
+            STREAM_COUNTERS.propagated += 1
+            return tracker.propagate(motion), width, height, False, False
+
+        detections, width, height, cached = await _run_prediction(
+            frame.entry,
+            data,
+            frame.params,
+            image=image,
+            info=info,
+            deadline=frame.deadline,
+            priority=PRIORITY_STREAM,
+        )
+        STREAM_COUNTERS.keyframes += 1
+        return tracker.update(detections, (width, height)), width, height, cached, True
+
+
+async def _process_stream_frame(frame: _StreamFrame, session: StreamSession) -> Union[str, bytes]:
+    image_bytes = frame.image
+    if isinstance(image_bytes, str):
+        if "base64," in image_bytes:
+            image_bytes = image_bytes.split("base64,", 1)[1]
+        try:
+            image_bytes = base64.b64decode(image_bytes)
+        except Exception:
+            return _stream_error(frame, "Invalid base64 image", frame.binary)
+
+    keyframe = None
+    info = {}
+    try:
+        if frame.track:
+            detections, width, height, cached, keyframe = await _run_tracked_prediction(
+                frame, session, image_bytes, info
             )
-            response = {
-                "modelVersion": entry.version,
-                "modelId": entry.id,
-                "ranAt": _now_iso(),
-                "image": {"width": width, "height": height},
-                "detections": detections,
-            }
-            if req_id is not None:
-                response["id"] = req_id
-            await websocket.send_text(json.dumps(response))
+        else:
+            detections, width, height, cached = await _run_prediction(
+                frame.entry,
+                image_bytes,
+                frame.params,
+                info=info,
+                deadline=frame.deadline,
+                priority=PRIORITY_STREAM,
+            )
+    except (QueueFullError, WorkerLostError):
+        return _stream_error(frame, "Server busy", frame.binary, busy=True)
+    except DeadlineExceededError:
+        return _stream_error(frame, "Deadline exceeded", frame.binary, expired=True)
+    except InvalidImageError:
+        return _stream_error(frame, "Invalid image data", frame.binary)
+
+    start = time.perf_counter()
+    if frame.binary:
+        # Only frames with something to report pay for the info block.
+        extra = {**info, "dropped": session.dropped} if session.dropped else info
+        message = encode_response(
+            frame.req_id, detections, width, height, cached, keyframe=bool(keyframe), info=extra
+        )
+    else:
+        response = {**_build_response(frame.entry, detections, width, height, cached), **info}
+        response["dropped"] = session.dropped
+        if keyframe is not None:
+            response["keyframe"] = keyframe
+        if frame.req_id is not None:
+            response["id"] = frame.req_id
+        message = json.dumps(response)
+    _time_stage(None, "serialize", frame.entry.id, frame.params.get("imgsz", 0), start)
+    return message
+
+
+async def _send_stream_message(websocket: WebSocket, message: Union[str, bytes]) -> None:
+    if isinstance(message, bytes):
+        await websocket.send_bytes(message)
+    else:
+        await websocket.send_text(message)
+
+
+@app.websocket("/stream")
+async def stream(websocket: WebSocket):
+    binary = SUBPROTOCOL in (websocket.scope.get("subprotocols") or [])
+    await websocket.accept(subprotocol=SUBPROTOCOL if binary else None)
+    session = StreamSession(
+        _process_stream_frame,
+        partial(_send_stream_message, websocket),
+        max_in_flight=_coerce_int(STREAM_MAX_IN_FLIGHT, 1, 1, 16),
+        counters=STREAM_COUNTERS,
+    )
+    try:
+        await session.run(partial(_receive_stream_frames, websocket, binary=binary))
     except WebSocketDisconnect:
         return
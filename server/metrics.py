@@ -0,0 +1,167 @@
+import math
+import threading
+from contextlib import contextmanager
+from typing import Callable, Iterable, Optional
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+IMGSZ_STRIDE = 32
+IMGSZ_LABEL_MAX = 4096
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(names: Iterable[str], values: Iterable) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def imgsz_label(imgsz) -> str:
+    # imgsz comes from the request, so snap it to the model stride and cap it to
+    # keep the number of label values bounded.
+    try:
+        value = int(imgsz)
+    except (TypeError, ValueError):
+        return "none"
+    if value <= 0:
+        return "none"
+    value = -(-value // IMGSZ_STRIDE) * IMGSZ_STRIDE
+    return str(min(value, IMGSZ_LABEL_MAX))
+
+
+def _number(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labelvalues) -> None:
+        key = tuple(str(v) for v in labelvalues)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # Per-bucket counts (not cumulative), then sum and count.
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = [(key, list(s[0]), s[1], s[2]) for key, s in sorted(self._series.items())]
+        for key, counts, total, count in snapshot:
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                labels = _label_text((*self.labelnames, "le"), (*key, _number(bound)))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _label_text((*self.labelnames, "le"), (*key, "+Inf"))
+            lines.append(f"{self.name}_bucket{labels} {count}")
+            labels = _label_text(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_number(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class _Collected:
+    # A gauge or counter whose samples are read from existing state at scrape time.
+    def __init__(self, name: str, documentation: str, kind: str, labelnames: tuple, collect: Callable):
+        self.name = name
+        self.documentation = documentation
+        self.kind = kind
+        self.labelnames = tuple(labelnames)
+        self.collect = collect
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for labelvalues, value in self.collect():
+            if value is None:
+                continue
+            lines.append(f"{self.name}{_label_text(self.labelnames, labelvalues)} {_number(value)}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: list = []
+
+    def histogram(self, name: str, documentation: str, labelnames: tuple = (), buckets=LATENCY_BUCKETS):
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def gauge(self, name: str, documentation: str, labelnames: tuple, collect: Callable) -> None:
+        self._metrics.append(_Collected(name, documentation, "gauge", labelnames, collect))
+
+    def counter(self, name: str, documentation: str, labelnames: tuple, collect: Callable) -> None:
+        self._metrics.append(_Collected(name, documentation, "counter", labelnames, collect))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class StageTimer:
+    # Per-stage latency samples. Model worker processes buffer their samples and
+    # ship them back with each result so the API process exports one histogram.
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+        self.buffer: Optional[list] = None
+        self._local = threading.local()
+
+    @contextmanager
+    def muted(self):
+        # Drops the samples this thread records inside the block (warm-up passes),
+        # while requests on other threads keep recording.
+        self._local.muted = True
+        try:
+            yield
+        finally:
+            self._local.muted = False
+
+    def observe(self, stage: str, model_id: str, imgsz, seconds: float) -> None:
+        if getattr(self._local, "muted", False):
+            return
+        if self.buffer is not None:
+            self.buffer.append((stage, model_id, imgsz, seconds))
+            return
+        self.histogram.observe(seconds, stage, model_id, imgsz_label(imgsz))
+
+    def observe_all(self, model_id: str, imgsz, timings: dict) -> None:
+        for stage, seconds in timings.items():
+            self.observe(stage, model_id, imgsz, seconds)
+
+    def drain(self) -> list:
+        samples, self.buffer = self.buffer or [], []
+        return samples
+
+    def ingest(self, samples: Iterable) -> None:
+        for stage, model_id, imgsz, seconds in samples:
+            self.histogram.observe(seconds, stage, model_id, imgsz_label(imgsz))
+
+
+METRICS = MetricsRegistry()
+STAGES = StageTimer(
+    METRICS.histogram(
+        "waste_stage_seconds",
+        "Time spent per pipeline stage (model stages are per forward batch).",
+        ("stage", "model", "imgsz"),
+    )
+)
@@ -0,0 +1,246 @@
+import ast
+import math
+import time
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+from PIL import Image
+
+try:
+    import onnxruntime as ort
+except Exception:
+    ort = None
+
+ONNX_AVAILABLE = ort is not None
+
+LETTERBOX_PAD = 114
+STRIDE = 32
+MAX_NMS_CANDIDATES = 30000
+
+
+def resolve_providers(preference: str = "auto") -> list[str]:
+    available = ort.get_available_providers() if ort is not None else []
+    preference = (preference or "auto").strip().lower()
+    if preference in {"auto", "openvino"} and "OpenVINOExecutionProvider" in available:
+        return ["OpenVINOExecutionProvider", "CPUExecutionProvider"]
+    if preference == "openvino":
+        raise RuntimeError("OpenVINOExecutionProvider is not available (pip install onnxruntime-openvino)")
+    return ["CPUExecutionProvider"]
+
+
+def letterbox(image: Image.Image, size: int) -> tuple[np.ndarray, float, int, int]:
+    # Same geometry as the on-device path: keep aspect ratio, centre on a grey square.
+    width, height = image.size
+    scale = min(size / width, size / height)
+    new_w = max(1, min(size, int(round(width * scale))))
+    new_h = max(1, min(size, int(round(height * scale))))
+    pad_x = (size - new_w) // 2
+    pad_y = (size - new_h) // 2
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    resized = image.resize((new_w, new_h), Image.BILINEAR)
+    canvas = np.full((size, size, 3), LETTERBOX_PAD, dtype=np.uint8)
+    canvas[pad_y : pad_y + new_h, pad_x : pad_x + new_w] = np.asarray(resized)
+    return canvas, scale, pad_x, pad_y
+
+
+def yolo_input(images: list[Image.Image], size: int) -> tuple[np.ndarray, list[tuple]]:
+    batch = np.empty((len(images), 3, size, size), dtype=np.float32)
+    geometry = []
+    for i, image in enumerate(images):
+        canvas, scale, pad_x, pad_y = letterbox(image, size)
+        batch[i] = canvas.transpose(2, 0, 1)
+        geometry.append((scale, pad_x, pad_y, image.size))
+    batch *= 1.0 / 255.0
+    return batch, geometry
+
+
+def frcnn_input(image: Image.Image, imgsz: int) -> tuple[np.ndarray, tuple[int, int]]:
+    # Longest side down to imgsz (never up), CHW float in [0, 1].
+    width, height = image.size
+    if imgsz > 0 and max(width, height) > imgsz:
+        scale = imgsz / max(width, height)
+        image = image.resize(
+            (max(1, int(round(width * scale))), max(1, int(round(height * scale)))), Image.BILINEAR
+        )
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    tensor = np.asarray(image, dtype=np.float32).transpose(2, 0, 1) / 255.0
+    return np.ascontiguousarray(tensor), image.size
+
+
+def nms(boxes: np.ndarray, scores: np.ndarray, iou: float, max_det: int = 0) -> np.ndarray:
+    if len(boxes) == 0:
+        return np.empty(0, dtype=np.int64)
+    x1, y1, x2, y2 = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    areas = np.maximum(x2 - x1, 0) * np.maximum(y2 - y1, 0)
+    order = np.argsort(-scores, kind="stable")
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        if max_det and len(keep) >= max_det:
+            break
+        rest = order[1:]
+        inter_w = np.maximum(np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]), 0)
+        inter_h = np.maximum(np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]), 0)
+        inter = inter_w * inter_h
+        union = areas[i] + areas[rest] - inter
+        overlap = np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+        order = rest[overlap <= iou]
+    return np.asarray(keep, dtype=np.int64)
+
+
+def batched_nms(
+    boxes: np.ndarray,
+    scores: np.ndarray,
+    classes: np.ndarray,
+    iou: float,
+    max_det: int = 0,
+    agnostic: bool = False,
+) -> np.ndarray:
+    if agnostic or len(boxes) == 0:
+        return nms(boxes, scores, iou, max_det)
+    # Shift each class into its own coordinate range so one pass never
+    # suppresses across classes.
+    offsets = classes.astype(boxes.dtype)[:, None] * (float(boxes.max()) + 1.0)
+    return nms(boxes + offsets, scores, iou, max_det)
+
+
+def _lap(timings: Optional[dict], stage: str, start: float) -> float:
+    # Adds the time since start to timings[stage]; returns now for the next stage.
+    now = time.perf_counter()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + now - start
+    return now
+
+
+def _parse_names(raw: Optional[str]) -> dict[int, str]:
+    if not raw:
+        return {}
+    try:
+        names = ast.literal_eval(raw)
+    except (ValueError, SyntaxError):
+        return {}
+    if isinstance(names, (list, tuple)):
+        names = dict(enumerate(names))
+    if not isinstance(names, dict):
+        return {}
+    return {int(k): str(v) for k, v in names.items()}
+
+
+class OnnxDetector:
+    # Wraps an exported graph in one of two layouts:
+    #   "yolo":       images[N,3,S,S] -> [N, 4 + nc, anchors] (raw head, no NMS)
+    #   "fasterrcnn": images[3,H,W]   -> boxes[K,4], labels[K], scores[K] (1-based labels)
+    def __init__(self, path: Path, providers: Optional[list[str]] = None, threads: int = 0):
+        if ort is None:
+            raise RuntimeError("onnxruntime is required for ONNX models (pip install onnxruntime)")
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads > 0:
+            options.intra_op_num_threads = int(threads)
+        self.session = ort.InferenceSession(
+            str(path), sess_options=options, providers=providers or resolve_providers()
+        )
+        self.providers = self.session.get_providers()
+
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        self.output_names = [o.name for o in self.session.get_outputs()]
+        self.layout = "fasterrcnn" if {"boxes", "labels", "scores"} <= set(self.output_names) else "yolo"
+
+        shape = list(model_input.shape)
+        self.static_batch = shape[0] if len(shape) == 4 and isinstance(shape[0], int) else None
+        self.static_size = shape[2] if len(shape) == 4 and isinstance(shape[2], int) else None
+
+        meta = self.session.get_modelmeta().custom_metadata_map
+        self.names = _parse_names(meta.get("names"))
+
+    def input_size(self, imgsz: int) -> int:
+        if self.static_size:
+            return int(self.static_size)
+        return max(STRIDE, int(math.ceil(int(imgsz) / STRIDE)) * STRIDE)
+
+    def detect_batch(
+        self,
+        images: list[Image.Image],
+        conf: float = 0.15,
+        iou: float = 0.7,
+        max_det: int = 300,
+        agnostic_nms: bool = False,
+        imgsz: int = 640,
+        timings: Optional[dict] = None,
+    ) -> list[tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        # Returns (xyxy in source pixels, scores, class ids) per image. If given,
+        # timings accumulates seconds spent in preprocess / forward / postprocess.
+        if not images:
+            return []
+        if self.layout == "fasterrcnn":
+            return [
+                self._detect_frcnn(image, conf, iou, max_det, agnostic_nms, imgsz, timings) for image in images
+            ]
+        return self._detect_yolo(images, conf, iou, max_det, agnostic_nms, imgsz, timings)
+
+    def _detect_yolo(self, images, conf, iou, max_det, agnostic_nms, imgsz, timings=None):
+        start = time.perf_counter()
+        batch, geometry = yolo_input(images, self.input_size(imgsz))
+        start = _lap(timings, "preprocess", start)
+        if self.static_batch == 1 and len(images) > 1:
+            raw = np.concatenate(
+                [self.session.run(None, {self.input_name: batch[i : i + 1]})[0] for i in range(len(images))]
+            )
+        else:
+            raw = self.session.run(None, {self.input_name: batch})[0]
+        start = _lap(timings, "forward", start)
+
+        num_classes = len(self.names) or raw.shape[1] - 4
+        results = []
+        for preds, (scale, pad_x, pad_y, (width, height)) in zip(raw, geometry):
+            preds = preds.T
+            class_scores = preds[:, 4 : 4 + num_classes]
+            cls_ids = class_scores.argmax(axis=1)
+            scores = class_scores[np.arange(len(cls_ids)), cls_ids]
+            mask = scores >= float(conf)
+            preds, scores, cls_ids = preds[mask], scores[mask], cls_ids[mask]
+            if len(scores) > MAX_NMS_CANDIDATES:
+                top = np.argsort(-scores, kind="stable")[:MAX_NMS_CANDIDATES]
+                preds, scores, cls_ids = preds[top], scores[top], cls_ids[top]
+
+            cx, cy, w, h = preds[:, 0], preds[:, 1], preds[:, 2], preds[:, 3]
+            boxes = np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1)
+            keep = batched_nms(boxes, scores, cls_ids, iou, int(max_det), agnostic_nms)
+            boxes, scores, cls_ids = boxes[keep], scores[keep], cls_ids[keep]
+
+            boxes[:, [0, 2]] -= pad_x
+            boxes[:, [1, 3]] -= pad_y
+            boxes /= scale
+            boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, width)
+            boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, height)
+            results.append((boxes, scores, cls_ids))
+        _lap(timings, "postprocess", start)
+        return results
+
+    def _detect_frcnn(self, image, conf, iou, max_det, agnostic_nms, imgsz, timings=None):
+        start = time.perf_counter()
+        width, height = image.size
+        tensor, (input_w, input_h) = frcnn_input(image, imgsz)
+        start = _lap(timings, "preprocess", start)
+        outputs = dict(zip(self.output_names, self.session.run(None, {self.input_name: tensor})))
+        start = _lap(timings, "forward", start)
+        boxes = outputs["boxes"].astype(np.float32)
+        scores = outputs["scores"].astype(np.float32)
+        cls_ids = outputs["labels"].astype(np.int64)
+
+        mask = scores >= float(conf)
+        boxes, scores, cls_ids = boxes[mask], scores[mask], cls_ids[mask]
+        # The graph's own NMS uses the threshold baked in at export; apply the
+        # per-request one on top.
+        keep = batched_nms(boxes, scores, cls_ids, iou, int(max_det), agnostic_nms)
+        boxes, scores, cls_ids = boxes[keep], scores[keep], cls_ids[keep]
+        if (input_w, input_h) != (width, height):
+            boxes[:, [0, 2]] *= width / input_w
+            boxes[:, [1, 3]] *= height / input_h
+        _lap(timings, "postprocess", start)
+        return boxes, scores, cls_ids
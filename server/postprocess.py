@@ -0,0 +1,305 @@
+import json
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+
+def clamp01(value: float) -> float:
+    if value != value:
+        return 0.0
+    return max(0.0, min(1.0, value))
+
+
+# Largest max_det the API accepts; exported graphs keep at least this many detections.
+MAX_DET_LIMIT = 2000
+
+CATEGORIES = ("plastic", "paper", "glass", "metal", "battery", "organic", "unknown")
+ALLOWED = set(CATEGORIES)
+_CATEGORY_LABELS = np.asarray(CATEGORIES, dtype=object)
+_UNKNOWN = CATEGORIES.index("unknown")
+
+# Dataset (TR) labels and common alternatives -> app categories, keyed by the
+# normalized name (Turkish letters stripped, lowercased). LABEL_MAP_PATH adds to it.
+DEFAULT_LABEL_MAP = {
+    "cam": "glass",
+    "kagit": "paper",
+    "kâgit": "paper",
+    "pil": "battery",
+    "plastik": "plastic",
+    "cardboard": "paper",
+    "can": "metal",
+    "aluminium": "metal",
+    "aluminum": "metal",
+    "tin": "metal",
+    "compost": "organic",
+    "food": "organic",
+    "food_waste": "organic",
+}
+
+
+def strip_turkish(s: str) -> str:
+    return (
+        (s or "")
+        .replace("İ", "I")
+        .replace("ı", "i")
+        .replace("ğ", "g")
+        .replace("Ğ", "G")
+        .replace("ş", "s")
+        .replace("Ş", "S")
+        .replace("ö", "o")
+        .replace("Ö", "O")
+        .replace("ü", "u")
+        .replace("Ü", "U")
+        .replace("ç", "c")
+        .replace("Ç", "C")
+    )
+
+
+def _label_key(raw: str) -> str:
+    return strip_turkish(raw).strip().lower()
+
+
+def normalize_label(raw: str, label_map: Optional[dict] = None) -> str:
+    label = _label_key(raw)
+    if label in ALLOWED:
+        return label
+    return (DEFAULT_LABEL_MAP if label_map is None else label_map).get(label, "unknown")
+
+
+def load_label_map(path: Path) -> dict:
+    # A JSON object of class name -> category, layered over DEFAULT_LABEL_MAP.
+    with open(path, encoding="utf-8") as f:
+        raw = json.load(f)
+    if not isinstance(raw, dict):
+        raise ValueError(f"{path}: expected a JSON object of class name -> category")
+    invalid = sorted({str(v) for v in raw.values() if v not in ALLOWED})
+    if invalid:
+        raise ValueError(f"{path}: unknown categories {', '.join(invalid)} (allowed: {', '.join(CATEGORIES)})")
+    return {**DEFAULT_LABEL_MAP, **{_label_key(str(k)): v for k, v in raw.items()}}
+
+
+def category_table(names: dict, label_map: Optional[dict] = None) -> np.ndarray:
+    # Class id -> index into CATEGORIES, built once per model so detections map
+    # with a single gather instead of normalizing names per box.
+    ids = [int(k) for k in names if int(k) >= 0]
+    table = np.full(max(ids, default=-1) + 1, _UNKNOWN, dtype=np.uint8)
+    for class_id, name in names.items():
+        if int(class_id) >= 0:
+            table[int(class_id)] = CATEGORIES.index(normalize_label(str(name), label_map))
+    return table
+
+
+def map_classes(table: np.ndarray, cls_ids) -> np.ndarray:
+    # Ids outside the table (no name in the checkpoint) map to "unknown".
+    cls_ids = np.asarray(cls_ids, dtype=np.intp)
+    valid = (cls_ids >= 0) & (cls_ids < len(table))
+    if valid.all():
+        return table[cls_ids]
+    codes = np.full(len(cls_ids), _UNKNOWN, dtype=np.uint8)
+    codes[valid] = table[cls_ids[valid]]
+    return codes
+
+
+def category_labels(codes: np.ndarray) -> np.ndarray:
+    return _CATEGORY_LABELS[codes]
+
+
+def iou_xyxy(a, b) -> float:
+    x1 = max(a[0], b[0])
+    y1 = max(a[1], b[1])
+    x2 = min(a[2], b[2])
+    y2 = min(a[3], b[3])
+    inter_w = max(0.0, x2 - x1)
+    inter_h = max(0.0, y2 - y1)
+    inter = inter_w * inter_h
+    area_a = max(0.0, a[2] - a[0]) * max(0.0, a[3] - a[1])
+    area_b = max(0.0, b[2] - b[0]) * max(0.0, b[3] - b[1])
+    union = area_a + area_b - inter
+    if union <= 0:
+        return 0.0
+    return inter / union
+
+
+_CONFLICT_BLOCK_ROWS = 256
+
+
+def _conflict_matrices(
+    boxes: np.ndarray,
+    label_codes: np.ndarray,
+    same_iou: float,
+    same_area: float,
+    cross_iou: float,
+    cross_area: float,
+) -> tuple[np.ndarray, np.ndarray]:
+    # Pairwise IoU / area-ratio for every box pair, built in row blocks so the
+    # float temporaries stay small even at max_det=2000.
+    n = len(boxes)
+    x1, y1, x2, y2 = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    areas = np.maximum(0.0, x2 - x1) * np.maximum(0.0, y2 - y1)
+    same = np.zeros((n, n), dtype=bool)
+    cross = np.zeros((n, n), dtype=bool)
+    for start in range(0, n, _CONFLICT_BLOCK_ROWS):
+        rows = slice(start, min(n, start + _CONFLICT_BLOCK_ROWS))
+        inter = np.minimum(x2[rows, None], x2)
+        inter -= np.maximum(x1[rows, None], x1)
+        np.maximum(inter, 0.0, out=inter)
+        inter_h = np.minimum(y2[rows, None], y2)
+        inter_h -= np.maximum(y1[rows, None], y1)
+        np.maximum(inter_h, 0.0, out=inter_h)
+        inter *= inter_h
+        union = areas[rows, None] + areas
+        union -= inter
+        iou = np.divide(inter, union, out=inter_h, where=union > 0)
+        iou[union <= 0] = 0.0
+        larger = np.maximum(areas[rows, None], areas)
+        ratio = np.minimum(areas[rows, None], areas, out=union)
+        np.divide(ratio, larger, out=ratio, where=larger > 0)
+        ratio[larger <= 0] = 0.0
+        same_label = label_codes[rows, None] == label_codes
+        same[rows] = same_label & (iou >= same_iou) & (ratio >= same_area)
+        cross[rows] = ~same_label & (iou >= cross_iou) & (ratio >= cross_area)
+    np.fill_diagonal(same, False)
+    return same, cross
+
+
+def _greedy_keep(conflict: np.ndarray) -> np.ndarray:
+    # Rows are in confidence order; a kept box suppresses everything it conflicts
+    # with. Boxes without any conflict are kept without entering the loop.
+    suppressed = np.zeros(len(conflict), dtype=bool)
+    for i in np.flatnonzero(conflict.any(axis=1)).tolist():
+        if not suppressed[i]:
+            suppressed |= conflict[i]
+    return np.flatnonzero(~suppressed)
+
+
+def dedupe_boxes(
+    boxes: np.ndarray,
+    scores: np.ndarray,
+    label_codes: np.ndarray,
+    same_iou: float = 0.85,
+    same_area: float = 0.9,
+    cross_iou: float = 0.85,
+    cross_area: float = 0.85,
+) -> np.ndarray:
+    if len(boxes) == 0:
+        return np.zeros(0, dtype=np.intp)
+
+    # Same semantics as the per-dict loops kept in bench/_reference.py (same-label pass,
+    # then cross-label pass), but on arrays.
+    order = np.argsort(-np.asarray(scores), kind="stable")
+    boxes = np.asarray(boxes, dtype=np.float64)[order]
+    same, cross = _conflict_matrices(
+        boxes, np.asarray(label_codes)[order], same_iou, same_area, cross_iou, cross_area
+    )
+    survivors = _greedy_keep(same)
+    keep = _greedy_keep(cross[np.ix_(survivors, survivors)])
+    return order[survivors[keep]]
+
+
+def detections_from_arrays(
+    xyxy: np.ndarray,
+    scores: np.ndarray,
+    labels: np.ndarray,
+    width: float,
+    height: float,
+    dedupe: tuple[float, float, float, float],
+    scale: tuple[float, float] = (1.0, 1.0),
+    label_codes: Optional[np.ndarray] = None,
+) -> list:
+    if len(xyxy) == 0:
+        return []
+    xyxy = np.asarray(xyxy)
+    scale_x, scale_y = scale
+    # Mirror the per-detection float math exactly so results match the dict path:
+    # unscaled boxes take their width in the model's dtype, scaled ones in float64.
+    if scale_x == 1.0 and scale_y == 1.0:
+        left = xyxy[:, 0].astype(np.float64)
+        top = xyxy[:, 1].astype(np.float64)
+        span_w = (xyxy[:, 2] - xyxy[:, 0]).astype(np.float64)
+        span_h = (xyxy[:, 3] - xyxy[:, 1]).astype(np.float64)
+    else:
+        scaled = xyxy.astype(np.float64) * np.array([scale_x, scale_y, scale_x, scale_y])
+        left, top = scaled[:, 0], scaled[:, 1]
+        span_w = scaled[:, 2] - scaled[:, 0]
+        span_h = scaled[:, 3] - scaled[:, 1]
+    x = np.clip(left / float(width), 0.0, 1.0)
+    y = np.clip(top / float(height), 0.0, 1.0)
+    w = np.clip(span_w / float(width), 0.0, 1.0)
+    h = np.clip(span_h / float(height), 0.0, 1.0)
+    conf = np.nan_to_num(np.clip(np.asarray(scores, dtype=np.float64), 0.0, 1.0), nan=0.0)
+
+    labels = np.asarray(labels, dtype=object)
+    if label_codes is None:
+        _, label_codes = np.unique(labels.astype(str), return_inverse=True)
+    boxes = np.stack([x, y, x + w, y + h], axis=1)
+    keep = dedupe_boxes(boxes, conf, label_codes, *dedupe)
+
+    return [
+        {
+            "label": str(labels[i]),
+            "confidence": float(conf[i]),
+            "box": {"x": float(x[i]), "y": float(y[i]), "width": float(w[i]), "height": float(h[i])},
+        }
+        for i in keep.tolist()
+    ]
+
+
+def weighted_box_fusion(predictions: list[list], iou_threshold: float = 0.55, max_det: int = 0) -> list:
+    # Fuses the detections several models made on the same frame: same-label boxes
+    # overlapping a cluster by more than iou_threshold are averaged, weighted by
+    # confidence. The fused confidence is scaled down by the share of models that
+    # contributed, so a box only one model saw ranks below one they agree on.
+    num_models = len(predictions)
+    candidates = []
+    unboxed = []
+    for model_index, detections in enumerate(predictions):
+        for d in detections:
+            box = d.get("box")
+            if box is None:
+                unboxed.append(d)
+                continue
+            xyxy = (box["x"], box["y"], box["x"] + box["width"], box["y"] + box["height"])
+            candidates.append((float(d["confidence"]), d["label"], model_index, xyxy))
+    candidates.sort(key=lambda c: c[0], reverse=True)
+
+    clusters = []
+    for confidence, label, model_index, xyxy in candidates:
+        best = None
+        best_iou = iou_threshold
+        for cluster in clusters:
+            if cluster["label"] != label:
+                continue
+            iou = iou_xyxy(cluster["box"], xyxy)
+            if iou > best_iou:
+                best, best_iou = cluster, iou
+        if best is None:
+            clusters.append({"label": label, "members": [(confidence, model_index, xyxy)], "box": xyxy})
+            continue
+        best["members"].append((confidence, model_index, xyxy))
+        total = sum(c for c, _, _ in best["members"])
+        best["box"] = tuple(sum(c * b[k] for c, _, b in best["members"]) / total for k in range(4))
+
+    fused = []
+    for cluster in clusters:
+        members = cluster["members"]
+        models = len({m for _, m, _ in members})
+        confidence = sum(c for c, _, _ in members) / len(members) * min(models, num_models) / num_models
+        x1, y1, x2, y2 = cluster["box"]
+        fused.append(
+            {
+                "label": cluster["label"],
+                "confidence": clamp01(confidence),
+                "box": {
+                    "x": clamp01(x1),
+                    "y": clamp01(y1),
+                    "width": clamp01(x2 - x1),
+                    "height": clamp01(y2 - y1),
+                },
+            }
+        )
+    fused.extend(unboxed)
+    fused.sort(key=lambda d: d["confidence"], reverse=True)
+    if max_det:
+        fused = fused[: int(max_det)]
+    return fused
@@ -0,0 +1,238 @@
+import json
+import struct
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+from .postprocess import CATEGORIES
+
+SUBPROTOCOL = "waste.bin.v1"
+MAGIC = b"WP"
+VERSION = 1
+
+FLAG_AGNOSTIC_NMS = 0x01
+FLAG_TRACK = 0x02
+FLAG_ADAPTIVE = 0x04
+FLAG_DEADLINE = 0x08
+
+FLAG_CACHED = 0x01
+FLAG_KEYFRAME = 0x02
+FLAG_TRACK_IDS = 0x04
+FLAG_INFO = 0x08
+
+STATUS_OK = 0
+STATUS_ERROR = 1
+STATUS_BUSY = 2
+STATUS_DEADLINE = 3
+
+# magic, version, flags, request id, conf, iou, imgsz, max_det, topk, model id length
+REQUEST_HEADER = struct.Struct("<2sBBIffHHBB")
+# magic, version, status, request id, image width, image height, detection count, flags
+RESPONSE_HEADER = struct.Struct("<2sBBIIIHB")
+# Deadline budget in milliseconds, after the model id when FLAG_DEADLINE is set.
+DEADLINE_FIELD = struct.Struct("<I")
+# Length of the JSON info block that ends a response when FLAG_INFO is set.
+INFO_LENGTH = struct.Struct("<H")
+
+_CATEGORY_INDEX = {name: i for i, name in enumerate(CATEGORIES)}
+_UNKNOWN_INDEX = _CATEGORY_INDEX["unknown"]
+
+
+class ProtocolError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class BinaryRequest:
+    request_id: int
+    model_id: str
+    params: dict
+    image: bytes
+    track: bool = False
+    deadline_ms: Optional[int] = None
+
+
+def decode_request(message: bytes) -> BinaryRequest:
+    if len(message) < REQUEST_HEADER.size:
+        raise ProtocolError("Frame shorter than header")
+    magic, version, flags, request_id, conf, iou, imgsz, max_det, topk, model_len = (
+        REQUEST_HEADER.unpack_from(message)
+    )
+    if magic != MAGIC:
+        raise ProtocolError("Bad magic")
+    if version != VERSION:
+        raise ProtocolError(f"Unsupported protocol version {version}")
+    offset = REQUEST_HEADER.size
+    model_end = offset + model_len
+    if len(message) < model_end:
+        raise ProtocolError("Truncated model id")
+    model_id = bytes(message[offset:model_end]).decode("utf-8", errors="replace")
+    deadline_ms = None
+    image_start = model_end
+    if flags & FLAG_DEADLINE:
+        image_start += DEADLINE_FIELD.size
+        if len(message) < image_start:
+            raise ProtocolError("Truncated deadline")
+        (deadline_ms,) = DEADLINE_FIELD.unpack_from(message, model_end)
+    return BinaryRequest(
+        request_id=request_id,
+        model_id=model_id,
+        params={
+            # float32 on the wire; round so cache keys match the JSON path.
+            "conf": round(conf, 4),
+            "iou": round(iou, 4),
+            "imgsz": imgsz,
+            "max_det": max_det,
+            "topk": topk,
+            "agnostic_nms": bool(flags & FLAG_AGNOSTIC_NMS),
+            "adaptive": bool(flags & FLAG_ADAPTIVE),
+        },
+        image=bytes(message[image_start:]),
+        track=bool(flags & FLAG_TRACK),
+        deadline_ms=deadline_ms,
+    )
+
+
+def encode_request(
+    image: bytes,
+    request_id: int = 0,
+    model_id: str = "",
+    conf: float = 0.15,
+    iou: float = 0.7,
+    imgsz: int = 640,
+    max_det: int = 300,
+    topk: int = 5,
+    agnostic_nms: bool = False,
+    track: bool = False,
+    adaptive: bool = False,
+    deadline_ms: Optional[int] = None,
+) -> bytes:
+    model = model_id.encode("utf-8")
+    flags = (FLAG_AGNOSTIC_NMS if agnostic_nms else 0) | (FLAG_TRACK if track else 0)
+    flags |= FLAG_ADAPTIVE if adaptive else 0
+    deadline = b""
+    if deadline_ms is not None:
+        flags |= FLAG_DEADLINE
+        deadline = DEADLINE_FIELD.pack(min(max(int(deadline_ms), 0), 0xFFFFFFFF))
+    header = REQUEST_HEADER.pack(
+        MAGIC,
+        VERSION,
+        flags,
+        request_id & 0xFFFFFFFF,
+        conf,
+        iou,
+        imgsz,
+        max_det,
+        topk,
+        len(model),
+    )
+    return header + model + deadline + image
+
+
+def encode_response(
+    request_id: int,
+    detections: list,
+    width: int,
+    height: int,
+    cached: bool = False,
+    keyframe: bool = False,
+    info: Optional[dict] = None,
+) -> bytes:
+    # Body: count x float32[x, y, width, height, confidence] then count x uint8 category,
+    # then count x uint16 track id when FLAG_TRACK_IDS is set (0 = untracked), then
+    # with FLAG_INFO a uint16 length and a JSON object of the extra JSON-reply fields
+    # (imgsz, route, dropped, ...).
+    # Detections without a box (classification models) carry -1 coordinates.
+    count = min(len(detections), 0xFFFF)
+    values = np.full((count, 5), -1.0, dtype="<f4")
+    classes = np.empty(count, dtype=np.uint8)
+    for i, d in enumerate(detections[:count]):
+        box = d.get("box")
+        if isinstance(box, dict):
+            values[i, 0] = box["x"]
+            values[i, 1] = box["y"]
+            values[i, 2] = box["width"]
+            values[i, 3] = box["height"]
+        values[i, 4] = d["confidence"]
+        classes[i] = _CATEGORY_INDEX.get(d["label"], _UNKNOWN_INDEX)
+    tracked = any("trackId" in d for d in detections[:count])
+    flags = (FLAG_CACHED if cached else 0) | (FLAG_KEYFRAME if keyframe else 0)
+    tail = b""
+    if tracked:
+        flags |= FLAG_TRACK_IDS
+        track_ids = np.array([d.get("trackId", 0) & 0xFFFF for d in detections[:count]], dtype="<u2")
+        tail = track_ids.tobytes()
+    if info:
+        blob = json.dumps(info, separators=(",", ":")).encode("utf-8")[: 0xFFFF]
+        flags |= FLAG_INFO
+        tail += INFO_LENGTH.pack(len(blob)) + blob
+    header = RESPONSE_HEADER.pack(
+        MAGIC,
+        VERSION,
+        STATUS_OK,
+        request_id & 0xFFFFFFFF,
+        int(width),
+        int(height),
+        count,
+        flags,
+    )
+    return header + values.tobytes() + classes.tobytes() + tail
+
+
+def encode_error(request_id: int, message: str, busy: bool = False, expired: bool = False) -> bytes:
+    status = STATUS_BUSY if busy else STATUS_DEADLINE if expired else STATUS_ERROR
+    header = RESPONSE_HEADER.pack(
+        MAGIC,
+        VERSION,
+        status,
+        request_id & 0xFFFFFFFF,
+        0,
+        0,
+        0,
+        0,
+    )
+    return header + message.encode("utf-8")
+
+
+def decode_response(message: bytes) -> dict:
+    magic, version, status, request_id, width, height, count, flags = RESPONSE_HEADER.unpack_from(message)
+    if magic != MAGIC or version != VERSION:
+        raise ProtocolError("Bad response header")
+    body = memoryview(message)[RESPONSE_HEADER.size :]
+    if status != STATUS_OK:
+        return {
+            "id": request_id,
+            "error": bytes(body).decode("utf-8"),
+            "busy": status == STATUS_BUSY,
+            "deadlineExceeded": status == STATUS_DEADLINE,
+        }
+
+    values = np.frombuffer(body, dtype="<f4", count=count * 5).reshape(count, 5)
+    classes = np.frombuffer(body, dtype=np.uint8, count=count, offset=count * 20)
+    track_ids = [0] * count
+    offset = count * 21
+    if flags & FLAG_TRACK_IDS:
+        track_ids = np.frombuffer(body, dtype="<u2", count=count, offset=offset).tolist()
+        offset += count * 2
+    info = {}
+    if flags & FLAG_INFO:
+        (length,) = INFO_LENGTH.unpack_from(body, offset)
+        start = offset + INFO_LENGTH.size
+        info = json.loads(bytes(body[start : start + length]))
+    detections = []
+    for (x, y, w, h, confidence), cls, track_id in zip(values.tolist(), classes.tolist(), track_ids):
+        d = {"label": CATEGORIES[cls], "confidence": confidence}
+        if w >= 0:
+            d["box"] = {"x": x, "y": y, "width": w, "height": h}
+        if track_id:
+            d["trackId"] = track_id
+        detections.append(d)
+    return {
+        "id": request_id,
+        "image": {"width": width, "height": height},
+        "detections": detections,
+        "cached": bool(flags & FLAG_CACHED),
+        "keyframe": bool(flags & FLAG_KEYFRAME),
+        **info,
+    }
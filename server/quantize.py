@@ -0,0 +1,271 @@
+import argparse
+import json
+import random
+import statistics
+import time
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import yaml
+
+from .imaging import decode_image
+from .onnx_backend import OnnxDetector, frcnn_input, resolve_providers, yolo_input
+
+ROOT = Path(__file__).resolve().parents[1]
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+
+
+def int8_path(fp32: Path) -> Path:
+    # The server registers <stem>.int8.onnx next to an FP32 graph as "<id>-int8".
+    return fp32.with_name(f"{fp32.stem}.int8.onnx")
+
+
+def split_images(data_yaml: Path, split: str, dataset_root: Optional[Path]) -> list[Path]:
+    config = yaml.safe_load(data_yaml.read_text(encoding="utf-8"))
+    root = Path(dataset_root or config.get("path") or data_yaml.parent)
+    if not root.is_absolute():
+        root = data_yaml.parent / root
+    folder = root / config[split]
+    if not folder.is_dir():
+        raise SystemExit(f"{split} images not found at {folder} (use --dataset-root)")
+    return sorted(p for p in folder.rglob("*") if p.suffix.lower() in IMAGE_SUFFIXES)
+
+
+def label_path(image_path: Path) -> Path:
+    # YOLO layout: .../images/<split>/x.jpg -> .../labels/<split>/x.txt
+    parts = list(image_path.parts)
+    for i in range(len(parts) - 1, -1, -1):
+        if parts[i] == "images":
+            parts[i] = "labels"
+            break
+    return Path(*parts).with_suffix(".txt")
+
+
+def load_ground_truth(image_path: Path, width: int, height: int) -> tuple[np.ndarray, np.ndarray]:
+    path = label_path(image_path)
+    rows = []
+    if path.exists():
+        for line in path.read_text().splitlines():
+            parts = line.split()
+            if len(parts) >= 5:
+                rows.append([float(v) for v in parts[:5]])
+    if not rows:
+        return np.zeros((0, 4)), np.zeros(0, dtype=np.int64)
+    arr = np.asarray(rows)
+    cx, cy, w, h = arr[:, 1] * width, arr[:, 2] * height, arr[:, 3] * width, arr[:, 4] * height
+    boxes = np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1)
+    return boxes, arr[:, 0].astype(np.int64)
+
+
+def _iou_matrix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    tl = np.maximum(a[:, None, :2], b[None, :, :2])
+    br = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.prod(np.clip(br - tl, 0, None), axis=2)
+    area_a = np.prod(a[:, 2:] - a[:, :2], axis=1)
+    area_b = np.prod(b[:, 2:] - b[:, :2], axis=1)
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+
+
+def _average_precision(tp: np.ndarray, scores: np.ndarray, num_gt: int) -> float:
+    if num_gt == 0:
+        return float("nan")
+    if len(tp) == 0:
+        return 0.0
+    order = np.argsort(-scores, kind="stable")
+    tp = tp[order]
+    tp_cum = np.cumsum(tp)
+    fp_cum = np.cumsum(1 - tp)
+    recall = tp_cum / num_gt
+    precision = tp_cum / (tp_cum + fp_cum)
+    # 101-point interpolated AP, as in COCO / Ultralytics val.
+    envelope = np.flip(np.maximum.accumulate(np.flip(np.concatenate([[1.0], precision, [0.0]]))))
+    recall = np.concatenate([[0.0], recall, [1.0]])
+    points = np.linspace(0, 1, 101)
+    curve = np.interp(points, recall, envelope)
+    return float(np.sum((curve[1:] + curve[:-1]) / 2 * np.diff(points)))
+
+
+def map50(predictions: list, ground_truth: list, num_classes: int) -> float:
+    # predictions: (boxes, scores, classes) per image; ground_truth: (boxes, classes).
+    aps = []
+    for cls in range(num_classes):
+        tps, confs, num_gt = [], [], 0
+        for (p_boxes, p_scores, p_cls), (g_boxes, g_cls) in zip(predictions, ground_truth):
+            pm, gm = p_cls == cls, g_cls == cls
+            pb, ps, gb = p_boxes[pm], p_scores[pm], g_boxes[gm]
+            num_gt += len(gb)
+            if len(pb) == 0:
+                continue
+            hit = np.zeros(len(pb))
+            if len(gb):
+                order = np.argsort(-ps, kind="stable")
+                overlaps = _iou_matrix(pb[order], gb)
+                taken = np.zeros(len(gb), dtype=bool)
+                for rank, row in enumerate(overlaps):
+                    row = np.where(taken, -1.0, row)
+                    best = int(row.argmax())
+                    if row[best] >= 0.5:
+                        taken[best] = True
+                        hit[order[rank]] = 1.0
+            tps.append(hit)
+            confs.append(ps)
+        ap = _average_precision(
+            np.concatenate(tps) if tps else np.zeros(0),
+            np.concatenate(confs) if confs else np.zeros(0),
+            num_gt,
+        )
+        if not np.isnan(ap):
+            aps.append(ap)
+    return float(np.mean(aps)) if aps else 0.0
+
+
+def _calibration_reader(detector: OnnxDetector, images: list[Path], imgsz: int):
+    from onnxruntime.quantization import CalibrationDataReader
+
+    class Reader(CalibrationDataReader):
+        def __init__(self):
+            self._paths = iter(images)
+
+        def get_next(self):
+            path = next(self._paths, None)
+            if path is None:
+                return None
+            image = decode_image(path.read_bytes())
+            if detector.layout == "fasterrcnn":
+                tensor, _ = frcnn_input(image, imgsz)
+            else:
+                tensor, _ = yolo_input([image], detector.input_size(imgsz))
+            return {detector.input_name: tensor}
+
+    return Reader()
+
+
+def quantize(fp32: Path, out: Path, mode: str, calib: list[Path], imgsz: int, op_types: list[str]) -> Path:
+    from onnxruntime.quantization import QuantFormat, QuantType, quantize_dynamic, quantize_static
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    out.parent.mkdir(parents=True, exist_ok=True)
+    prepared = out.with_name(f"{out.stem}.prep.onnx")
+    quant_pre_process(str(fp32), str(prepared), skip_symbolic_shape=True)
+    try:
+        if mode == "dynamic":
+            quantize_dynamic(
+                str(prepared),
+                str(out),
+                weight_type=QuantType.QUInt8,
+                op_types_to_quantize=op_types,
+            )
+        else:
+            detector = OnnxDetector(fp32, providers=["CPUExecutionProvider"])
+            # Only Conv/MatMul by default: the box-decode tail of the head stays in
+            # float, which is where INT8 costs the most localisation accuracy.
+            quantize_static(
+                str(prepared),
+                str(out),
+                _calibration_reader(detector, calib, imgsz),
+                quant_format=QuantFormat.QDQ,
+                per_channel=True,
+                activation_type=QuantType.QUInt8,
+                weight_type=QuantType.QInt8,
+                op_types_to_quantize=op_types,
+            )
+    finally:
+        prepared.unlink(missing_ok=True)
+    return out
+
+
+def evaluate(path: Path, images: list[Path], imgsz: int, provider: str, warmup: int = 3) -> dict:
+    detector = OnnxDetector(path, providers=resolve_providers(provider))
+    num_classes = len(detector.names) or 0
+    # torchvision graphs use 1-based labels (0 is background); YOLO labels are 0-based.
+    offset = 1 if detector.layout == "fasterrcnn" else 0
+
+    decoded = [decode_image(p.read_bytes()) for p in images]
+    for image in decoded[:warmup]:
+        detector.detect_batch([image], conf=0.001, iou=0.7, max_det=300, imgsz=imgsz)
+
+    predictions, ground_truth, timings = [], [], []
+    for image_path, image in zip(images, decoded):
+        start = time.perf_counter()
+        boxes, scores, cls_ids = detector.detect_batch(
+            [image], conf=0.001, iou=0.7, max_det=300, imgsz=imgsz
+        )[0]
+        timings.append((time.perf_counter() - start) * 1000.0)
+        predictions.append((boxes, scores, cls_ids - offset))
+        gt = load_ground_truth(image_path, *image.size)
+        ground_truth.append(gt)
+        if len(gt[1]):
+            num_classes = max(num_classes, int(gt[1].max()) + 1)
+
+    return {
+        "model": str(path),
+        "sizeMB": round(path.stat().st_size / 1e6, 2),
+        "providers": detector.providers,
+        "images": len(images),
+        "mAP50": round(map50(predictions, ground_truth, num_classes), 4),
+        "latencyMsP50": round(statistics.median(timings), 2) if timings else None,
+        "latencyMsMean": round(statistics.fmean(timings), 2) if timings else None,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="INT8-quantize an exported ONNX model and compare it to FP32")
+    parser.add_argument("--model", type=Path, default=ROOT / "trainedmodel" / "best.onnx", help="FP32 graph")
+    parser.add_argument("--out", type=Path, help="default: <model>.int8.onnx")
+    parser.add_argument("--mode", choices=["static", "dynamic"], default="static")
+    parser.add_argument("--data", type=Path, default=ROOT / "trainedmodel" / "data.yaml")
+    parser.add_argument("--dataset-root", type=Path, help="override `path` from data.yaml")
+    parser.add_argument("--split", default="val")
+    parser.add_argument("--calib-images", type=int, default=100)
+    parser.add_argument("--eval-images", type=int, default=300, help="0 = every remaining image")
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--op-types", default="Conv,MatMul")
+    parser.add_argument("--provider", default="cpu", help="provider used for the comparison run")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--skip-quantize", action="store_true", help="only compare an existing INT8 graph")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    images = split_images(args.data, args.split, args.dataset_root)
+    random.Random(args.seed).shuffle(images)
+    # Calibration and evaluation images are disjoint so the report isn't
+    # measured on the frames the ranges were fitted to.
+    calib = images[: args.calib_images]
+    held_out = images[args.calib_images :]
+    if args.eval_images > 0:
+        held_out = held_out[: args.eval_images]
+    if not held_out:
+        raise SystemExit("No images left for evaluation; lower --calib-images")
+
+    out = args.out or int8_path(args.model)
+    if not args.skip_quantize:
+        op_types = [part.strip() for part in args.op_types.split(",") if part.strip()]
+        quantize(args.model, out, args.mode, calib, args.imgsz, op_types)
+
+    fp32 = evaluate(args.model, held_out, args.imgsz, args.provider)
+    int8 = evaluate(out, held_out, args.imgsz, args.provider)
+    report = {
+        "mode": args.mode,
+        "calibrationImages": len(calib),
+        "fp32": fp32,
+        "int8": int8,
+        "mAP50Delta": round(int8["mAP50"] - fp32["mAP50"], 4),
+        "speedup": round(fp32["latencyMsP50"] / int8["latencyMsP50"], 2) if int8["latencyMsP50"] else None,
+    }
+    out.with_suffix(".json").write_text(json.dumps(report, indent=2))
+    if args.json:
+        print(json.dumps(report))
+        return
+    print(f"{'model':>6} {'size MB':>8} {'mAP@0.5':>8} {'p50 ms':>8} {'mean ms':>8}")
+    for name, row in (("fp32", fp32), ("int8", int8)):
+        print(
+            f"{name:>6} {row['sizeMB']:>8.2f} {row['mAP50']:>8.4f} "
+            f"{row['latencyMsP50']:>8.2f} {row['latencyMsMean']:>8.2f}"
+        )
+    print(f"mAP@0.5 delta {report['mAP50Delta']:+.4f}, speedup x{report['speedup']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+import gc
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable
+
+
+class ReloadInProgressError(RuntimeError):
+    pass
+
+
+class ModelLoader:
+    def __init__(self, budget_bytes: int = 0):
+        self.budget_bytes = max(0, int(budget_bytes))
+        self._loaders: dict[str, Callable[[], Any]] = {}
+        self._loaded: "OrderedDict[str, Any]" = OrderedDict()
+        self._in_flight: dict[str, int] = {}
+        self._load_locks: dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._load_ms: dict[str, float] = {}
+        self.loads = 0
+        self.evictions = 0
+
+    def add(self, model_id: str, load: Callable[[], Any]) -> None:
+        with self._lock:
+            self._loaders[model_id] = load
+            self._load_locks.setdefault(model_id, threading.Lock())
+
+    def is_loaded(self, model_id: str) -> bool:
+        with self._lock:
+            return model_id in self._loaded
+
+    def _checkout(self, model_id: str) -> Any:
+        # Caller holds self._lock.
+        entry = self._loaded.get(model_id)
+        if entry is not None:
+            self._loaded.move_to_end(model_id)
+            self._in_flight[model_id] = self._in_flight.get(model_id, 0) + 1
+        return entry
+
+    def _release(self, model_id: str) -> None:
+        with self._lock:
+            self._in_flight[model_id] -= 1
+
+    def _acquire(self, model_id: str) -> Any:
+        with self._lock:
+            entry = self._checkout(model_id)
+            load = self._loaders[model_id]
+            load_lock = self._load_locks[model_id]
+        if entry is not None:
+            return entry
+
+        # One thread loads; concurrent first requests for the same model wait here
+        # and then pick up the loaded entry instead of loading it again.
+        with load_lock:
+            with self._lock:
+                entry = self._checkout(model_id)
+            if entry is not None:
+                return entry
+            start = time.perf_counter()
+            loaded = load()
+            elapsed = (time.perf_counter() - start) * 1000.0
+            with self._lock:
+                self._loaded[model_id] = loaded
+                self._load_ms[model_id] = elapsed
+                self.loads += 1
+                entry = self._checkout(model_id)
+                evicted = self._evict_over_budget()
+        if evicted:
+            gc.collect()
+        return entry
+
+    def _evict_over_budget(self) -> list:
+        # Caller holds self._lock. Models with requests in flight are never dropped,
+        # so the budget can be exceeded until they drain.
+        if self.budget_bytes <= 0:
+            return []
+        total = sum(getattr(e, "memory_bytes", 0) for e in self._loaded.values())
+        evicted = []
+        for model_id in list(self._loaded):
+            if total <= self.budget_bytes:
+                break
+            if self._in_flight.get(model_id, 0) > 0:
+                continue
+            entry = self._loaded.pop(model_id)
+            total -= getattr(entry, "memory_bytes", 0)
+            evicted.append(entry)
+            self.evictions += 1
+        return evicted
+
+    def swap(self, model_id: str, entry: Any, load: Callable[[], Any]) -> None:
+        # Requests that already hold the old entry finish on it; everything after
+        # this point gets the new one. Waits for a lazy load of the old version.
+        with self._load_locks.setdefault(model_id, threading.Lock()):
+            with self._lock:
+                self._loaders[model_id] = load
+                self._loaded[model_id] = entry
+                self._loaded.move_to_end(model_id)
+                evicted = self._evict_over_budget()
+        if evicted:
+            gc.collect()
+
+    def memory(self) -> dict:
+        with self._lock:
+            return {k: getattr(e, "memory_bytes", 0) for k, e in self._loaded.items()}
+
+    def load(self, model_id: str) -> Any:
+        entry = self._acquire(model_id)
+        self._release(model_id)
+        return entry
+
+    def run_batch(self, model_id: str, images: list, **params) -> list:
+        entry = self._acquire(model_id)
+        try:
+            if entry.infer_batch is not None:
+                return entry.infer_batch(images, **params)
+            return [entry.infer(image, **params) for image in images]
+        finally:
+            self._release(model_id)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "budgetBytes": self.budget_bytes,
+                "loadedBytes": sum(getattr(e, "memory_bytes", 0) for e in self._loaded.values()),
+                "loaded": list(self._loaded),
+                "inFlight": {k: v for k, v in self._in_flight.items() if v},
+                "loads": self.loads,
+                "evictions": self.evictions,
+                "lastLoadMs": {k: round(v, 1) for k, v in self._load_ms.items()},
+            }
@@ -0,0 +1,299 @@
+import argparse
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterator
+
+# Scoring has no use for the server's background preload; models load on first use.
+os.environ.setdefault("MODEL_PRELOAD", "none")
+
+from . import main as server  # noqa: E402
+from .imaging import decode_image, original_size  # noqa: E402
+from .quantize import IMAGE_SUFFIXES, split_images  # noqa: E402
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except Exception:
+    pa = None
+    pc = None
+    pq = None
+
+ROOT = Path(__file__).resolve().parents[1]
+PARQUET_PART_ROWS = 5000
+
+# One schema for every part, so a part holding only errors (or none) still has the
+# same column types and the directory reads as a single dataset.
+PARQUET_SCHEMA = None
+if pa is not None:
+    _BOX = pa.struct([(key, pa.float64()) for key in ("x", "y", "width", "height")])
+    _DETECTION = pa.struct([("label", pa.string()), ("confidence", pa.float64()), ("box", _BOX)])
+    PARQUET_SCHEMA = pa.schema(
+        [
+            ("path", pa.string()),
+            ("modelId", pa.string()),
+            ("modelVersion", pa.string()),
+            ("scoredAt", pa.string()),
+            ("width", pa.int32()),
+            ("height", pa.int32()),
+            ("detections", pa.list_(_DETECTION)),
+            ("route", pa.string()),
+            ("error", pa.string()),
+        ]
+    )
+
+
+def _decode(path: Path, imgsz: int):
+    try:
+        return decode_image(path.read_bytes(), imgsz), None
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}"
+
+
+def prefetch(paths: list[Path], imgsz: int, workers: int, depth: int) -> Iterator[tuple]:
+    # Yields (path, image or None, error or None) in input order, with up to
+    # `depth` decodes running ahead of inference.
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="score-decode") as pool:
+        pending = deque()
+        queue = iter(paths)
+        for path in queue:
+            pending.append((path, pool.submit(_decode, path, imgsz)))
+            if len(pending) >= depth:
+                break
+        while pending:
+            path, future = pending.popleft()
+            next_path = next(queue, None)
+            if next_path is not None:
+                pending.append((next_path, pool.submit(_decode, next_path, imgsz)))
+            yield (path, *future.result())
+
+
+class JsonlWriter:
+    def __init__(self, path: Path):
+        self.path = path
+
+    def done(self) -> set[str]:
+        # Rows with an error are scored again; a torn last line from a crash is ignored.
+        done = set()
+        if not self.path.exists():
+            return done
+        with self.path.open(encoding="utf-8") as f:
+            for line in f:
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if "error" not in row:
+                    done.add(row["path"])
+        return done
+
+    def open(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._resumed = self.path.exists() and self.path.stat().st_size > 0
+        self._file = self.path.open("a", encoding="utf-8")
+        if self._resumed:
+            with self.path.open("rb") as f:
+                f.seek(-1, os.SEEK_END)
+                # Start on a fresh line after a row torn by a crash.
+                if f.read(1) != b"\n":
+                    self._file.write("\n")
+
+    def write(self, rows: list[dict]) -> None:
+        for row in rows:
+            self._file.write(json.dumps(row) + "\n")
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+        if self._resumed:
+            self._compact()
+
+    def _compact(self) -> None:
+        # A path scored again (a retried error, or --no-resume) keeps only its newest row.
+        last = {}
+        with self.path.open(encoding="utf-8") as f:
+            for i, line in enumerate(f):
+                try:
+                    last[json.loads(line)["path"]] = i
+                except (json.JSONDecodeError, KeyError, TypeError):
+                    continue
+        keep = set(last.values())
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        with self.path.open(encoding="utf-8") as src, tmp.open("w", encoding="utf-8") as dst:
+            for i, line in enumerate(src):
+                if i in keep:
+                    dst.write(line if line.endswith("\n") else line + "\n")
+        tmp.replace(self.path)
+
+
+class ParquetWriter:
+    # A directory of part files: parquet can't be appended to, and finished parts
+    # survive an interrupted run.
+    def __init__(self, path: Path):
+        if pq is None:
+            raise SystemExit("pyarrow is required for Parquet output (pip install pyarrow)")
+        self.path = path
+        self._rows: list[dict] = []
+        self._scored: set[str] = set()
+
+    def done(self) -> set[str]:
+        done = set()
+        for part in sorted(self.path.glob("part-*.parquet")):
+            table = pq.read_table(part, columns=["path", "error"])
+            for path, error in zip(table.column("path").to_pylist(), table.column("error").to_pylist()):
+                if error is None:
+                    done.add(path)
+        return done
+
+    def open(self) -> None:
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._part = len(list(self.path.glob("part-*.parquet")))
+        self._first_part = self._part
+
+    def write(self, rows: list[dict]) -> None:
+        for row in rows:
+            self._scored.add(row["path"])
+            self._rows.append(
+                {
+                    "path": row["path"],
+                    "modelId": row["modelId"],
+                    "modelVersion": row["modelVersion"],
+                    "scoredAt": row["scoredAt"],
+                    "width": row.get("width"),
+                    "height": row.get("height"),
+                    "detections": row.get("detections"),
+                    "route": json.dumps(row["route"]) if "route" in row else None,
+                    "error": row.get("error"),
+                }
+            )
+        if len(self._rows) >= PARQUET_PART_ROWS:
+            self._flush()
+
+    def _flush(self) -> None:
+        if not self._rows:
+            return
+        target = self.path / f"part-{self._part:05d}.parquet"
+        # Written under a temporary name so a crash never leaves a truncated part.
+        tmp = target.with_suffix(".tmp")
+        pq.write_table(pa.Table.from_pylist(self._rows, schema=PARQUET_SCHEMA), tmp)
+        tmp.replace(target)
+        self._part += 1
+        self._rows = []
+
+    def close(self) -> None:
+        self._flush()
+        if self._first_part and self._scored:
+            self._compact()
+
+    def _compact(self) -> None:
+        # Rows in earlier runs' parts for paths scored again in this run are superseded.
+        rescored = pa.array(sorted(self._scored))
+        for part in sorted(self.path.glob("part-*.parquet"))[: self._first_part]:
+            table = pq.read_table(part)
+            stale = pc.is_in(table.column("path"), value_set=rescored)
+            if not pc.any(stale).as_py():
+                continue
+            tmp = part.with_suffix(".tmp")
+            pq.write_table(table.filter(pc.invert(stale)), tmp)
+            tmp.replace(part)
+
+
+def _input_paths(args) -> list[Path]:
+    if args.input:
+        paths = [args.input] if args.input.is_file() else args.input.rglob("*")
+        return sorted(p for p in paths if p.suffix.lower() in IMAGE_SUFFIXES)
+    return split_images(args.data, args.split, args.dataset_root)
+
+
+def _score_batch(entry, batch: list, params: dict) -> list[dict]:
+    scored_at = datetime.now(timezone.utc).isoformat()
+    base = {"modelId": entry.id, "modelVersion": entry.version, "scoredAt": scored_at}
+    rows = [{"path": str(path), **base, "error": error} for path, image, error in batch if image is None]
+    decoded = [(path, image) for path, image, _ in batch if image is not None]
+    if not decoded:
+        return rows
+    images = [image for _, image in decoded]
+    try:
+        if entry.infer_batch is not None:
+            results = entry.infer_batch(images, **params)
+        else:
+            results = [entry.infer(image, **params) for image in images]
+    except Exception as e:
+        return rows + [{"path": str(path), **base, "error": f"{type(e).__name__}: {e}"} for path, _ in decoded]
+    for (path, image), (detections, _, _, *extra) in zip(decoded, results):
+        # Images are decoded at reduced scale; report the source size like /predict.
+        width, height = original_size(image)
+        row = {"path": str(path), **base, "width": width, "height": height, "detections": detections}
+        # Composite models add the route they took.
+        rows.append({**row, **extra[0]} if extra else row)
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Score a directory or dataset split with a served model")
+    parser.add_argument("--input", type=Path, help="image file or directory (default: --split of --data)")
+    parser.add_argument("--data", type=Path, default=ROOT / "trainedmodel" / "data.yaml")
+    parser.add_argument("--dataset-root", type=Path, help="override `path` from data.yaml")
+    parser.add_argument("--split", default="test")
+    parser.add_argument("--out", type=Path, required=True, help="results.jsonl, or a .parquet directory")
+    parser.add_argument("--model", help="model id (default: the server's default model)")
+    parser.add_argument("--conf", type=float, default=0.15)
+    parser.add_argument("--iou", type=float, default=0.7)
+    parser.add_argument("--max-det", type=int, default=300)
+    parser.add_argument("--topk", type=int, default=5)
+    parser.add_argument("--agnostic-nms", action="store_true")
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument(
+        "--batch-size", type=int, default=server._coerce_int(server.BATCH_MAX_SIZE, 8, 1, 64)
+    )
+    parser.add_argument(
+        "--decode-workers", type=int, default=server._coerce_int(server.DECODE_WORKERS, 4, 1, 64)
+    )
+    parser.add_argument("--no-resume", action="store_true", help="rescore files already in --out")
+    args = parser.parse_args()
+
+    entry = server.MODEL_REGISTRY.get(args.model or server.ACTIVE_DEFAULT_MODEL_ID)
+    if entry is None:
+        raise SystemExit(f"Unknown model '{args.model}' (available: {', '.join(server.MODEL_REGISTRY)})")
+    params = server._predict_params(args.conf, args.iou, args.max_det, args.topk, args.agnostic_nms, args.imgsz)
+
+    writer = ParquetWriter(args.out) if args.out.suffix.lower() == ".parquet" else JsonlWriter(args.out)
+    paths = _input_paths(args)
+    skipped = 0
+    if not args.no_resume:
+        done = writer.done()
+        remaining = [p for p in paths if str(p) not in done]
+        skipped = len(paths) - len(remaining)
+        paths = remaining
+    print(f"{len(paths)} to score with {entry.id} ({entry.version}), {skipped} already done", file=sys.stderr)
+
+    writer.open()
+    scored = errors = 0
+    start = time.perf_counter()
+    batch = []
+    try:
+        frames = prefetch(paths, args.imgsz, args.decode_workers, depth=args.batch_size * 4)
+        for i, frame in enumerate(frames, 1):
+            batch.append(frame)
+            if len(batch) < args.batch_size and i < len(paths):
+                continue
+            rows = _score_batch(entry, batch, params)
+            writer.write(rows)
+            batch = []
+            scored += len(rows)
+            errors += sum(1 for row in rows if "error" in row)
+            rate = scored / (time.perf_counter() - start)
+            print(f"\r{scored}/{len(paths)} scored, {errors} errors, {rate:.1f} img/s", end="", file=sys.stderr)
+    finally:
+        writer.close()
+        print(file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
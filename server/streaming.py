@@ -0,0 +1,122 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Optional
+
+
+class LatestSlot:
+    def __init__(self):
+        self._item: Optional[Any] = None
+        self._event = asyncio.Event()
+        self.dropped = 0
+
+    def put(self, item: Any) -> Optional[Any]:
+        superseded, self._item = self._item, item
+        if superseded is not None:
+            self.dropped += 1
+        self._event.set()
+        return superseded
+
+    async def get(self) -> Any:
+        while self._item is None:
+            self._event.clear()
+            await self._event.wait()
+        item, self._item = self._item, None
+        return item
+
+
+class StreamCounters:
+    def __init__(self):
+        self.active = 0
+        self.sessions = 0
+        self.received = 0
+        self.processed = 0
+        self.dropped = 0
+        self.stale = 0
+        self.keyframes = 0
+        self.propagated = 0
+
+    def stats(self) -> dict:
+        return {
+            "activeSessions": self.active,
+            "sessions": self.sessions,
+            "framesReceived": self.received,
+            "framesProcessed": self.processed,
+            "framesDropped": self.dropped,
+            "staleResponsesDropped": self.stale,
+            "trackingKeyframes": self.keyframes,
+            "trackingPropagated": self.propagated,
+        }
+
+
+class StreamSession:
+    def __init__(
+        self,
+        process: Callable[[Any, "StreamSession"], Awaitable[Any]],
+        send: Callable[[Any], Awaitable[None]],
+        max_in_flight: int = 1,
+        counters: Optional[StreamCounters] = None,
+    ):
+        self._process = process
+        self._send = send
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.counters = counters or StreamCounters()
+        self.slot = LatestSlot()
+        self._outbox: "asyncio.Queue[tuple[Optional[int], Any]]" = asyncio.Queue()
+        self._seq = 0
+        self._last_sent_seq = 0
+        self.received = 0
+        self.processed = 0
+        # Per-connection state owned by the frame processor (e.g. a tracker).
+        self.state: dict[str, Any] = {}
+
+    @property
+    def dropped(self) -> int:
+        return self.slot.dropped
+
+    def submit(self, frame: Any) -> None:
+        self._seq += 1
+        self.received += 1
+        self.counters.received += 1
+        if self.slot.put((self._seq, frame)) is not None:
+            self.counters.dropped += 1
+
+    def reply(self, message: Any) -> None:
+        # Out-of-band replies (parse errors etc.) are never dropped.
+        self._outbox.put_nowait((None, message))
+
+    async def _infer_loop(self) -> None:
+        while True:
+            seq, frame = await self.slot.get()
+            message = await self._process(frame, self)
+            self.processed += 1
+            self.counters.processed += 1
+            if message is not None:
+                self._outbox.put_nowait((seq, message))
+
+    async def _send_loop(self) -> None:
+        while True:
+            seq, message = await self._outbox.get()
+            if seq is not None:
+                # With several frames in flight a slower, older frame can finish
+                # after a newer one; the client only cares about the freshest.
+                if seq < self._last_sent_seq:
+                    self.counters.stale += 1
+                    continue
+                self._last_sent_seq = seq
+            await self._send(message)
+
+    async def run(self, receive_loop: Callable[["StreamSession"], Awaitable[None]]) -> None:
+        self.counters.active += 1
+        self.counters.sessions += 1
+        tasks = [asyncio.create_task(self._infer_loop()) for _ in range(self.max_in_flight)]
+        tasks.append(asyncio.create_task(self._send_loop()))
+        receiver = asyncio.create_task(receive_loop(self))
+        try:
+            done, _ = await asyncio.wait([receiver, *tasks], return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if not task.cancelled() and task.exception() is not None:
+                    raise task.exception()
+        finally:
+            self.counters.active -= 1
+            for task in [receiver, *tasks]:
+                task.cancel()
+            await asyncio.gather(receiver, *tasks, return_exceptions=True)
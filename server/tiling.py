@@ -0,0 +1,106 @@
+import math
+
+import numpy as np
+from PIL import Image
+
+from .postprocess import clamp01
+
+
+def _axis_starts(length: int, side: int, stride: float) -> list[int]:
+    if length <= side:
+        return [0]
+    count = math.ceil((length - side) / stride) + 1
+    # Spread the windows evenly so the last one ends exactly on the edge.
+    step = (length - side) / (count - 1)
+    return [int(round(i * step)) for i in range(count)]
+
+
+def tile_windows(width: int, height: int, size: int, overlap: float, max_grid: int) -> list[tuple]:
+    # Square (left, top, right, bottom) windows covering the image with at least
+    # `overlap` between neighbours. Images too large for max_grid tiles per side get
+    # bigger tiles instead of more of them; the model letterboxes each one anyway.
+    overlap = min(max(float(overlap), 0.0), 0.75)
+    longest = max(width, height)
+    fit = math.ceil(longest / (1 + (max_grid - 1) * (1 - overlap)))
+    side = min(max(int(size), fit), longest)
+    stride = side * (1 - overlap)
+    return [
+        (left, top, min(width, left + side), min(height, top + side))
+        for top in _axis_starts(height, side, stride)
+        for left in _axis_starts(width, side, stride)
+    ]
+
+
+def crop_tiles(image: Image.Image, windows: list[tuple]) -> list[Image.Image]:
+    return [image.crop(window) for window in windows]
+
+
+def _to_global(detections: list, window: tuple, width: int, height: int) -> list:
+    left, top, right, bottom = window
+    tile_w, tile_h = right - left, bottom - top
+    out = []
+    for d in detections:
+        box = d.get("box")
+        if box is None:
+            continue
+        x = (left + box["x"] * tile_w) / width
+        y = (top + box["y"] * tile_h) / height
+        out.append(
+            {
+                **d,
+                "box": {
+                    "x": clamp01(x),
+                    "y": clamp01(y),
+                    "width": clamp01(box["width"] * tile_w / width),
+                    "height": clamp01(box["height"] * tile_h / height),
+                },
+            }
+        )
+    return out
+
+
+def _suppress(boxes: np.ndarray, label_codes: np.ndarray, threshold: float) -> np.ndarray:
+    # Greedy same-label suppression on intersection over the smaller box: an object
+    # cut by a tile edge leaves a partial box that lies inside the full one.
+    x1, y1, x2, y2 = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    areas = np.maximum(0.0, x2 - x1) * np.maximum(0.0, y2 - y1)
+    suppressed = np.zeros(len(boxes), dtype=bool)
+    keep = []
+    for i in range(len(boxes)):
+        if suppressed[i]:
+            continue
+        keep.append(i)
+        inter_w = np.maximum(0.0, np.minimum(x2[i], x2) - np.maximum(x1[i], x1))
+        inter_h = np.maximum(0.0, np.minimum(y2[i], y2) - np.maximum(y1[i], y1))
+        smaller = np.minimum(areas[i], areas)
+        ios = np.divide(inter_w * inter_h, smaller, out=np.zeros_like(smaller), where=smaller > 0)
+        suppressed |= (label_codes == label_codes[i]) & (ios >= threshold)
+    return np.asarray(keep, dtype=np.intp)
+
+
+def merge_tiles(
+    full: list, tiles: list[list], windows: list[tuple], width: int, height: int, ios: float, max_det: int = 0
+) -> list:
+    # `full` is the whole-frame pass, which keeps large objects and any
+    # classification-only results; tile boxes are mapped back to whole-frame
+    # normalized coordinates and merged into it.
+    boxed = [d for d in full if d.get("box") is not None]
+    unboxed = [d for d in full if d.get("box") is None]
+    for detections, window in zip(tiles, windows):
+        boxed.extend(_to_global(detections, window, width, height))
+    if boxed:
+        boxed.sort(key=lambda d: d["confidence"], reverse=True)
+        xyxy = np.array(
+            [
+                (b["x"], b["y"], b["x"] + b["width"], b["y"] + b["height"])
+                for b in (d["box"] for d in boxed)
+            ],
+            dtype=np.float64,
+        )
+        _, label_codes = np.unique(np.array([d["label"] for d in boxed], dtype=str), return_inverse=True)
+        boxed = [boxed[i] for i in _suppress(xyxy, label_codes, ios).tolist()]
+    merged = boxed + unboxed
+    merged.sort(key=lambda d: d["confidence"], reverse=True)
+    if max_det:
+        merged = merged[: int(max_det)]
+    return merged
@@ -0,0 +1,229 @@
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+from PIL import Image
+
+from .imaging import decode_image
+
+THUMB_SIZE = (64, 48)
+
+
+def motion_thumbnail(image: Image.Image) -> np.ndarray:
+    small = image.resize(THUMB_SIZE, Image.BILINEAR, reducing_gap=2.0).convert("L")
+    return np.asarray(small, dtype=np.float32) / 255.0
+
+
+def decode_with_thumbnail(data: bytes, target: int = 0) -> tuple[Image.Image, np.ndarray]:
+    image = decode_image(data, target)
+    return image, motion_thumbnail(image)
+
+
+@dataclass(frozen=True)
+class Motion:
+    dx: float
+    dy: float
+    residual: float
+
+
+def estimate_motion(prev: np.ndarray, curr: np.ndarray) -> Motion:
+    # Global translation by phase correlation, then the mean abs difference left
+    # after compensating for it. dx/dy are fractions of the frame size.
+    a = prev - prev.mean()
+    b = curr - curr.mean()
+    cross = np.fft.fft2(b) * np.conj(np.fft.fft2(a))
+    cross /= np.abs(cross) + 1e-9
+    corr = np.fft.ifft2(cross).real
+    peak_y, peak_x = np.unravel_index(int(np.argmax(corr)), corr.shape)
+    height, width = corr.shape
+    shift_y = peak_y - height if peak_y > height // 2 else peak_y
+    shift_x = peak_x - width if peak_x > width // 2 else peak_x
+
+    shifted = np.roll(prev, (shift_y, shift_x), axis=(0, 1))
+    # Ignore the border that wrapped around during the roll.
+    ys = slice(max(0, shift_y), height + min(0, shift_y))
+    xs = slice(max(0, shift_x), width + min(0, shift_x))
+    overlap = np.abs(curr[ys, xs] - shifted[ys, xs])
+    residual = float(overlap.mean()) if overlap.size else 1.0
+    return Motion(dx=float(shift_x) / width, dy=float(shift_y) / height, residual=residual)
+
+
+def _iou_xywh(a: np.ndarray, b: np.ndarray) -> float:
+    ax2, ay2 = a[0] + a[2], a[1] + a[3]
+    bx2, by2 = b[0] + b[2], b[1] + b[3]
+    inter_w = max(0.0, min(ax2, bx2) - max(a[0], b[0]))
+    inter_h = max(0.0, min(ay2, by2) - max(a[1], b[1]))
+    inter = inter_w * inter_h
+    union = a[2] * a[3] + b[2] * b[3] - inter
+    return inter / union if union > 0 else 0.0
+
+
+class _KalmanBox:
+    # Constant-velocity Kalman filter over (cx, cy, w, h), as in SORT.
+    _F = np.eye(8)
+    _F[:4, 4:] = np.eye(4)
+    _H = np.eye(4, 8)
+    _Q = np.diag([1e-4, 1e-4, 1e-4, 1e-4, 1e-3, 1e-3, 1e-4, 1e-4])
+    _R = np.diag([1e-3, 1e-3, 2e-3, 2e-3])
+
+    def __init__(self, box: np.ndarray):
+        x, y, w, h = box
+        self.state = np.array([x + w / 2, y + h / 2, w, h, 0.0, 0.0, 0.0, 0.0])
+        self.cov = np.diag([1e-3, 1e-3, 1e-3, 1e-3, 1e-2, 1e-2, 1e-3, 1e-3])
+
+    def predict(self) -> None:
+        self.state = self._F @ self.state
+        self.cov = self._F @ self.cov @ self._F.T + self._Q
+
+    def update(self, box: np.ndarray) -> None:
+        x, y, w, h = box
+        z = np.array([x + w / 2, y + h / 2, w, h])
+        residual = z - self._H @ self.state
+        s = self._H @ self.cov @ self._H.T + self._R
+        gain = self.cov @ self._H.T @ np.linalg.inv(s)
+        self.state = self.state + gain @ residual
+        self.cov = (np.eye(8) - gain @ self._H) @ self.cov
+
+    def shift(self, dx: float, dy: float) -> None:
+        self.state[0] += dx
+        self.state[1] += dy
+
+    @property
+    def box(self) -> np.ndarray:
+        cx, cy, w, h = self.state[:4]
+        w, h = max(0.0, w), max(0.0, h)
+        return np.array([cx - w / 2, cy - h / 2, w, h])
+
+
+class _Track:
+    def __init__(self, track_id: int, detection: dict):
+        self.id = track_id
+        self.label = detection["label"]
+        self.confidence = detection["confidence"]
+        self.filter = _KalmanBox(_box_array(detection["box"]))
+        self.misses = 0
+
+    def to_detection(self) -> dict:
+        x, y, w, h = (float(v) for v in self.filter.box)
+        x0, y0 = min(max(x, 0.0), 1.0), min(max(y, 0.0), 1.0)
+        return {
+            "label": self.label,
+            "confidence": self.confidence,
+            "box": {
+                "x": x0,
+                "y": y0,
+                "width": max(0.0, min(x + w, 1.0) - x0),
+                "height": max(0.0, min(y + h, 1.0) - y0),
+            },
+            "trackId": self.id,
+        }
+
+
+def _box_array(box: dict) -> np.ndarray:
+    return np.array([box["x"], box["y"], box["width"], box["height"]], dtype=np.float64)
+
+
+class FrameTracker:
+    def __init__(
+        self,
+        motion_threshold: float = 0.04,
+        max_shift: float = 0.15,
+        keyframe_interval: int = 10,
+        iou_threshold: float = 0.3,
+        max_misses: int = 2,
+    ):
+        self.motion_threshold = float(motion_threshold)
+        self.max_shift = float(max_shift)
+        self.keyframe_interval = max(1, int(keyframe_interval))
+        self.iou_threshold = float(iou_threshold)
+        self.max_misses = max(0, int(max_misses))
+        self.context: Optional[tuple] = None
+        self._tracks: list[_Track] = []
+        self._next_id = 1
+        self._prev_thumb: Optional[np.ndarray] = None
+        self._since_keyframe = 0
+        self._size: tuple[int, int] = (0, 0)
+        self.keyframes = 0
+        self.propagated = 0
+
+    def reset(self, context: Optional[tuple] = None) -> None:
+        self.context = context
+        self._tracks = []
+        self._prev_thumb = None
+        self._since_keyframe = 0
+
+    def observe(self, thumb: np.ndarray, size: tuple[int, int]) -> Optional[Motion]:
+        # Returns the motion since the previous frame, or None when a keyframe is needed.
+        prev, self._prev_thumb = self._prev_thumb, thumb
+        if prev is None or prev.shape != thumb.shape or size != self._size:
+            return None
+        if self._since_keyframe + 1 >= self.keyframe_interval:
+            return None
+        motion = estimate_motion(prev, thumb)
+        if abs(motion.dx) > self.max_shift or abs(motion.dy) > self.max_shift:
+            return None
+        if motion.residual > self.motion_threshold:
+            return None
+        return motion
+
+    def propagate(self, motion: Motion) -> list:
+        self._since_keyframe += 1
+        self.propagated += 1
+        for track in self._tracks:
+            track.filter.shift(motion.dx, motion.dy)
+        return [t.to_detection() for t in self._tracks if t.misses == 0]
+
+    def update(self, detections: list, size: tuple[int, int]) -> list:
+        self._since_keyframe = 0
+        self._size = size
+        self.keyframes += 1
+        for track in self._tracks:
+            track.filter.predict()
+
+        boxed = [d for d in detections if isinstance(d.get("box"), dict)]
+        others = [d for d in detections if not isinstance(d.get("box"), dict)]
+
+        # Greedy IoU association, highest-overlap pairs first, same label only.
+        pairs = []
+        for ti, track in enumerate(self._tracks):
+            predicted = track.filter.box
+            for di, d in enumerate(boxed):
+                if d["label"] != track.label:
+                    continue
+                overlap = _iou_xywh(predicted, _box_array(d["box"]))
+                if overlap >= self.iou_threshold:
+                    pairs.append((overlap, ti, di))
+        pairs.sort(reverse=True)
+
+        matched_tracks: set[int] = set()
+        assigned: dict[int, _Track] = {}
+        for _, ti, di in pairs:
+            if ti in matched_tracks or di in assigned:
+                continue
+            track = self._tracks[ti]
+            track.filter.update(_box_array(boxed[di]["box"]))
+            track.confidence = boxed[di]["confidence"]
+            track.misses = 0
+            matched_tracks.add(ti)
+            assigned[di] = track
+
+        survivors = []
+        for ti, track in enumerate(self._tracks):
+            if ti in matched_tracks:
+                survivors.append(track)
+                continue
+            track.misses += 1
+            if track.misses <= self.max_misses:
+                survivors.append(track)
+        for di, d in enumerate(boxed):
+            if di not in assigned:
+                track = _Track(self._next_id, d)
+                self._next_id += 1
+                assigned[di] = track
+                survivors.append(track)
+        self._tracks = survivors
+
+        out = []
+        for di, d in enumerate(boxed):
+            out.append({**d, "trackId": assigned[di].id})
+        return out + others
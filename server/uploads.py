@@ -0,0 +1,280 @@
+import asyncio
+import hashlib
+import io
+import tarfile
+import tempfile
+import zipfile
+from dataclasses import dataclass
+from pathlib import PurePosixPath
+from typing import AsyncIterator, Iterator, Optional, Union
+
+from PIL import Image
+
+from .imaging import probe_image
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ModuleNotFoundError:
+    from multipart.multipart import MultipartParser, parse_options_header
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".bmp", ".webp", ".gif", ".tif", ".tiff"}
+ZIP_TYPES = {"application/zip", "application/x-zip-compressed"}
+TAR_TYPES = {"application/x-tar", "application/gzip", "application/x-gzip", "application/x-gtar"}
+TAR_SUFFIXES = (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz")
+# An upload whose image header hasn't shown up in this many bytes is rejected.
+PROBE_MAX_BYTES = 256 * 1024
+
+
+@dataclass
+class UploadItem:
+    name: str
+    data: Optional[bytes] = None
+    error: Optional[str] = None
+
+
+def archive_kind(filename: str, content_type: str) -> Optional[str]:
+    name = (filename or "").lower()
+    content_type = (content_type or "").lower()
+    if content_type in ZIP_TYPES or name.endswith(".zip"):
+        return "zip"
+    if content_type in TAR_TYPES or name.endswith(TAR_SUFFIXES):
+        return "tar"
+    return None
+
+
+def _is_image_name(name: str) -> bool:
+    path = PurePosixPath(name)
+    # Skip macOS resource forks and other dotfiles that ride along in archives.
+    if any(part.startswith(".") or part == "__MACOSX" for part in path.parts):
+        return False
+    return path.suffix.lower() in IMAGE_SUFFIXES
+
+
+def _zip_items(data: bytes, max_item_bytes: int) -> Iterator[UploadItem]:
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        for info in archive.infolist():
+            if info.is_dir() or not _is_image_name(info.filename):
+                continue
+            # file_size is the declared uncompressed size; read at most one byte past
+            # the limit so a lying header can't inflate a huge member into memory.
+            if info.file_size > max_item_bytes:
+                yield UploadItem(info.filename, error="Image too large")
+                continue
+            with archive.open(info) as member:
+                payload = member.read(max_item_bytes + 1)
+            if len(payload) > max_item_bytes:
+                yield UploadItem(info.filename, error="Image too large")
+                continue
+            yield UploadItem(info.filename, payload)
+
+
+def _tar_items(data: bytes, max_item_bytes: int) -> Iterator[UploadItem]:
+    with tarfile.open(fileobj=io.BytesIO(data), mode="r:*") as archive:
+        for info in archive:
+            if not info.isfile() or not _is_image_name(info.name):
+                continue
+            if info.size > max_item_bytes:
+                yield UploadItem(info.name, error="Image too large")
+                continue
+            member = archive.extractfile(info)
+            yield UploadItem(info.name, member.read() if member is not None else b"")
+
+
+def expand_upload(
+    filename: str, content_type: str, data: bytes, max_items: int, max_item_bytes: int
+) -> list[UploadItem]:
+    # One upload becomes one item, or one item per image in a zip/tar archive.
+    # Archives stop after max_items + 1 images so the caller can tell they overflowed.
+    kind = archive_kind(filename, content_type)
+    if kind is None:
+        if not (content_type or "").startswith("image/"):
+            return [UploadItem(filename, error="Expected an image upload")]
+        if len(data) > max_item_bytes:
+            return [UploadItem(filename, error="Image too large")]
+        return [UploadItem(filename, data)]
+
+    items = []
+    try:
+        members = _zip_items(data, max_item_bytes) if kind == "zip" else _tar_items(data, max_item_bytes)
+        for item in members:
+            item.name = f"{filename}/{item.name}"
+            items.append(item)
+            if len(items) > max_items:
+                break
+    except (zipfile.BadZipFile, tarfile.TarError, EOFError, OSError) as e:
+        items.append(UploadItem(filename, error=f"Invalid archive: {e}"))
+    return items
+
+
+class UploadRejectedError(ValueError):
+    def __init__(self, status_code: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class SpooledUpload:
+    # An upload body kept in memory up to max_memory bytes, then in a temporary
+    # file. It is hashed as it streams in, so the result cache never needs the
+    # whole body as one bytes object.
+    def __init__(self, filename: str, content_type: str, max_memory: int):
+        self.filename = filename
+        self.content_type = content_type
+        self.size = 0
+        self._max_memory = max_memory
+        self._chunks: list[bytes] = []
+        self._file = None
+        self._hash = hashlib.blake2b(digest_size=16)
+
+    async def write(self, data: bytes) -> None:
+        self.size += len(data)
+        self._hash.update(data)
+        if self._file is None and self.size > self._max_memory:
+            self._file = tempfile.NamedTemporaryFile(prefix="upload-")
+            chunks, self._chunks = self._chunks, []
+            await asyncio.to_thread(self._file.writelines, chunks)
+        if self._file is None:
+            self._chunks.append(data)
+        else:
+            await asyncio.to_thread(self._file.write, data)
+
+    def digest(self) -> bytes:
+        return self._hash.digest()
+
+    def source(self) -> Union[bytes, str]:
+        # Small uploads as bytes; large ones as the spool file's path, which the
+        # decoders (and decode processes) open directly.
+        if self._file is None:
+            return b"".join(self._chunks)
+        self._file.flush()
+        return self._file.name
+
+    def close(self) -> None:
+        self._chunks = []
+        if self._file is not None:
+            self._file.close()
+
+
+class _PartEvents:
+    # MultipartParser callbacks, turned into ("begin", filename, content_type),
+    # ("data", bytes) and ("end",) events for the one form field we want.
+    def __init__(self, field: str):
+        self.field = field
+        self.events: list[tuple] = []
+        self._headers: dict[bytes, bytes] = {}
+        self._name = b""
+        self._value = b""
+        self._wanted = False
+
+    def callbacks(self) -> dict:
+        return {
+            "on_part_begin": self._part_begin,
+            "on_header_field": self._header_field,
+            "on_header_value": self._header_value,
+            "on_header_end": self._header_end,
+            "on_headers_finished": self._headers_finished,
+            "on_part_data": self._part_data,
+            "on_part_end": self._part_end,
+        }
+
+    def drain(self) -> list[tuple]:
+        events, self.events = self.events, []
+        return events
+
+    def _part_begin(self) -> None:
+        self._headers = {}
+
+    def _header_field(self, data: bytes, start: int, end: int) -> None:
+        self._name += data[start:end]
+
+    def _header_value(self, data: bytes, start: int, end: int) -> None:
+        self._value += data[start:end]
+
+    def _header_end(self) -> None:
+        self._headers[self._name.lower()] = self._value
+        self._name = self._value = b""
+
+    def _headers_finished(self) -> None:
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        self._wanted = options.get(b"name", b"").decode("utf-8", "replace") == self.field
+        if self._wanted:
+            filename = options.get(b"filename", b"").decode("utf-8", "replace")
+            content_type = self._headers.get(b"content-type", b"").decode("latin-1").strip().lower()
+            self.events.append(("begin", filename, content_type))
+
+    def _part_data(self, data: bytes, start: int, end: int) -> None:
+        if self._wanted:
+            self.events.append(("data", data[start:end]))
+
+    def _part_end(self) -> None:
+        if self._wanted:
+            self.events.append(("end",))
+            self._wanted = False
+
+
+def _check_probe(head: bytes, complete: bool, max_pixels: int) -> bool:
+    try:
+        found = probe_image(head)
+    except Image.DecompressionBombError:
+        # Pillow refuses headers far over its own pixel limit before reporting a size.
+        raise UploadRejectedError(413, "Image too large") from None
+    if found is None:
+        if complete or len(head) >= PROBE_MAX_BYTES:
+            raise UploadRejectedError(400, "Invalid image: unrecognized format")
+        return False
+    _, (width, height) = found
+    if width * height > max_pixels:
+        raise UploadRejectedError(413, f"Image too large: {width}x{height}")
+    return True
+
+
+async def spool_image_upload(
+    content_type: str,
+    body: AsyncIterator[bytes],
+    field: str,
+    max_bytes: int,
+    max_pixels: int,
+    max_memory: int,
+) -> SpooledUpload:
+    # Reads a multipart body chunk by chunk into a SpooledUpload. Uploads are
+    # rejected as soon as they are known to be bad: a non-image part type, more
+    # than max_bytes, or a header that isn't an image or has too many pixels.
+    # The rest of the body is then never read.
+    kind, options = parse_options_header(content_type or "")
+    boundary = options.get(b"boundary")
+    if kind != b"multipart/form-data" or not boundary:
+        raise UploadRejectedError(415, "Expected a multipart/form-data upload")
+    parts = _PartEvents(field)
+    parser = MultipartParser(boundary, parts.callbacks())
+    upload: Optional[SpooledUpload] = None
+    head = b""
+    probed = finished = False
+    try:
+        async for chunk in body:
+            parser.write(chunk)
+            for event in parts.drain():
+                if event[0] == "begin" and upload is None:
+                    if not event[2].startswith("image/"):
+                        raise UploadRejectedError(415, "Expected an image upload")
+                    upload = SpooledUpload(event[1], event[2], max_memory)
+                elif event[0] == "data" and upload is not None and not finished:
+                    if upload.size + len(event[1]) > max_bytes:
+                        raise UploadRejectedError(413, f"Upload larger than {max_bytes // (1024 * 1024)} MB")
+                    await upload.write(event[1])
+                    if not probed:
+                        head = (head + event[1])[:PROBE_MAX_BYTES]
+                        probed = _check_probe(head, False, max_pixels)
+                elif event[0] == "end" and upload is not None:
+                    finished = True
+            if finished:
+                break
+        if upload is None:
+            raise UploadRejectedError(422, f"Missing '{field}' upload")
+        if not finished:
+            raise UploadRejectedError(400, "Incomplete upload")
+        if not probed:
+            _check_probe(head, True, max_pixels)
+    except BaseException:
+        if upload is not None:
+            upload.close()
+        raise
+    return upload
@@ -0,0 +1,396 @@
+import atexit
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+from multiprocessing import resource_tracker, shared_memory
+from typing import Optional
+
+import numpy as np
+from PIL import Image
+
+from .metrics import STAGES
+
+WORKER_ROLE_ENV = "MODEL_WORKER_ROLE"
+
+
+WORKER_RETRY_WAIT_S = 5.0
+
+
+class WorkerError(RuntimeError):
+    pass
+
+
+class WorkerLostError(WorkerError):
+    # The worker process died; the request can be retried once a worker is free.
+    pass
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    shm = shared_memory.SharedMemory(name=name)
+    # The API process owns (and unlinks) every block; don't let this process's
+    # resource tracker claim it as leaked on exit.
+    try:
+        resource_tracker.unregister(shm._name, "shared_memory")
+    except Exception:
+        pass
+    return shm
+
+
+def _worker_main(conn, index: int, num_threads: int, cores: Optional[list[int]]) -> None:
+    os.environ[WORKER_ROLE_ENV] = "worker"
+    if cores and hasattr(os, "sched_setaffinity"):
+        try:
+            os.sched_setaffinity(0, cores)
+        except OSError:
+            pass
+    if num_threads > 0:
+        try:
+            import torch
+
+            torch.set_num_threads(num_threads)
+        except Exception:
+            pass
+
+    # Stage timings recorded here are shipped back with each result.
+    STAGES.buffer = []
+    try:
+        from . import main as server
+    except Exception as e:
+        conn.send(("error", f"worker {index} failed to load models: {e!r}"))
+        return
+
+    conn.send(
+        (
+            "ready",
+            {
+                "default": server.ACTIVE_DEFAULT_MODEL_ID,
+                "warmup": server.MODEL_WARMUP,
+                "models": [
+                    {"id": m.id, "label": m.label, "kind": m.kind, "version": m.version}
+                    for m in server.MODEL_REGISTRY.values()
+                ],
+            },
+        )
+    )
+
+    STAGES.drain()
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            return
+        if message is None:
+            return
+        if message[0] == "reload":
+            _, model_id, path, version = message
+            try:
+                conn.send(("ok", server._reload_model(model_id, path, version)))
+            except Exception as e:
+                conn.send(("error", f"{type(e).__name__}: {e}"))
+            # Drop the warm-up samples of the new weights.
+            STAGES.drain()
+            continue
+        _, model_id, frames, params = message
+
+        blocks = []
+        images = []
+        try:
+            for name, width, height in frames:
+                shm = _attach(name)
+                blocks.append(shm)
+                images.append(Image.frombuffer("RGB", (width, height), shm.buf, "raw", "RGB", 0, 1))
+            entry = server.MODEL_REGISTRY[model_id]
+            if entry.infer_batch is not None:
+                results = entry.infer_batch(images, **params)
+            else:
+                results = [entry.infer(image, **params) for image in images]
+            reply = ("ok", results, STAGES.drain())
+        except Exception as e:
+            reply = ("error", f"{type(e).__name__}: {e}", STAGES.drain())
+        finally:
+            del images
+            for shm in blocks:
+                try:
+                    shm.close()
+                except BufferError:
+                    pass
+        conn.send(reply)
+
+
+class _WorkerHandle:
+    def __init__(self, index: int, process, conn):
+        self.index = index
+        self.process = process
+        self.conn = conn
+        self.requests = 0
+
+
+class ModelWorkerPool:
+    def __init__(
+        self,
+        num_workers: int,
+        threads_per_worker: int = 0,
+        pin_cores: bool = False,
+        ready: Optional[threading.Event] = None,
+    ):
+        self.num_workers = max(1, int(num_workers))
+        cpu_count = os.cpu_count() or 1
+        if threads_per_worker <= 0:
+            threads_per_worker = max(1, cpu_count // self.num_workers)
+        self.threads_per_worker = int(threads_per_worker)
+        self.pin_cores = bool(pin_cores)
+        self._ctx = mp.get_context("spawn")
+        self._handles: list[_WorkerHandle] = []
+        self._idle: "queue.Queue[_WorkerHandle]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._frames = 0
+        self._bytes = 0
+        # Cleared while a dead worker is being replaced, so /health reports not ready.
+        self._ready = ready
+        self._missing = 0
+        self._respawns = 0
+        self._closed = False
+        # model id -> (path, version) of weights reloaded since startup, replayed on respawn.
+        self._reloads: dict[str, tuple[str, str]] = {}
+
+    def _cores_for(self, index: int) -> Optional[list[int]]:
+        if not self.pin_cores:
+            return None
+        cpu_count = os.cpu_count() or 1
+        start = (index * self.threads_per_worker) % cpu_count
+        return [(start + i) % cpu_count for i in range(self.threads_per_worker)]
+
+    def _spawn(self, index: int) -> _WorkerHandle:
+        parent_conn, child_conn = self._ctx.Pipe()
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(child_conn, index, self.threads_per_worker, self._cores_for(index)),
+            name=f"model-worker-{index}",
+            daemon=True,
+        )
+        process.start()
+        child_conn.close()
+        return _WorkerHandle(index, process, parent_conn)
+
+    def _await_ready(self, handle: _WorkerHandle) -> dict:
+        try:
+            status, payload = handle.conn.recv()
+        except (EOFError, OSError):
+            raise WorkerError(f"model worker {handle.index} exited during startup") from None
+        if status != "ready":
+            raise WorkerError(payload)
+        return payload
+
+    def start(self) -> dict:
+        self._handles = [self._spawn(index) for index in range(self.num_workers)]
+        atexit.register(self.close)
+
+        manifest = None
+        for handle in self._handles:
+            payload = self._await_ready(handle)
+            manifest = manifest or payload
+            self._idle.put(handle)
+        return manifest
+
+    def _retire(self, handle: _WorkerHandle) -> None:
+        try:
+            handle.conn.close()
+        except OSError:
+            pass
+        handle.process.join(timeout=5)
+        if handle.process.is_alive():
+            handle.process.terminate()
+            handle.process.join(timeout=5)
+
+    def _replace(self, handle: _WorkerHandle) -> None:
+        # The handle never goes back to the idle pool; a fresh worker takes its index
+        # once it has loaded and warmed up.
+        with self._lock:
+            self._missing += 1
+            self._respawns += 1
+        if self._ready is not None:
+            self._ready.clear()
+        threading.Thread(
+            target=self._respawn, args=(handle,), name=f"model-worker-{handle.index}-respawn", daemon=True
+        ).start()
+
+    def _respawn(self, handle: _WorkerHandle) -> None:
+        self._retire(handle)
+        delay = 1.0
+        while not self._closed:
+            fresh = self._spawn(handle.index)
+            try:
+                self._await_ready(fresh)
+                # Bring it to the same weights as the workers that stayed up, again if
+                # a reload or rollback changed them meanwhile.
+                applied = {}
+                while True:
+                    with self._lock:
+                        wanted = dict(self._reloads)
+                        if wanted == applied:
+                            self._handles[handle.index] = fresh
+                            break
+                    for model_id, target in wanted.items():
+                        if applied.get(model_id) != target:
+                            fresh.conn.send(("reload", model_id, *target))
+                            status, payload = fresh.conn.recv()
+                            if status != "ok":
+                                raise WorkerError(payload)
+                    applied = wanted
+            except (WorkerError, EOFError, OSError):
+                self._retire(fresh)
+                time.sleep(delay)
+                delay = min(delay * 2, 30.0)
+                continue
+            if self._closed:
+                self._retire(fresh)
+                return
+            with self._lock:
+                self._missing -= 1
+                restored = self._missing == 0
+            self._idle.put(fresh)
+            if restored and self._ready is not None:
+                self._ready.set()
+            return
+
+    def _exchange(self, handle: _WorkerHandle, message: tuple, release: bool = True) -> tuple:
+        # A broken pipe means the worker died: it is replaced rather than released.
+        try:
+            handle.conn.send(message)
+            reply = handle.conn.recv()
+        except (EOFError, OSError) as e:
+            self._replace(handle)
+            raise WorkerLostError(f"model worker {handle.index} is gone") from e
+        except BaseException:
+            self._idle.put(handle)
+            raise
+        if release:
+            self._idle.put(handle)
+        return reply
+
+    def _take(self, indices: set) -> _WorkerHandle:
+        # Waits for an idle worker whose index is in `indices`; the others go back.
+        held = []
+        handle = self._idle.get()
+        while handle.index not in indices:
+            held.append(handle)
+            handle = self._idle.get()
+        for other in held:
+            self._idle.put(other)
+        return handle
+
+    def infer_batch(self, model_id: str, images: list, **params) -> list:
+        blocks = []
+        try:
+            frames = []
+            for image in images:
+                if image.mode != "RGB":
+                    image = image.convert("RGB")
+                width, height = image.size
+                shm = shared_memory.SharedMemory(create=True, size=max(1, width * height * 3))
+                blocks.append(shm)
+                view = np.ndarray((height, width, 3), dtype=np.uint8, buffer=shm.buf)
+                view[:] = np.asarray(image)
+                del view
+                frames.append((shm.name, width, height))
+
+            message = ("infer", model_id, frames, params)
+            handle = self._idle.get()
+            handle.requests += 1
+            try:
+                status, payload, samples = self._exchange(handle, message)
+            except WorkerLostError:
+                # The frames are still in shared memory: retry once on a live worker.
+                try:
+                    handle = self._idle.get(timeout=WORKER_RETRY_WAIT_S)
+                except queue.Empty:
+                    raise WorkerLostError("no model worker available") from None
+                handle.requests += 1
+                status, payload, samples = self._exchange(handle, message)
+
+            STAGES.ingest(samples)
+            with self._lock:
+                self._frames += len(frames)
+                self._bytes += sum(w * h * 3 for _, w, h in frames)
+        finally:
+            for shm in blocks:
+                shm.close()
+                shm.unlink()
+
+        if status != "ok":
+            raise WorkerError(payload)
+        return payload
+
+    def reload(self, model_id: str, path: str, version: str, previous: tuple[str, str]) -> list:
+        # Rolling reload: one worker at a time leaves the idle pool, so the others
+        # keep serving. If any worker fails, the ones already on the new weights are
+        # rolled back to `previous` (path, version), so one version is served throughout.
+        with self._lock:
+            self._reloads[model_id] = (path, version)
+            before = list(self._handles)
+        pending = {h.index for h in before}
+        done = set()
+        results = []
+        try:
+            while pending:
+                handle = self._take(pending)
+                status, payload = self._exchange(handle, ("reload", model_id, path, version))
+                if status != "ok":
+                    raise WorkerError(payload)
+                pending.discard(handle.index)
+                done.add(handle.index)
+                results.append(payload)
+        except WorkerError as e:
+            with self._lock:
+                self._reloads[model_id] = previous
+                # Workers replaced during the roll may have picked up the new weights too.
+                done |= {h.index for old, h in zip(before, self._handles) if h is not old}
+            self._roll_back(model_id, previous, done)
+            raise WorkerError(f"{e} (rolled back {len(done)} worker(s) to {previous[1]})") from e
+        return results
+
+    def _roll_back(self, model_id: str, previous: tuple[str, str], indices: set) -> None:
+        indices = set(indices)
+        while indices:
+            handle = self._take(indices)
+            indices.discard(handle.index)
+            try:
+                status, _ = self._exchange(handle, ("reload", model_id, *previous), release=False)
+            except WorkerError:
+                # Already being replaced, and the replacement loads the previous weights.
+                continue
+            if status == "ok":
+                self._idle.put(handle)
+            else:
+                # A worker stuck on the new weights is replaced instead.
+                self._replace(handle)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.num_workers,
+                "threadsPerWorker": self.threads_per_worker,
+                "pinCores": self.pin_cores,
+                "idle": self._idle.qsize(),
+                "alive": sum(1 for h in self._handles if h.process.is_alive()),
+                "respawns": self._respawns,
+                "replacing": self._missing,
+                "frames": self._frames,
+                "sharedBytes": self._bytes,
+                "requestsPerWorker": [h.requests for h in self._handles],
+            }
+
+    def close(self) -> None:
+        self._closed = True
+        for handle in self._handles:
+            try:
+                handle.conn.send(None)
+            except Exception:
+                pass
+        for handle in self._handles:
+            handle.process.join(timeout=5)
+            if handle.process.is_alive():
+                handle.process.terminate()
+        self._handles = []